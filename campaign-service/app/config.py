@@ -0,0 +1,139 @@
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Callable, Literal, Self, TypeVar, get_args
+
+from app.log import LogFormat
+
+T = TypeVar("T")
+
+ServerMode = Literal["thread", "aio"]
+ActionScheduler = Literal["apscheduler", "timing-wheel"]
+
+
+def _env(name: str, default: T, cast: Callable[[str], T] = str) -> T:
+    value = os.environ.get(f"CAMPAIGN_SERVICE_{name}")
+    if value is None or value == "":
+        return default
+    return cast(value)
+
+
+def _optional_int(value: str) -> int | None:
+    return None if value.lower() == "none" else int(value)
+
+
+def _bool(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes")
+
+
+def _optional_str(value: str) -> str | None:
+    return None if value.lower() == "none" else value
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Runtime settings, read from `CAMPAIGN_SERVICE_*` environment variables
+    (e.g. `CAMPAIGN_SERVICE_PORT=50052`).
+    """
+    port: int = 50051
+    server_mode: ServerMode = "aio"
+    # Server processes sharing `port`; each owns a hash partition of users, and the others
+    # forward its events to it over its unix socket in `worker_socket_dir`
+    workers: int = 1
+    worker_socket_dir: str = "data/workers"
+    # thread: gRPC worker threads / aio: threads running blocking work off the event loop
+    max_workers: int = 10
+    # RPCs beyond this are rejected with RESOURCE_EXHAUSTED (None: unlimited)
+    max_concurrent_rpcs: int | None = None
+    # Threads handling events, each for a hash partition of users so a user's events are
+    # handled in order (None: handle them on the RPC threads)
+    event_lanes: int | None = 8
+    # Queue (and ack) events before handling them, holding at most this many across the
+    # lanes (None: handle them within the RPC)
+    ingestion_queue_size: int | None = None
+    # Port of the Prometheus metrics endpoint (None: disabled)
+    metrics_port: int | None = 9100
+    # Fraction of NotifyUserEventEmitted calls to trace at startup (changeable via Admin)
+    trace_sample_rate: float = 0.0
+    # Least severe level logged (DEBUG, INFO, WARNING, ERROR), as lines or JSON lines
+    log_level: str = "INFO"
+    log_format: LogFormat = "text"
+    # Fraction of per-event and per-message log records (e.g. invalid events) written
+    log_event_sample_rate: float = 1.0
+    # Skip validating decoded events (only for trusted internal producers)
+    trusted_input: bool = False
+    # Where segment membership arrays are persisted and memory-mapped from
+    segment_dir: str = "data/segments"
+    # Users resolved (and sent as one batch) at a time by scheduled deliveries
+    audience_chunk_size: int = 10_000
+    # Evaluate scheduled deliveries' additional_filters against an in-memory columnar copy
+    # of `user_attribute`, kept current by attribute changes (single worker only)
+    attribute_table: bool = False
+    # Backend for action-based (delayed) deliveries, and the timing wheel's resolution
+    action_scheduler: ActionScheduler = "apscheduler"
+    timing_wheel_tick: float = 1.0
+    # Where pending action-based deliveries are persisted (None: in memory only)
+    pending_store_dir: str | None = "data/pending"
+    # Where the last-delivery index for `re_eligible` is persisted (None: in memory only)
+    last_delivery_dir: str | None = "data/last_delivery"
+    # Noti API endpoint and the pooled HTTP transport in front of it
+    noti_base_url: str = "http://stg-eks-backend-internal.findainsight.co.kr"
+    http_pool_size: int = 32
+    http_max_in_flight: int = 32
+    http_timeout: float = 5.0
+    # Per-channel limits, e.g. '{"noti_10000": {"rate": 100, "burst": 200, "max_concurrency": 4}}'
+    channel_limits: dict[str, dict[str, float | int | None]] = field(default_factory=dict)
+
+    @classmethod
+    def from_env(cls) -> Self:
+        server_mode = _env("SERVER_MODE", cls.server_mode)
+        if server_mode not in get_args(ServerMode):
+            raise ValueError(f"Unknown server mode: {server_mode}")
+        action_scheduler = _env("ACTION_SCHEDULER", cls.action_scheduler)
+        if action_scheduler not in get_args(ActionScheduler):
+            raise ValueError(f"Unknown action scheduler: {action_scheduler}")
+        event_lanes = _env("EVENT_LANES", cls.event_lanes, _optional_int)
+        ingestion_queue_size = _env("INGESTION_QUEUE_SIZE", cls.ingestion_queue_size, _optional_int)
+        if ingestion_queue_size is not None and event_lanes is None:
+            raise ValueError("An ingestion queue needs event lanes")
+        log_format = _env("LOG_FORMAT", cls.log_format)
+        if log_format not in get_args(LogFormat):
+            raise ValueError(f"Unknown log format: {log_format}")
+        workers = _env("WORKERS", cls.workers, int)
+        attribute_table = _env("ATTRIBUTE_TABLE", cls.attribute_table, _bool)
+        if attribute_table and workers > 1:
+            # Each worker only sees the attribute changes of its own users
+            raise ValueError("The attribute table needs a single worker")
+
+        return cls(
+            port=_env("PORT", cls.port, int),
+            server_mode=server_mode,
+            workers=workers,
+            worker_socket_dir=_env("WORKER_SOCKET_DIR", cls.worker_socket_dir),
+            max_workers=_env("MAX_WORKERS", cls.max_workers, int),
+            max_concurrent_rpcs=_env("MAX_CONCURRENT_RPCS", cls.max_concurrent_rpcs, _optional_int),
+            event_lanes=event_lanes,
+            ingestion_queue_size=ingestion_queue_size,
+            metrics_port=_env("METRICS_PORT", cls.metrics_port, _optional_int),
+            trace_sample_rate=_env("TRACE_SAMPLE_RATE", cls.trace_sample_rate, float),
+            log_level=_env("LOG_LEVEL", cls.log_level),
+            log_format=log_format,
+            log_event_sample_rate=_env("LOG_EVENT_SAMPLE_RATE", cls.log_event_sample_rate, float),
+            trusted_input=_env("TRUSTED_INPUT", cls.trusted_input, _bool),
+            segment_dir=_env("SEGMENT_DIR", cls.segment_dir),
+            audience_chunk_size=_env("AUDIENCE_CHUNK_SIZE", cls.audience_chunk_size, int),
+            attribute_table=attribute_table,
+            action_scheduler=action_scheduler,
+            timing_wheel_tick=_env("TIMING_WHEEL_TICK", cls.timing_wheel_tick, float),
+            pending_store_dir=_env("PENDING_STORE_DIR", cls.pending_store_dir, _optional_str),
+            last_delivery_dir=_env("LAST_DELIVERY_DIR", cls.last_delivery_dir, _optional_str),
+            noti_base_url=_env("NOTI_BASE_URL", cls.noti_base_url),
+            http_pool_size=_env("HTTP_POOL_SIZE", cls.http_pool_size, int),
+            http_max_in_flight=_env("HTTP_MAX_IN_FLIGHT", cls.http_max_in_flight, int),
+            http_timeout=_env("HTTP_TIMEOUT", cls.http_timeout, float),
+            channel_limits=_env("CHANNEL_LIMITS", {}, json.loads),
+        )
+
+
+settings = Settings.from_env()
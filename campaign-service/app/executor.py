@@ -0,0 +1,107 @@
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable
+
+from app.log import Logger
+from app.metrics import event_lane_depth
+from app.partition import lane_of
+
+__all__ = (
+    "ShardedExecutor",
+)
+
+_STOP = object()
+
+_log = Logger(__name__)
+
+
+class ShardedExecutor:
+    """
+    Runs tasks on `lanes` single-threaded lanes, picking the lane by hashing a key (a
+    user_id). Tasks with the same key run one at a time and in submission order, so
+    check-then-act sequences on per-user state (e.g. `exists()` then
+    `add_action_based_delivery()`) are safe without a global lock, while different users
+    proceed in parallel.
+
+    Each lane holds at most `max_pending` waiting tasks (0: unbounded): `submit()` waits
+    for room, `offer()` gives up instead.
+    """
+
+    def __init__(self, lanes: int = 8, max_pending: int = 0, name: str = "lane"):
+        self.lanes = lanes
+        self.max_pending = max_pending
+
+        self._queues = [queue.Queue(maxsize=max_pending) for _ in range(lanes)]
+        self._threads = [
+            threading.Thread(target=self._run, args=(lane_queue,), name=f"{name}-{i}", daemon=True)
+            for i, lane_queue in enumerate(self._queues)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+        event_lane_depth.set_function(self.pending)
+
+    def lane(self, key: int) -> int:
+        return lane_of(key, self.lanes)
+
+    def pending(self) -> int:
+        return sum(lane_queue.qsize() for lane_queue in self._queues)
+
+    def submit(self, key: int, fn: Callable[..., Any], /, *args) -> Future:
+        future = Future()
+        self._queues[lane_of(key, self.lanes)].put((future, fn, args))
+        return future
+
+    def try_submit(self, key: int, fn: Callable[..., Any], /, *args) -> Future | None:
+        """Like `submit()`, without waiting: None if the lane is full (e.g. on an event loop)."""
+        future = Future()
+        try:
+            self._queues[lane_of(key, self.lanes)].put_nowait((future, fn, args))
+        except queue.Full:
+            return None
+        return future
+
+    def offer(self, key: int, fn: Callable[..., Any], /, *args) -> bool:
+        """
+        Queue `fn(*args)` without waiting for room or for its result; `fn` handles its own
+        errors.
+
+        :return: Whether it was queued (False: the lane is full)
+        """
+        try:
+            self._queues[lane_of(key, self.lanes)].put_nowait((None, fn, args))
+        except queue.Full:
+            return False
+        return True
+
+    def shutdown(self) -> None:
+        """Run the tasks already queued, then stop the lanes."""
+        for lane_queue in self._queues:
+            lane_queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    @staticmethod
+    def _run(lane_queue: queue.Queue) -> None:
+        while True:
+            item = lane_queue.get()
+            if item is _STOP:
+                return
+
+            future, fn, args = item
+            if future is None:
+                try:
+                    fn(*args)
+                except Exception as e:
+                    _log.error("Unhandled error in lane task", task=fn, error=e)
+                continue
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
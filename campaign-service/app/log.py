@@ -0,0 +1,199 @@
+"""
+Structured logging that keeps writes to stdout off the request path.
+
+A log call only appends a record (timestamp, level, logger name, message and fields) to
+an in-memory ring buffer; formatting and writing happen on a background thread, which
+drains the buffer every `flush_interval` seconds and writes it in one call. If records
+arrive faster than they can be written, the oldest are dropped (and counted) rather
+than blocking callers.
+
+    _log = Logger(__name__)
+    _log.warning("Failed to forward", worker=worker, error=e)
+
+Calls below `writer.level` return before building anything; wrap costly arguments in
+`if _log.enabled(DEBUG):`. Loggers created with `per_event=True` (one record per event
+or message) are further sampled at `writer.event_sample_rate`.
+"""
+import atexit
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, UTC
+from typing import Any, Literal, TextIO
+
+__all__ = (
+    "DEBUG",
+    "INFO",
+    "WARNING",
+    "ERROR",
+    "Logger",
+    "LogWriter",
+    "parse_level",
+    "writer",
+)
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+
+_level_names = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+LogFormat = Literal["text", "json"]
+
+# (unix time, level, logger name, message, fields)
+Record = tuple[float, int, str, str, dict[str, Any]]
+
+
+def parse_level(name: str) -> int:
+    for level, level_name in _level_names.items():
+        if level_name == name.upper():
+            return level
+    raise ValueError(f"Unknown log level: {name}")
+
+
+class LogWriter:
+    """The ring buffer shared by all loggers, and the thread writing it out."""
+
+    def __init__(
+            self,
+            stream: TextIO | None = None,
+            capacity: int = 65_536,
+            flush_interval: float = 0.05,
+    ):
+        self.level = INFO
+        self.event_sample_rate = 1.0
+        self.format: LogFormat = "text"
+        self.stream = stream
+        self.flush_interval = flush_interval
+        self.dropped = 0
+
+        # deque appends and pops are atomic: callers never take a lock
+        self._buffer: deque[Record] = deque(maxlen=capacity)
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def emit(self, record: Record) -> None:
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(record)
+        if self._thread is None:
+            self._start()
+
+    def flush(self) -> None:
+        """Write out everything buffered so far."""
+        with self._write_lock:
+            lines = []
+            while True:
+                try:
+                    record = self._buffer.popleft()
+                except IndexError:
+                    break
+                lines.append(self._format(record))
+
+            dropped, self.dropped = self.dropped, 0
+            if dropped:
+                lines.append(self._format((time.time(), WARNING, __name__, "Dropped log records", {"count": dropped})))
+            if not lines:
+                return
+
+            stream = self.stream or sys.stdout
+            stream.write("".join(lines))
+            stream.flush()
+
+    def close(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                sys.stderr.write(f"Failed to write logs: {e}\n")
+
+    def _after_fork_in_child(self) -> None:
+        # The writer thread doesn't survive a fork, and the parent writes its own records
+        self._buffer.clear()
+        self.dropped = 0
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def _format(self, record: Record) -> str:
+        timestamp, level, name, message, fields = record
+        at = datetime.fromtimestamp(timestamp, UTC).isoformat(timespec="milliseconds")
+        if self.format == "json":
+            return json.dumps(
+                {"time": at, "level": _level_names[level], "logger": name, "message": message, **fields},
+                ensure_ascii=False,
+                default=_text,
+            ) + "\n"
+
+        line = f"{at} {_level_names[level]} {name}: {message}"
+        if fields:
+            line += " " + " ".join(f"{key}={_quote(_text(value))}" for key, value in fields.items())
+        return line + "\n"
+
+
+writer = LogWriter()
+atexit.register(writer.close)
+os.register_at_fork(before=writer.flush, after_in_child=writer._after_fork_in_child)
+
+
+class Logger:
+    """
+    A named source of records. Per-event loggers only let `writer.event_sample_rate` of
+    their records through, so a burst of failing events can't flood the output (their
+    counts are in the metrics).
+    """
+    __slots__ = ("name", "per_event")
+
+    def __init__(self, name: str, per_event: bool = False):
+        self.name = name
+        self.per_event = per_event
+
+    def enabled(self, level: int) -> bool:
+        if level < writer.level:
+            return False
+        return not self.per_event or writer.event_sample_rate >= 1.0 or random.random() < writer.event_sample_rate
+
+    def debug(self, message: str, **fields: Any) -> None:
+        if self.enabled(DEBUG):
+            writer.emit((time.time(), DEBUG, self.name, message, fields))
+
+    def info(self, message: str, **fields: Any) -> None:
+        if self.enabled(INFO):
+            writer.emit((time.time(), INFO, self.name, message, fields))
+
+    def warning(self, message: str, **fields: Any) -> None:
+        if self.enabled(WARNING):
+            writer.emit((time.time(), WARNING, self.name, message, fields))
+
+    def error(self, message: str, **fields: Any) -> None:
+        if self.enabled(ERROR):
+            writer.emit((time.time(), ERROR, self.name, message, fields))
+
+
+def _text(value: Any) -> str:
+    if isinstance(value, bytes):
+        return value.decode(errors="replace")
+    return str(value)
+
+
+def _quote(text: str) -> str:
+    if text and not any(c in text for c in ' "=\n'):
+        return text
+    return json.dumps(text, ensure_ascii=False)
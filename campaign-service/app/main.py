@@ -1,35 +1,305 @@
+import asyncio
+import gc
+import os
+import signal
+import sys
+import time
+import traceback
 from concurrent import futures
+from pathlib import Path
 
 import grpc
+from pymongo import MongoClient
 
-from pb.campaign_service_pb2_grpc import add_CampaignServicer_to_server
-from app.routers.campaign import CampaignRouter
+from pb.campaign_service_pb2_grpc import add_CampaignServicer_to_server, add_AdminServicer_to_server
+from app.config import settings
+from app.db.mongo import db, url as mongo_url
+from app.executor import ShardedExecutor
+from app.log import Logger, parse_level, writer as log_writer
+from app.metrics import MetricsServer
+from app.partition import Partition
+from app.routers.admin import AdminRouter, AsyncAdminRouter
+from app.routers.campaign import CampaignRouter, AsyncCampaignRouter
 from app.services.campaign import CampaignService
+from app.services.campaign.attribute_table import AttributeTable
+from app.services.campaign.eligibility import LastDeliveryIndex
+from app.services.campaign.index import CampaignIndex
+from app.services.ingestion import IngestionQueue
 from app.services.schedule import ScheduleService
-from app.services.messaging import MessagingService
+from app.services.messaging import MessagingService, create_channels
+from app.services.messaging.ratelimit import ChannelLimit
+from app.services.messaging.transport import HttpTransport
+from app.services.pending_store import PendingDeliveryStore
+from app.services.segment import SegmentStore
+from app.tracing import tracer
 
+_log = Logger(__name__)
 
-def serve():
-    port = 50051
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=1))
-    server.add_insecure_port(f"[::]:{port}")
 
-    # Create services
-    schedule_service = ScheduleService()
-    messaging_service = MessagingService()
+def _worker_dir(directory: str | None, partition: Partition | None) -> str | None:
+    # Per-user state is owned by one worker, so each keeps its own files
+    if directory is None or partition is None:
+        return directory
+    return os.path.join(directory, f"worker-{partition.worker}")
+
+
+def create_campaign_service(
+        partition: Partition | None = None,
+        campaign_index: CampaignIndex | None = None,
+) -> CampaignService:
+    pending_store = None
+    if settings.pending_store_dir is not None:
+        pending_store = PendingDeliveryStore(directory=_worker_dir(settings.pending_store_dir, partition))
+    schedule_service = ScheduleService(
+        action_scheduler=settings.action_scheduler,
+        wheel_tick=settings.timing_wheel_tick,
+        pending_store=pending_store,
+    )
+    noti_transport = HttpTransport(
+        base_url=settings.noti_base_url,
+        pool_size=settings.http_pool_size,
+        max_in_flight=settings.http_max_in_flight,
+        timeout=settings.http_timeout,
+    )
+    messaging_service = MessagingService(
+        channels=create_channels(noti_transport),
+        limits={
+            channel: ChannelLimit(**limit)
+            for channel, limit in settings.channel_limits.items()
+        },
+    )
+    if campaign_index is None:
+        campaign_index = CampaignIndex(collection=db.campaign)
+    campaign_index.start()
+    segment_store = SegmentStore(directory=settings.segment_dir)
+    segment_store.open()
+    last_deliveries = LastDeliveryIndex(
+        campaign_index=campaign_index,
+        directory=_worker_dir(settings.last_delivery_dir, partition),
+    )
+    last_deliveries.start()
+    attribute_table = None
+    if settings.attribute_table:
+        attribute_table = AttributeTable()
+        loaded = attribute_table.load(db.user_attribute.find({}, projection={"_id": False}))
+        _log.info("Loaded attribute table", users=loaded)
+
     campaign_service = CampaignService(
         schedule_service=schedule_service,
         messaging_service=messaging_service,
+        campaign_index=campaign_index,
+        segment_store=segment_store,
+        audience_chunk_size=settings.audience_chunk_size,
+        last_deliveries=last_deliveries,
+        attribute_table=attribute_table,
+    )
+    campaign_service.restore_action_based_deliveries()
+    if partition is None or partition.worker == 0:
+        campaign_service.resume_scheduled_deliveries()
+
+    tracer.sample_rate = settings.trace_sample_rate
+    if settings.metrics_port is not None:
+        metrics_port = settings.metrics_port + (partition.worker if partition is not None else 0)
+        MetricsServer(metrics_port).start()
+        _log.info("Metrics available", port=metrics_port, path="/metrics")
+
+    return campaign_service
+
+
+def create_lanes() -> ShardedExecutor | None:
+    if settings.event_lanes is None:
+        return None
+
+    max_pending = 0
+    if settings.ingestion_queue_size is not None:
+        max_pending = max(1, settings.ingestion_queue_size // settings.event_lanes)
+    return ShardedExecutor(lanes=settings.event_lanes, max_pending=max_pending, name="event-lane")
+
+
+def create_ingestion_queue(
+        campaign_service: CampaignService,
+        lanes: ShardedExecutor | None,
+) -> IngestionQueue | None:
+    if settings.ingestion_queue_size is None:
+        return None
+    return IngestionQueue(handler=campaign_service.handle_user_event, lanes=lanes)
+
+
+def _add_ports(server: grpc.Server | grpc.aio.Server, partition: Partition | None) -> str:
+    server.add_insecure_port(f"[::]:{settings.port}")
+    if partition is None:
+        return f"{settings.port}"
+
+    # Forwarded events (and admin calls for this worker in particular) come in here
+    server.add_insecure_port(partition.address(partition.worker))
+    return f"{settings.port} and {partition.address(partition.worker)} (worker {partition.worker})"
+
+
+def serve(partition: Partition | None = None, campaign_index: CampaignIndex | None = None):
+    server = _thread_server("grpc")
+    listening = _add_ports(server, None)
+    servers = [server]
+    if partition is not None:
+        # Forwarded calls are served from a pool of their own: forwarding blocks a thread
+        # until the owner answers, so with one shared pool, workers whose threads all wait
+        # on each other would stall until the forward timeout
+        peer_server = _thread_server("grpc-peer")
+        peer_server.add_insecure_port(partition.address(partition.worker))
+        listening += f" and {partition.address(partition.worker)} (worker {partition.worker})"
+        servers.append(peer_server)
+
+    # Create services
+    campaign_service = create_campaign_service(partition, campaign_index)
+
+    lanes = create_lanes()
+
+    # Add router(servicer)s to the servers
+    servicer = CampaignRouter(
+        campaign_service=campaign_service,
+        trusted_input=settings.trusted_input,
+        partition=partition,
+        lanes=lanes,
+        ingestion_queue=create_ingestion_queue(campaign_service, lanes),
     )
+    admin = AdminRouter()
+    for grpc_server in servers:
+        add_CampaignServicer_to_server(servicer, grpc_server)
+        add_AdminServicer_to_server(admin, grpc_server)
+        grpc_server.start()
+
+    _log.info("Server started", mode="thread", listening=listening)
+    server.wait_for_termination()
+
+
+def _thread_server(thread_name_prefix: str) -> grpc.Server:
+    return grpc.server(
+        futures.ThreadPoolExecutor(max_workers=settings.max_workers, thread_name_prefix=thread_name_prefix),
+        maximum_concurrent_rpcs=settings.max_concurrent_rpcs,
+        options=[("grpc.so_reuseport", 1)],
+    )
+
+
+async def serve_aio(partition: Partition | None = None, campaign_index: CampaignIndex | None = None):
+    server = grpc.aio.server(
+        maximum_concurrent_rpcs=settings.max_concurrent_rpcs,
+        options=[("grpc.so_reuseport", 1)],
+    )
+    listening = _add_ports(server, partition)
+
+    # Create services
+    campaign_service = create_campaign_service(partition, campaign_index)
+    executor = futures.ThreadPoolExecutor(
+        max_workers=settings.max_workers,
+        thread_name_prefix="campaign-router",
+    )
+    lanes = create_lanes()
 
     # Add router(servicer)s to the server
-    servicer = CampaignRouter(campaign_service=campaign_service)
+    servicer = AsyncCampaignRouter(
+        campaign_service=campaign_service,
+        executor=executor,
+        trusted_input=settings.trusted_input,
+        partition=partition,
+        lanes=lanes,
+        ingestion_queue=create_ingestion_queue(campaign_service, lanes),
+    )
     add_CampaignServicer_to_server(servicer, server)
+    add_AdminServicer_to_server(AsyncAdminRouter(), server)
 
-    server.start()
-    print(f"Server started, listening on {port}")
-    server.wait_for_termination()
+    await server.start()
+    _log.info("Server started", mode="aio", listening=listening)
+    try:
+        await server.wait_for_termination()
+    finally:
+        executor.shutdown()
+
+
+def serve_prefork():
+    """
+    Runs `settings.workers` server processes on the same port (SO_REUSEPORT), each owning
+    a hash partition of users (see `app.partition`), and restarts any that die.
+
+    The campaign index is loaded once here and frozen out of the GC before forking, so
+    workers start from the same copy-on-write pages and later reloads keep unchanged
+    documents; segments are mmap'd and shared through the page cache. No gRPC objects
+    or Mongo connections may be created here: they don't survive a fork, so the index is
+    loaded through a client of its own, closed before forking, and workers connect the
+    shared client after the fork.
+    """
+    with MongoClient(mongo_url) as client:
+        campaign_index = CampaignIndex(collection=client[db.name].campaign)
+        campaign_index.reload()
+    campaign_index.collection = db.campaign
+    gc.freeze()
+    Path(settings.worker_socket_dir).mkdir(parents=True, exist_ok=True)
+
+    workers = {_fork_worker(worker, campaign_index): worker for worker in range(settings.workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    _log.info("Started workers", workers=settings.workers, port=settings.port)
+
+    while workers:
+        pid, status = os.wait()
+        worker = workers.pop(pid, None)
+        if worker is None or stopping:
+            continue
+        _log.warning("Worker exited, restarting", worker=worker, status=os.waitstatus_to_exitcode(status))
+        time.sleep(1)
+        workers[_fork_worker(worker, campaign_index)] = worker
+
+
+def _fork_worker(worker: int, campaign_index: CampaignIndex) -> int:
+    pid = os.fork()
+    if pid != 0:
+        return pid
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    status = 0
+    try:
+        partition = Partition(worker, settings.workers, settings.worker_socket_dir)
+        match settings.server_mode:
+            case "aio":
+                asyncio.run(serve_aio(partition, campaign_index))
+            case "thread":
+                serve(partition, campaign_index)
+    except KeyboardInterrupt:
+        pass
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    finally:
+        # os._exit skips the interpreter's own flushing (and atexit)
+        log_writer.close()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+
+def configure_logging() -> None:
+    log_writer.level = parse_level(settings.log_level)
+    log_writer.format = settings.log_format
+    log_writer.event_sample_rate = settings.log_event_sample_rate
 
 
 if __name__ == "__main__":
-    serve()
+    configure_logging()
+    if settings.workers > 1:
+        serve_prefork()
+    else:
+        match settings.server_mode:
+            case "aio":
+                asyncio.run(serve_aio())
+            case "thread":
+                serve()
@@ -0,0 +1,362 @@
+"""
+In-process metrics, exposed in the Prometheus text format.
+
+Recording is a lock-protected add on a pre-resolved child (bind labels once with
+`labels()` outside hot loops), so it stays well under a microsecond. Gauges that mirror
+a size elsewhere (queue depths, pending jobs) are computed by a function at scrape time
+and cost nothing in between.
+
+    requests = Counter("example_requests_total", "Requests handled", ("result",))
+    requests_ok = requests.labels("ok")
+    requests_ok.inc()
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterator, Sequence
+
+__all__ = (
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "MetricsServer",
+    "Registry",
+    "registry",
+    "stage_seconds",
+    "events_total",
+    "events_forwarded_total",
+    "deliveries_total",
+    "attributes_total",
+    "attribute_updates_total",
+    "send_seconds",
+    "messages_total",
+    "pending_deliveries",
+    "due_queue_depth",
+    "timing_wheel_timers",
+    "indexed_campaigns",
+    "last_delivery_entries",
+    "attribute_state_users",
+    "attribute_table_users",
+    "event_lane_depth",
+)
+
+# Seconds, from 10us to 10s
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, "_Metric"] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric") -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type: str
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: Registry | None = registry):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values: str):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._child())
+        return child
+
+    def _child(self):
+        raise NotImplementedError()
+
+    def _items(self) -> list[tuple[tuple[str, ...], object]]:
+        with self._lock:
+            return list(self._children.items())
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError()
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def samples(self) -> Iterator[str]:
+        for key, child in self._items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Callable[[], float] | None = None
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Compute the value at scrape time instead."""
+        self.function = function
+
+    def get(self) -> float:
+        return self.function() if self.function is not None else self.value
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def _child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self.labels().set_function(function)
+
+    def samples(self) -> Iterator[str]:
+        for key, child in self._items():
+            try:
+                value = child.get()
+            except Exception:
+                continue
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last: +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            help: str,
+            labelnames: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS,
+            registry: Registry | None = registry,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def _child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> Iterator[str]:
+        bucket_labelnames = (*self.labelnames, "le")
+        for key, child in self._items():
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                labels = _format_labels(bucket_labelnames, (*key, _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: Registry = registry
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """Serves `GET /metrics` from a background thread."""
+
+    daemon_threads = True
+
+    def __init__(self, port: int, host: str = "0.0.0.0", registry: Registry = registry):
+        handler = type("Handler", (_MetricsHandler,), {"registry": registry})
+        super().__init__((host, port), handler)
+
+    def start(self) -> "MetricsServer":
+        threading.Thread(target=self.serve_forever, name="metrics", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+# Pipeline metrics
+
+stage_seconds = Histogram(
+    "campaign_stage_seconds",
+    "Time spent in each event-handling stage",
+    ("stage",),
+)
+events_total = Counter(
+    "campaign_events_total",
+    "User events received, by outcome",
+    ("result",),
+)
+events_forwarded_total = Counter(
+    "campaign_events_forwarded_total",
+    "User events and attribute changes forwarded to the worker that owns the user",
+)
+attributes_total = Counter(
+    "campaign_attributes_total",
+    "User attribute changes received, by outcome",
+    ("result",),
+)
+attribute_updates_total = Counter(
+    "campaign_attribute_updates_total",
+    "Updates of triggering attributes, by whether the value actually changed",
+    ("result",),
+)
+deliveries_total = Counter(
+    "campaign_deliveries_total",
+    "Messages sent for campaigns, by campaign type and channel",
+    ("campaign_type", "channel", "result"),
+)
+send_seconds = Histogram(
+    "messaging_send_seconds",
+    "Duration of channel send and send_batch calls",
+    ("channel", "method"),
+)
+messages_total = Counter(
+    "messaging_messages_total",
+    "Messages handed to channels, by outcome",
+    ("channel", "result"),
+)
+pending_deliveries = Gauge(
+    "schedule_pending_deliveries",
+    "Action-based deliveries waiting to be sent",
+)
+due_queue_depth = Gauge(
+    "schedule_due_queue_depth",
+    "Batches of due action-based deliveries waiting for a worker",
+)
+timing_wheel_timers = Gauge(
+    "schedule_timing_wheel_timers",
+    "Timers in the timing wheel",
+)
+indexed_campaigns = Gauge(
+    "campaign_index_campaigns",
+    "Active action-based campaigns in the index",
+)
+last_delivery_entries = Gauge(
+    "campaign_last_delivery_entries",
+    "Entries of the last-delivery (re_eligible) index",
+)
+attribute_state_users = Gauge(
+    "campaign_attribute_state_users",
+    "Users with a tracked last value of a triggering attribute",
+)
+attribute_table_users = Gauge(
+    "campaign_attribute_table_users",
+    "Users in the columnar attribute table used for additional_filters",
+)
+event_lane_depth = Gauge(
+    "campaign_event_lane_depth",
+    "Events and attribute changes waiting in the per-user lanes (in queue mode: accepted, not yet handled)",
+)
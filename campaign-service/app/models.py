@@ -3,7 +3,22 @@ from typing import Any, Self
 
 from pydantic import BaseModel
 
-from pb.campaign_service_pb2 import UserEventMessage, UserAttributeMessage
+from pb.campaign_service_pb2 import UserEventMessage, UserAttributeMessage, PropertyValue
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+
+def _value(value: PropertyValue) -> Any:
+    kind = value.WhichOneof("kind")
+    return getattr(value, kind) if kind is not None else None
+
+
+def _properties(message: UserEventMessage) -> dict[str, Any]:
+    return {name: _value(value) for name, value in message.event_properties.items()}
 
 
 class UserEvent(BaseModel):
@@ -13,6 +28,13 @@ class UserEvent(BaseModel):
 
     @classmethod
     def from_message(cls, message: UserEventMessage) -> Self:
+        if message.event_name:
+            return cls(
+                user_id=message.user_id,
+                event_name=message.event_name,
+                event_properties=_properties(message),
+            )
+
         event_data = json.loads(message.event_data.json)
         return cls(
             user_id=message.user_id,
@@ -28,9 +50,106 @@ class UserAttribute(BaseModel):
 
     @classmethod
     def from_message(cls, message: UserAttributeMessage) -> Self:
+        if message.attribute_name:
+            return cls(
+                user_id=message.user_id,
+                attribute_name=message.attribute_name,
+                attribute_value=_value(message.attribute_value),
+            )
+
         attribute_data = json.loads(message.attribute_data.json)
         return cls(
             user_id=message.user_id,
             attribute_name=attribute_data["attribute_name"],
             attribute_value=attribute_data["attribute_value"],
         )
+
+
+# Hot-path counterparts of the models above: plain `__slots__` objects. Typed messages
+# need no checks; JSON payloads are decoded with orjson (when installed) and
+# `from_message(..., validate=False)` skips even their type checks, for trusted internal
+# producers.
+
+class UserEventRecord:
+    __slots__ = ("user_id", "event_name", "_event_properties", "_message")
+
+    def __init__(self, user_id: int, event_name: str, event_properties: dict[str, Any] | None):
+        self.user_id = user_id
+        self.event_name = event_name
+        self._event_properties = event_properties
+        self._message: UserEventMessage | None = None
+
+    @property
+    def event_properties(self) -> dict[str, Any]:
+        # Typed properties are only converted when first needed; most events trigger
+        # no campaign and never look at them
+        if self._event_properties is None:
+            self._event_properties = _properties(self._message) if self._message is not None else {}
+            self._message = None
+        return self._event_properties
+
+    @classmethod
+    def from_message(cls, message: UserEventMessage, validate: bool = True) -> Self:
+        if message.event_name:
+            record = cls(message.user_id, message.event_name, None)
+            record._message = message
+            return record
+
+        event_data = _loads(message.event_data.json)
+        event_name, event_properties = event_data["event_name"], event_data["event_properties"]
+        if validate:
+            if not isinstance(event_name, str):
+                raise ValueError(f"event_name must be a string: {event_name!r}")
+            if not isinstance(event_properties, dict):
+                raise ValueError(f"event_properties must be an object: {event_properties!r}")
+        return cls(message.user_id, event_name, event_properties)
+
+    def to_model(self) -> UserEvent:
+        return UserEvent(
+            user_id=self.user_id,
+            event_name=self.event_name,
+            event_properties=self.event_properties,
+        )
+
+    def __str__(self) -> str:
+        return f"user_id={self.user_id!r} event_name={self.event_name!r} event_properties={self.event_properties!r}"
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self})"
+
+
+class UserAttributeRecord:
+    __slots__ = ("user_id", "attribute_name", "attribute_value")
+
+    def __init__(self, user_id: int, attribute_name: str, attribute_value: Any):
+        self.user_id = user_id
+        self.attribute_name = attribute_name
+        self.attribute_value = attribute_value
+
+    @classmethod
+    def from_message(cls, message: UserAttributeMessage, validate: bool = True) -> Self:
+        if message.attribute_name:
+            return cls(message.user_id, message.attribute_name, _value(message.attribute_value))
+
+        attribute_data = _loads(message.attribute_data.json)
+        attribute_name = attribute_data["attribute_name"]
+        if validate and not isinstance(attribute_name, str):
+            raise ValueError(f"attribute_name must be a string: {attribute_name!r}")
+        return cls(message.user_id, attribute_name, attribute_data["attribute_value"])
+
+    def to_model(self) -> UserAttribute:
+        return UserAttribute(
+            user_id=self.user_id,
+            attribute_name=self.attribute_name,
+            attribute_value=self.attribute_value,
+        )
+
+    def __str__(self) -> str:
+        return f"user_id={self.user_id!r} attribute_name={self.attribute_name!r} attribute_value={self.attribute_value!r}"
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self})"
+
+
+AnyUserEvent = UserEvent | UserEventRecord
+AnyUserAttribute = UserAttribute | UserAttributeRecord
@@ -0,0 +1,55 @@
+"""
+Partitioning of users across server worker processes.
+
+With `workers > 1` every worker accepts connections on the shared port, but each user
+is owned by exactly one worker: events for other users are forwarded to their owner over
+its unix socket, so scheduler state (pending deliveries, last deliveries) for a user only
+ever lives in one process.
+"""
+import os
+from pathlib import Path
+
+__all__ = (
+    "Partition",
+    "partition_of",
+    "lane_of",
+)
+
+_MASK = (1 << 64) - 1
+
+
+def partition_of(user_id: int, partitions: int) -> int:
+    # Fibonacci hashing: sequential or strided user ids still spread evenly
+    return (((user_id * 0x9E3779B97F4A7C15) & _MASK) >> 32) % partitions
+
+
+def lane_of(user_id: int, lanes: int) -> int:
+    """
+    A lane (e.g. thread) for the user within one worker. Hashed independently of
+    `partition_of`, so a worker's users still spread over all of its lanes.
+    """
+    h = ((user_id + 0x632BE59BD9B4E019) * 0x9E3779B97F4A7C15) & _MASK
+    h ^= h >> 31
+    h = (h * 0xBF58476D1CE4E5B9) & _MASK
+    h ^= h >> 29
+    return (h >> 32) % lanes
+
+
+class Partition:
+    """This worker's slice of users, and where the other workers listen."""
+
+    def __init__(self, worker: int, workers: int, socket_dir: str | os.PathLike):
+        if not 0 <= worker < workers:
+            raise ValueError(f"Worker {worker} out of range for {workers} workers")
+        self.worker = worker
+        self.workers = workers
+        self.socket_dir = Path(socket_dir)
+
+    def owner(self, user_id: int) -> int:
+        return partition_of(user_id, self.workers)
+
+    def owns(self, user_id: int) -> bool:
+        return partition_of(user_id, self.workers) == self.worker
+
+    def address(self, worker: int) -> str:
+        return f"unix:{self.socket_dir / f'worker-{worker}.sock'}"
@@ -0,0 +1,87 @@
+"""
+Sampling profiler for a running process.
+
+A background thread reads every thread's current frame (`sys._current_frames()`) each
+`interval` and counts the stacks, so the profiled code runs unmodified and the cost is
+one stack walk per thread per sample. Results are in the collapsed format read by
+flamegraph.pl and speedscope:
+
+    MainThread;serve (app/main.py:68);wait_for_termination (grpc/_server.py:1180) 412
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import CodeType, FrameType
+
+__all__ = (
+    "SamplingProfiler",
+    "collapse",
+)
+
+
+def _label(code: CodeType) -> str:
+    # Last two path components: enough to tell `campaign/__init__.py` from `messaging/__init__.py`
+    filename = os.path.join(*code.co_filename.split(os.sep)[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = 0
+
+        self._stacks: Counter[str] = Counter()
+        self._labels: dict[CodeType, str] = {}
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "SamplingProfiler":
+        if self._thread is not None:
+            raise RuntimeError("Profiler already started")
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter[str]:
+        """:return: Sample counts by collapsed stack"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self._stacks
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        next_sample = time.perf_counter()
+        while not self._stopped.is_set():
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self._stacks[self._collapse(names.get(ident, str(ident)), frame)] += 1
+            self.samples += 1
+
+            next_sample += self.interval
+            delay = next_sample - time.perf_counter()
+            if delay > 0:
+                self._stopped.wait(delay)
+            else:
+                # Sampling fell behind (e.g. a long GIL hold); don't burst to catch up
+                next_sample = time.perf_counter()
+
+    def _collapse(self, thread_name: str, frame: FrameType | None) -> str:
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = _label(code)
+            labels.append(label)
+            frame = frame.f_back
+        labels.append(thread_name)
+        return ";".join(reversed(labels))
+
+
+def collapse(stacks: Counter[str]) -> str:
+    """Render stack counts as collapsed-stack lines, most sampled first."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
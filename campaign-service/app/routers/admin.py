@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+
+import grpc
+
+from pb.campaign_service_pb2_grpc import AdminServicer
+from pb.campaign_service_pb2 import (
+    ProfileRequest, ProfileResponse, TraceSampleRate, TracesRequest, TracesResponse, Trace, Span,
+)
+from app.log import Logger
+from app.profiling import SamplingProfiler, collapse
+from app.tracing import Trace as RecordedTrace, Tracer, tracer as default_tracer
+
+MAX_PROFILE_SECONDS = 300.0
+
+_log = Logger(__name__)
+
+
+def _as_message(trace: RecordedTrace) -> Trace:
+    return Trace(
+        name=trace.name,
+        attributes={name: str(value) for name, value in trace.attributes.items()},
+        timestamp=trace.timestamp,
+        duration_ms=trace.duration * 1000,
+        spans=[
+            Span(name=name, start_ms=start * 1000, duration_ms=duration * 1000)
+            for name, start, duration in trace.spans
+        ],
+    )
+
+
+class AdminRouter(AdminServicer):
+    """
+    Profiling and tracing of the running server. One profile runs at a time; `Profile`
+    blocks for the requested duration.
+    """
+
+    def __init__(self, tracer: Tracer = default_tracer):
+        self.tracer = tracer
+        self._profiling = threading.Lock()
+
+    def Profile(
+            self,
+            message: ProfileRequest,
+            context: grpc.ServicerContext,
+    ):
+        try:
+            profiler = self._start_profiler(message)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        except RuntimeError as e:
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, str(e))
+
+        try:
+            time.sleep(message.seconds)
+        finally:
+            response = self._stop_profiler(profiler)
+        return response
+
+    def SetTraceSampleRate(
+            self,
+            message: TraceSampleRate,
+            context: grpc.ServicerContext,
+    ):
+        if not 0.0 <= message.sample_rate <= 1.0:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "sample_rate must be between 0 and 1")
+
+        previous = self.tracer.sample_rate
+        self.tracer.sample_rate = message.sample_rate
+        _log.info("Trace sample rate changed", previous=previous, sample_rate=message.sample_rate)
+        return TraceSampleRate(sample_rate=previous)
+
+    def GetTraces(
+            self,
+            message: TracesRequest,
+            context: grpc.ServicerContext,
+    ):
+        return TracesResponse(traces=[_as_message(trace) for trace in self.tracer.recent(message.limit)])
+
+    def _start_profiler(self, message: ProfileRequest) -> SamplingProfiler:
+        if not 0.0 < message.seconds <= MAX_PROFILE_SECONDS:
+            raise ValueError(f"seconds must be in (0, {MAX_PROFILE_SECONDS}]")
+        if message.interval < 0.0:
+            raise ValueError("interval must not be negative")
+        if not self._profiling.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+
+        _log.info("Profiling", seconds=message.seconds)
+        return SamplingProfiler(interval=message.interval or 0.005).start()
+
+    def _stop_profiler(self, profiler: SamplingProfiler) -> ProfileResponse:
+        try:
+            stacks = profiler.stop()
+        finally:
+            self._profiling.release()
+        return ProfileResponse(collapsed=collapse(stacks), samples=profiler.samples)
+
+
+class AsyncAdminRouter(AdminServicer):
+    """`grpc.aio` servicer; `Profile` waits on the event loop while the sampler runs."""
+
+    def __init__(self, tracer: Tracer = default_tracer):
+        self._router = AdminRouter(tracer=tracer)
+
+    async def Profile(
+            self,
+            message: ProfileRequest,
+            context: grpc.aio.ServicerContext,
+    ):
+        try:
+            profiler = self._router._start_profiler(message)
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        except RuntimeError as e:
+            await context.abort(grpc.StatusCode.FAILED_PRECONDITION, str(e))
+
+        try:
+            await asyncio.sleep(message.seconds)
+        finally:
+            # Joins the sampler thread, which wakes within one interval
+            response = self._router._stop_profiler(profiler)
+        return response
+
+    async def SetTraceSampleRate(
+            self,
+            message: TraceSampleRate,
+            context: grpc.aio.ServicerContext,
+    ):
+        if not 0.0 <= message.sample_rate <= 1.0:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "sample_rate must be between 0 and 1")
+        return self._router.SetTraceSampleRate(message, context)
+
+    async def GetTraces(
+            self,
+            message: TracesRequest,
+            context: grpc.aio.ServicerContext,
+    ):
+        return self._router.GetTraces(message, context)
@@ -1,24 +1,465 @@
+import asyncio
+import threading
+from concurrent.futures import Executor
+from time import perf_counter
+from typing import AsyncIterator, Callable, Iterable, Iterator, TypeVar
+
 import grpc
 
-from pb.campaign_service_pb2_grpc import CampaignServicer
-from pb.campaign_service_pb2 import UserEventMessage, Response
-from app.models import UserEvent
+from pb.campaign_service_pb2_grpc import CampaignServicer, CampaignStub
+from pb.campaign_service_pb2 import (
+    UserEventMessage, UserEventBatch, UserAttributeMessage, Response, BatchResponse,
+)
+from app.executor import ShardedExecutor
+from app.log import Logger
+from app.metrics import attributes_total, events_forwarded_total, events_total, stage_seconds
+from app.models import UserEventRecord, UserAttributeRecord
+from app.partition import Partition
 from app.services.campaign import CampaignService
+from app.services.ingestion import IngestionQueue
+from app.tracing import record_span, tracer
+
+T = TypeVar("T")
+
+_decode_seconds = stage_seconds.labels("decode")
+_events_ok = events_total.labels("ok")
+_events_invalid = events_total.labels("invalid")
+_events_failed = events_total.labels("failed")
+_attributes_ok = attributes_total.labels("ok")
+_attributes_invalid = attributes_total.labels("invalid")
+_attributes_failed = attributes_total.labels("failed")
+
+_event_log = Logger(__name__, per_event=True)
+
+_RETRYABLE = (grpc.StatusCode.RESOURCE_EXHAUSTED, grpc.StatusCode.UNAVAILABLE)
+
+
+def _group_by_owner(partition: Partition, messages: list[UserEventMessage]) -> dict[int, list[int]]:
+    """:return: Positions of the messages, by the worker that owns their user"""
+    positions: dict[int, list[int]] = {}
+    for position, message in enumerate(messages):
+        positions.setdefault(partition.owner(message.user_id), []).append(position)
+    return positions
+
+
+def _forward_failed(worker: int, e: grpc.RpcError) -> Response:
+    """
+    The owner is overloaded (its ingestion queue is full) or restarting: passed on with
+    `retry` set, so the producer backs off instead of dropping the events.
+    """
+    _event_log.warning("Failed to forward", worker=worker, error=e)
+    return Response(
+        success=False,
+        reason=f"Worker {worker} unavailable ({e.code().name})",
+        retry=e.code() in _RETRYABLE,
+    )
 
 
 class CampaignRouter(CampaignServicer):
-    def __init__(self, campaign_service: CampaignService):
+    """
+    Events are decoded into `UserEventRecord`s. With `trusted_input` (internal producers
+    only), even their type checks are skipped.
+
+    With a `partition` (multi-process serving), events for users this worker doesn't own
+    are forwarded to the worker that does, and batches are split by owner. Forwarding
+    blocks the calling thread, so the owner must serve forwarded calls from threads that
+    never forward themselves (see `app.main.serve`).
+
+    With `lanes`, events and attribute changes are handled on their user's lane, so
+    concurrent RPCs for one user are handled one at a time and in order. If the lanes
+    are bounded and the user's lane is full, the RPC fails with RESOURCE_EXHAUSTED.
+
+    With an `ingestion_queue` (on the same lanes), decoded events are queued and
+    acknowledged right away. Events that don't fit are rejected with `retry` set; for
+    `NotifyUserEventEmitted` the RPC fails with RESOURCE_EXHAUSTED instead.
+    """
+
+    def __init__(
+            self,
+            campaign_service: CampaignService,
+            trusted_input: bool = False,
+            partition: Partition | None = None,
+            forward_timeout: float = 10.0,
+            lanes: ShardedExecutor | None = None,
+            ingestion_queue: IngestionQueue | None = None,
+    ):
         self.campaign_service = campaign_service
+        self.trusted_input = trusted_input
+        self.partition = partition
+        self.forward_timeout = forward_timeout
+        self.lanes = lanes
+        self.ingestion_queue = ingestion_queue
+
+        self._peers: dict[int, CampaignStub] = {}
+        self._peers_lock = threading.Lock()
 
     def NotifyUserEventEmitted(
             self,
             message: UserEventMessage,
             context: grpc.ServicerContext,
     ):
+        if self.partition is not None and not self.partition.owns(message.user_id):
+            owner = self.partition.owner(message.user_id)
+            events_forwarded_total.inc()
+            try:
+                return self._peer(owner).NotifyUserEventEmitted(message, timeout=self.forward_timeout)
+            except grpc.RpcError as e:
+                response = _forward_failed(owner, e)
+                if response.retry:
+                    context.abort(e.code(), response.reason)
+                return response
+
+        if self.ingestion_queue is None:
+            return self._run_for(context, message.user_id, self._notify_user_event_emitted, message)
+
+        response = self._notify_user_event_emitted(message)
+        if response.retry:
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, response.reason)
+        return response
+
+    def _notify_user_event_emitted(self, message: UserEventMessage) -> Response:
+        with tracer.sample("NotifyUserEventEmitted", user_id=message.user_id):
+            started = perf_counter()
+            try:
+                event = UserEventRecord.from_message(message, validate=not self.trusted_input)
+            except Exception as e:
+                _event_log.warning("Invalid event", user_id=message.user_id, error=e)
+                _events_invalid.inc()
+                return Response(success=False, reason=str(e))
+            elapsed = perf_counter() - started
+            _decode_seconds.observe(elapsed)
+            record_span("decode", started, elapsed)
+
+            if self.ingestion_queue is not None:
+                return self._enqueue(event)
+
+            try:
+                self.campaign_service.handle_user_event(event)
+                _events_ok.inc()
+                return Response(success=True, reason="OK")
+            except Exception as e:
+                _event_log.error("Failed to handle event", user_id=event.user_id, error=e)
+                _events_failed.inc()
+                return Response(success=False, reason=str(e))
+
+    def _enqueue(self, event: UserEventRecord) -> Response:
+        if self.ingestion_queue.submit(event):
+            return Response(success=True, reason="Queued")
+        return Response(success=False, reason="Ingestion queue is full", retry=True)
+
+    def NotifyUserAttributeChanged(
+            self,
+            message: UserAttributeMessage,
+            context: grpc.ServicerContext,
+    ):
+        if self.partition is not None and not self.partition.owns(message.user_id):
+            owner = self.partition.owner(message.user_id)
+            events_forwarded_total.inc()
+            try:
+                return self._peer(owner).NotifyUserAttributeChanged(message, timeout=self.forward_timeout)
+            except grpc.RpcError as e:
+                response = _forward_failed(owner, e)
+                if response.retry:
+                    context.abort(e.code(), response.reason)
+                return response
+
+        return self._run_for(context, message.user_id, self._notify_user_attribute_changed, message)
+
+    def _notify_user_attribute_changed(self, message: UserAttributeMessage) -> Response:
         try:
-            event = UserEvent.from_message(message)
-            self.campaign_service.handle_user_event(event)
+            attr = UserAttributeRecord.from_message(message, validate=not self.trusted_input)
+        except Exception as e:
+            _event_log.warning("Invalid attribute change", user_id=message.user_id, error=e)
+            _attributes_invalid.inc()
+            return Response(success=False, reason=str(e))
+
+        try:
+            self.campaign_service.handle_user_attribute(attr)
+            _attributes_ok.inc()
             return Response(success=True, reason="OK")
         except Exception as e:
-            print(e)
+            _event_log.error("Failed to handle attribute change", user_id=attr.user_id, error=e)
+            _attributes_failed.inc()
             return Response(success=False, reason=str(e))
+
+    def NotifyUserEventsEmitted(
+            self,
+            message: UserEventBatch,
+            context: grpc.ServicerContext,
+    ):
+        return self._route_user_events(message.events)
+
+    def StreamUserEvents(
+            self,
+            messages: Iterator[UserEventMessage],
+            context: grpc.ServicerContext,
+    ):
+        return self._route_user_events(messages)
+
+    def _route_user_events(self, messages: Iterable[UserEventMessage]) -> BatchResponse:
+        if self.partition is None:
+            return self._handle_user_events(messages)
+
+        messages = list(messages)
+        positions = _group_by_owner(self.partition, messages)
+        local = positions.pop(self.partition.worker, [])
+        forwarded = {
+            owner: self._peer(owner).NotifyUserEventsEmitted.future(
+                UserEventBatch(events=[messages[position] for position in owner_positions]),
+                timeout=self.forward_timeout,
+            )
+            for owner, owner_positions in positions.items()
+        }
+        events_forwarded_total.inc(len(messages) - len(local))
+
+        results: list[Response | None] = [None] * len(messages)
+        if local:
+            response = self._handle_user_events([messages[position] for position in local])
+            for position, result in zip(local, response.results):
+                results[position] = result
+        for owner, future in forwarded.items():
+            try:
+                owner_results = future.result().results
+            except grpc.RpcError as e:
+                owner_results = [_forward_failed(owner, e)] * len(positions[owner])
+            for position, result in zip(positions[owner], owner_results):
+                results[position] = result
+
+        return BatchResponse(results=results)
+
+    def _run_for(
+            self,
+            context: grpc.ServicerContext,
+            user_id: int,
+            handler: Callable[..., T],
+            *args,
+    ) -> T:
+        if self.lanes is None:
+            return handler(*args)
+
+        # Bounded lanes (with an ingestion queue) can be full: fail instead of holding the
+        # RPC thread, as the aio router does
+        future = self.lanes.try_submit(user_id, handler, *args)
+        if future is None:
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Event lane is full")
+        return future.result()
+
+    def _peer(self, worker: int) -> CampaignStub:
+        peer = self._peers.get(worker)
+        if peer is None:
+            with self._peers_lock:
+                peer = self._peers.get(worker)
+                if peer is None:
+                    channel = grpc.insecure_channel(self.partition.address(worker))
+                    peer = self._peers[worker] = CampaignStub(channel)
+        return peer
+
+    def _handle_user_events(self, messages: Iterable[UserEventMessage]) -> BatchResponse:
+        results: list[Response] = []
+        events: list[UserEventRecord] = []
+        positions: list[int] = []
+
+        for message in messages:
+            started = perf_counter()
+            try:
+                event = UserEventRecord.from_message(message, validate=not self.trusted_input)
+            except Exception as e:
+                _event_log.warning("Invalid event", user_id=message.user_id, error=e)
+                _events_invalid.inc()
+                results.append(Response(success=False, reason=str(e)))
+                continue
+            _decode_seconds.observe(perf_counter() - started)
+
+            if self.ingestion_queue is not None:
+                results.append(self._enqueue(event))
+                continue
+            events.append(event)
+            positions.append(len(results))
+            results.append(Response(success=True, reason="OK"))
+
+        if not events:
+            return BatchResponse(results=results)
+
+        errors = self._handle_in_lanes(events)
+        failed = 0
+        for position, event, error in zip(positions, events, errors):
+            if error is not None:
+                _event_log.error("Failed to handle event", user_id=event.user_id, error=error)
+                results[position] = Response(success=False, reason=str(error))
+                failed += 1
+        _events_ok.inc(len(events) - failed)
+        _events_failed.inc(failed)
+
+        return BatchResponse(results=results)
+
+    def _handle_in_lanes(self, events: list[UserEventRecord]) -> list[Exception | None]:
+        """Split the batch by lane and handle each part on its lane, in parallel."""
+        if self.lanes is None:
+            return self.campaign_service.handle_user_events(events)
+
+        positions: dict[int, list[int]] = {}
+        for position, event in enumerate(events):
+            positions.setdefault(self.lanes.lane(event.user_id), []).append(position)
+        futures = [
+            (lane_positions, self.lanes.submit(
+                events[lane_positions[0]].user_id,
+                self.campaign_service.handle_user_events,
+                [events[position] for position in lane_positions],
+            ))
+            for lane_positions in positions.values()
+        ]
+
+        errors: list[Exception | None] = [None] * len(events)
+        for lane_positions, future in futures:
+            for position, error in zip(lane_positions, future.result()):
+                errors[position] = error
+        return errors
+
+
+class AsyncCampaignRouter(CampaignServicer):
+    """
+    `grpc.aio` servicer. Handlers are coroutines; decoding and the (blocking) campaign
+    handling run on the user's lane (or `executor` without `lanes`) so the event loop
+    keeps accepting RPCs. Forwarding to other workers (with a `partition`) is awaited on
+    the event loop.
+    """
+
+    def __init__(
+            self,
+            campaign_service: CampaignService,
+            executor: Executor,
+            trusted_input: bool = False,
+            partition: Partition | None = None,
+            forward_timeout: float = 10.0,
+            lanes: ShardedExecutor | None = None,
+            ingestion_queue: IngestionQueue | None = None,
+    ):
+        self._router = CampaignRouter(
+            campaign_service=campaign_service,
+            trusted_input=trusted_input,
+            lanes=lanes,
+            ingestion_queue=ingestion_queue,
+        )
+        self._executor = executor
+        self.partition = partition
+        self.forward_timeout = forward_timeout
+
+        # Created on first use, on the server's event loop
+        self._peers: dict[int, CampaignStub] = {}
+
+    async def NotifyUserEventEmitted(
+            self,
+            message: UserEventMessage,
+            context: grpc.aio.ServicerContext,
+    ):
+        if self.partition is not None and not self.partition.owns(message.user_id):
+            owner = self.partition.owner(message.user_id)
+            events_forwarded_total.inc()
+            try:
+                return await self._peer(owner).NotifyUserEventEmitted(message, timeout=self.forward_timeout)
+            except grpc.RpcError as e:
+                response = _forward_failed(owner, e)
+                if response.retry:
+                    await context.abort(e.code(), response.reason)
+                return response
+
+        if self._router.ingestion_queue is None:
+            return await self._run_for(context, message.user_id, self._router._notify_user_event_emitted, message)
+
+        # Decoding and a non-blocking put: no need to leave the event loop
+        response = self._router._notify_user_event_emitted(message)
+        if response.retry:
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, response.reason)
+        return response
+
+    async def NotifyUserAttributeChanged(
+            self,
+            message: UserAttributeMessage,
+            context: grpc.aio.ServicerContext,
+    ):
+        if self.partition is not None and not self.partition.owns(message.user_id):
+            owner = self.partition.owner(message.user_id)
+            events_forwarded_total.inc()
+            try:
+                return await self._peer(owner).NotifyUserAttributeChanged(message, timeout=self.forward_timeout)
+            except grpc.RpcError as e:
+                response = _forward_failed(owner, e)
+                if response.retry:
+                    await context.abort(e.code(), response.reason)
+                return response
+
+        return await self._run_for(context, message.user_id, self._router._notify_user_attribute_changed, message)
+
+    async def NotifyUserEventsEmitted(
+            self,
+            message: UserEventBatch,
+            context: grpc.aio.ServicerContext,
+    ):
+        if self.partition is not None:
+            return await self._route_user_events(list(message.events))
+        return await self._run(self._router.NotifyUserEventsEmitted, message, context)
+
+    async def StreamUserEvents(
+            self,
+            messages: AsyncIterator[UserEventMessage],
+            context: grpc.aio.ServicerContext,
+    ):
+        messages = [message async for message in messages]
+        if self.partition is not None:
+            return await self._route_user_events(messages)
+        return await self._run(self._router.StreamUserEvents, messages, context)
+
+    async def _route_user_events(self, messages: list[UserEventMessage]) -> BatchResponse:
+        positions = _group_by_owner(self.partition, messages)
+        events_forwarded_total.inc(len(messages) - len(positions.get(self.partition.worker, ())))
+
+        async def handle(owner: int, owner_positions: list[int]) -> list[Response]:
+            batch = [messages[position] for position in owner_positions]
+            if owner == self.partition.worker:
+                return (await self._run(self._router._handle_user_events, batch)).results
+            try:
+                response = await self._peer(owner).NotifyUserEventsEmitted(
+                    UserEventBatch(events=batch),
+                    timeout=self.forward_timeout,
+                )
+                return response.results
+            except grpc.RpcError as e:
+                return [_forward_failed(owner, e)] * len(owner_positions)
+
+        owner_results = await asyncio.gather(*(
+            handle(owner, owner_positions) for owner, owner_positions in positions.items()
+        ))
+
+        results: list[Response | None] = [None] * len(messages)
+        for owner_positions, responses in zip(positions.values(), owner_results):
+            for position, result in zip(owner_positions, responses):
+                results[position] = result
+        return BatchResponse(results=results)
+
+    def _peer(self, worker: int) -> CampaignStub:
+        peer = self._peers.get(worker)
+        if peer is None:
+            channel = grpc.aio.insecure_channel(self.partition.address(worker))
+            peer = self._peers[worker] = CampaignStub(channel)
+        return peer
+
+    async def _run(self, handler: Callable[..., T], *args) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, handler, *args)
+
+    async def _run_for(
+            self,
+            context: grpc.aio.ServicerContext,
+            user_id: int,
+            handler: Callable[..., T],
+            *args,
+    ) -> T:
+        lanes = self._router.lanes
+        if lanes is None:
+            return await self._run(handler, *args)
+
+        # Bounded lanes (with an ingestion queue) can be full: never wait on the event loop
+        future = lanes.try_submit(user_id, handler, *args)
+        if future is None:
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Event lane is full")
+        return await asyncio.wrap_future(future)
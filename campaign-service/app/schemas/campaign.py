@@ -73,6 +73,7 @@ class ScheduledDeliveryCampaign(TypedDict):
 class ActionBasedDeliveryCampaign(TypedDict):
     # Common
     _id: NotRequired[ObjectId]
+    _version: NotRequired[int]  # Not persisted; stamped by CampaignIndex, a checksum of the document
     name: str
     status: CampaignStatus
     channel: CampaignChannel
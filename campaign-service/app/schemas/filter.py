@@ -7,7 +7,7 @@ T = TypeVar("T")
 
 class Filter(BaseModel):
     name: str
-    operator: Any  # TODO
+    operator: Literal["eq", "ne", "gt", "gte", "lt", "lte"]
     condition_value: Any
 
 
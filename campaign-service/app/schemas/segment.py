@@ -7,4 +7,6 @@ class Segment(TypedDict):
     _id: NotRequired[ObjectId]
     name: str
     description: str
+    # Members live in SegmentStore, bulk-loaded from `segment_member` documents
+    # ({"segment_id": str(_id), "user_id": int}) or files
     # TODO: filter
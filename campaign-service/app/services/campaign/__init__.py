@@ -1,31 +1,76 @@
+from functools import partial
+from time import perf_counter
+from typing import Iterable
+
 from pymongo.collection import Collection
+from pymongo.database import Database
 
 from app.db.mongo import db
-from app.models import UserEvent, UserAttribute
+from app.log import Logger
+from app.metrics import attribute_updates_total, stage_seconds, deliveries_total
+from app.models import AnyUserEvent, AnyUserAttribute, UserEventRecord
 from app.schemas.campaign import (
     ScheduledDeliveryCampaign, ActionBasedDeliveryCampaign, CampaignStatus
 )
 from app.services.schedule import ScheduleService
+from app.services.pending_store import PendingDelivery
 from app.services.messaging import MessagingService
+from app.services.segment import SegmentStore
 from app.services.campaign.evaluators.user import UserEvaluator
 from app.services.campaign.evaluators.event import EventPropertyEvaluator
+from app.services.campaign.index import CampaignIndex, Campaigns
+from app.services.campaign.audience import AudienceResolver, DeliveryCheckpoints
+from app.services.campaign.attributes import AttributeStateStore, same_value
+from app.services.campaign.attribute_table import AttributeTable
+from app.services.campaign.eligibility import LastDeliveryIndex
+from app.tracing import record_span
 
 Campaign = ScheduledDeliveryCampaign | ActionBasedDeliveryCampaign
 
+_lookup_seconds = stage_seconds.labels("lookup")
+_evaluate_seconds = stage_seconds.labels("evaluate")
+_schedule_seconds = stage_seconds.labels("schedule")
+_exception_seconds = stage_seconds.labels("exception")
+_deliver_seconds = stage_seconds.labels("deliver")
+_attribute_changed = attribute_updates_total.labels("changed")
+_attribute_unchanged = attribute_updates_total.labels("unchanged")
+
+_log = Logger(__name__)
+
 
 class CampaignService:
     def __init__(
             self,
             schedule_service: ScheduleService,
             messaging_service: MessagingService,
+            campaign_index: CampaignIndex,
+            segment_store: SegmentStore,
+            audience_chunk_size: int = 10_000,
+            last_deliveries: LastDeliveryIndex | None = None,
+            attribute_states: AttributeStateStore | None = None,
+            attribute_table: AttributeTable | None = None,
+            database: Database = db,
     ):
-        self.collection: Collection[Campaign] = db.campaign
+        self.collection: Collection[Campaign] = database.campaign
+        self.campaign_index = campaign_index
 
         self.schedule_service = schedule_service
         self.messaging_service = messaging_service
 
-        self.user_evaluator = UserEvaluator()
+        self.last_deliveries = last_deliveries if last_deliveries is not None else LastDeliveryIndex(campaign_index)
+        self.attribute_states = attribute_states if attribute_states is not None else AttributeStateStore()
+        self.attribute_table = attribute_table
+        self.user_evaluator = UserEvaluator(segment_store=segment_store)
         self.event_property_evaluator = EventPropertyEvaluator()
+        self.campaign_index.subscribe(self.event_property_evaluator.invalidate)
+
+        self.audience_resolver = AudienceResolver(
+            segment_store=segment_store,
+            user_collection=database.user_attribute,
+            chunk_size=audience_chunk_size,
+            attribute_table=attribute_table,
+        )
+        self.delivery_checkpoints = DeliveryCheckpoints(database.delivery_checkpoint)
 
     # def set_active(self, campaign: Campaign):
     #     # Make state 'active'
@@ -41,56 +86,123 @@ class CampaignService:
     #             campaign=campaign,
     #         )
 
-    def handle_user_event(self, event: UserEvent) -> None:
-        # Find trigger campaigns
-        trigger_campaigns = self.collection.find({
-            "status": CampaignStatus.active,
-            "delivery_type": "action-based",
-            "trigger_action.type": "event-trigger",
-            "trigger_action.trigger_event": event.event_name,
-        })
+    def handle_user_event(self, event: AnyUserEvent) -> None:
+        started = perf_counter()
+        trigger_campaigns = self.campaign_index.event_triggers(event.event_name)
+        exception_campaigns = self.campaign_index.exception_campaigns(event.event_name)
+        elapsed = perf_counter() - started
+        _lookup_seconds.observe(elapsed)
+        record_span("lookup", started, elapsed)
 
-        for campaign in trigger_campaigns:
-            # Evaluate qualifications
-            if not self.event_property_evaluator.evaluate(campaign, event):
-                continue
-            if not self.user_evaluator.evaluate(campaign, event.user_id):
-                continue
+        self._handle_user_event(
+            event=event,
+            trigger_campaigns=trigger_campaigns,
+            exception_campaigns=exception_campaigns,
+        )
 
-            # Schedule the delivery
-            if not self.schedule_service.exists(campaign=campaign, action=event):
-                self.schedule_service.add_action_based_delivery(
-                    callback=self._deliver_event_triggered_campaign,
-                    campaign=campaign,
-                    action=event,
+    def handle_user_events(self, events: Iterable[AnyUserEvent]) -> list[Exception | None]:
+        """
+        Handle a batch of events in one pass. Campaigns are looked up once per distinct event
+        name and a failing event does not stop the rest of the batch.
+
+        :return: The error raised for each event (None if handled), in input order
+        """
+        lookups: dict[str, tuple[Campaigns, Campaigns]] = {}
+        errors: list[Exception | None] = []
+
+        for event in events:
+            campaigns = lookups.get(event.event_name)
+            if campaigns is None:
+                started = perf_counter()
+                campaigns = lookups[event.event_name] = (
+                    self.campaign_index.event_triggers(event.event_name),
+                    self.campaign_index.exception_campaigns(event.event_name),
                 )
+                _lookup_seconds.observe(perf_counter() - started)
+
+            try:
+                self._handle_user_event(event, *campaigns)
+                errors.append(None)
+            except Exception as e:
+                errors.append(e)
+
+        return errors
+
+    def _handle_user_event(
+            self,
+            event: AnyUserEvent,
+            trigger_campaigns: Campaigns,
+            exception_campaigns: Campaigns,
+    ) -> None:
+        if trigger_campaigns:
+            started = perf_counter()
+            scheduling = 0.0
+
+            for campaign in trigger_campaigns:
+                # Evaluate qualifications
+                if not self.last_deliveries.is_eligible(campaign, event.user_id):
+                    continue
+                if not self.event_property_evaluator.evaluate(campaign, event):
+                    continue
+                if not self.user_evaluator.evaluate(campaign, event.user_id):
+                    continue
+
+                # Schedule the delivery
+                if not self.schedule_service.exists(campaign=campaign, action=event):
+                    scheduling_started = perf_counter()
+                    self.schedule_service.add_action_based_delivery(
+                        callback=self._deliver_event_triggered_campaign,
+                        campaign=campaign,
+                        action=event,
+                    )
+                    elapsed = perf_counter() - scheduling_started
+                    scheduling += elapsed
+                    record_span("schedule", scheduling_started, elapsed)
 
-        # Find exception campaigns
-        exception_campaigns = self.collection.find({
-            "status": CampaignStatus.active,
-            "delivery_type": "action-based",
-            "exception_event": event.event_name,
-        })
+            elapsed = perf_counter() - started
+            _evaluate_seconds.observe(elapsed - scheduling)
+            record_span("evaluate", started, elapsed)
+            if scheduling:
+                _schedule_seconds.observe(scheduling)
 
-        for campaign in exception_campaigns:
+        if not exception_campaigns:
+            return
+        started = perf_counter()
+        pending = self.schedule_service.pending_campaign_ids(event.user_id)
+
+        for campaign in exception_campaigns if pending else ():
             # Unschedule the delivery
-            if self.schedule_service.exists(campaign=campaign, action=event):
+            if campaign["_id"] in pending:
                 self.schedule_service.remove(
                     campaign=campaign,
                     action=event,
                 )
+        elapsed = perf_counter() - started
+        _exception_seconds.observe(elapsed)
+        record_span("exception", started, elapsed)
+
+    def handle_user_attribute(self, attr: AnyUserAttribute):
+        if self.attribute_table is not None:
+            self.attribute_table.update(attr.user_id, attr.attribute_name, attr.attribute_value)
 
-    def handle_user_attribute(self, attr: UserAttribute):
         # Find trigger campaigns
-        trigger_campaigns = self.collection.find({
-            "status": CampaignStatus.active,
-            "delivery_type": "action-based",
-            "trigger_action.type": "attribute-trigger",
-            "trigger_action.trigger_event": attr.attribute_name,
-        })
+        trigger_campaigns = self.campaign_index.attribute_triggers(attr.attribute_name)
+        if not trigger_campaigns:
+            return
+
+        # Only real transitions trigger; repeated updates with the same value stop here
+        if not self.attribute_states.update(attr.user_id, attr.attribute_name, attr.attribute_value):
+            _attribute_unchanged.inc()
+            return
+        _attribute_changed.inc()
 
         for campaign in trigger_campaigns:
             # Evaluate qualifications
+            value = campaign["trigger_action"]["value"]
+            if value is not None and not same_value(attr.attribute_value, value):
+                continue
+            if not self.last_deliveries.is_eligible(campaign, attr.user_id):
+                continue
             if not self.user_evaluator.evaluate(campaign, attr.user_id):
                 continue
 
@@ -102,35 +214,144 @@ class CampaignService:
                     action=attr,
                 )
 
+    def restore_action_based_deliveries(self) -> None:
+        """Re-schedule the pending deliveries persisted before a restart."""
+        def resolve(pending: PendingDelivery):
+            campaign = self.campaign_index.get(pending.campaign_id)
+            if campaign is None:
+                # No longer active
+                return None
+            if pending.campaign_version != campaign["_version"] and not self._qualifies(campaign, pending.action):
+                # Edited since the delivery was scheduled, and no longer triggered by it
+                return None
+
+            if isinstance(pending.action, AnyUserAttribute):
+                return campaign, self._deliver_attribute_triggered_campaign
+            return campaign, self._deliver_event_triggered_campaign
+
+        restored = self.schedule_service.restore_action_based_deliveries(resolve)
+        _log.info("Restored pending deliveries", deliveries=restored)
+
+    def _qualifies(self, campaign: ActionBasedDeliveryCampaign, action: AnyUserEvent | AnyUserAttribute) -> bool:
+        """Whether `action` triggers the campaign, as `handle_user_event`/`handle_user_attribute` check."""
+        trigger_action = campaign["trigger_action"]
+        if isinstance(action, AnyUserAttribute):
+            if trigger_action["type"] != "attribute-trigger":
+                return False
+            if trigger_action["attribute_name"] != action.attribute_name:
+                return False
+            value = trigger_action["value"]
+            if value is not None and not same_value(action.attribute_value, value):
+                return False
+        else:
+            if trigger_action["type"] != "event-trigger" or trigger_action["trigger_event"] != action.event_name:
+                return False
+            if not self.event_property_evaluator.evaluate(campaign, action):
+                return False
+        return self.user_evaluator.evaluate(campaign, action.user_id)
+
+    def resume_scheduled_deliveries(self) -> None:
+        """Restart scheduled delivery runs that were interrupted mid-audience."""
+        for checkpoint in self.delivery_checkpoints.unfinished():
+            campaign = self.collection.find_one({"_id": checkpoint["campaign_id"]})
+            if campaign is None or campaign["status"] != CampaignStatus.active:
+                self.delivery_checkpoints.complete(checkpoint["_id"])
+                continue
+
+            self.schedule_service.add_scheduled_delivery(
+                callback=partial(self._deliver_scheduled_campaign, run_id=checkpoint["_id"]),
+                campaign={**campaign, "schedule": None},  # Run now
+                # Not the campaign id: that is its recurring job's, and a campaign can
+                # have several unfinished runs
+                job_id=checkpoint["_id"],
+            )
+
     def _deliver_scheduled_campaign(
             self,
             campaign: ScheduledDeliveryCampaign,
+            run_id: str | None = None,
     ) -> None:
         campaign_id = campaign["_id"]
+        if run_id is None:
+            run_id = self.delivery_checkpoints.run_id(campaign)
 
-        # TODO: implement me
-        self.messaging_service.send(
-            channel=campaign["channel"],
-            data=...
-        )
+        checkpoint = self.delivery_checkpoints.get(run_id)
+        if checkpoint is None:
+            after, sent, failed = None, 0, 0
+        elif checkpoint["done"]:
+            return
+        else:
+            after, sent, failed = checkpoint["cursor"], checkpoint["sent"], checkpoint["failed"]
+
+        # Deliver chunk by chunk; the full audience is never materialized
+        for cursor, user_ids in self.audience_resolver.iter_chunks(campaign["target"], after=after):
+            if len(user_ids):
+                results = self.messaging_service.send_batch(
+                    channel=campaign["channel"],
+                    items=[
+                        UserEventRecord(user_id, campaign["name"], {})
+                        for user_id in user_ids.tolist()
+                    ],
+                )
+                ok = sum(result.ok for result in results)
+                sent += ok
+                failed += len(results) - ok
+                deliveries_total.labels("scheduled", campaign["channel"], "sent").inc(ok)
+                deliveries_total.labels("scheduled", campaign["channel"], "failed").inc(len(results) - ok)
+
+            self.delivery_checkpoints.save(run_id, campaign_id, cursor, sent, failed)
+
+        self.delivery_checkpoints.complete(run_id)
 
     def _deliver_event_triggered_campaign(
             self,
             campaign: ActionBasedDeliveryCampaign,
-            event: UserEvent,
+            events: list[AnyUserEvent],
     ) -> None:
-        # TODO: Re-evaluate segment membership at send-time
-        if campaign["status"] != CampaignStatus.active:
-            return
-
-        self.messaging_service.send(
-            channel=campaign["channel"],
-            data=event,
-        )
+        self._deliver_action_based_campaign(campaign, events)
 
     def _deliver_attribute_triggered_campaign(
             self,
             campaign: ActionBasedDeliveryCampaign,
-            attr: UserAttribute,
+            attrs: list[AnyUserAttribute],
+    ) -> None:
+        self._deliver_action_based_campaign(campaign, attrs)
+
+    def _deliver_action_based_campaign(
+            self,
+            campaign: ActionBasedDeliveryCampaign,
+            actions: list[AnyUserEvent] | list[AnyUserAttribute],
     ) -> None:
-        ...
+        """Send a group of co-due deliveries of one campaign as one batch."""
+        started = perf_counter()
+        # The copy captured at schedule time may be stale
+        campaign = self.campaign_index.get(campaign["_id"])
+        if campaign is None:
+            # No longer active
+            return
+
+        events = [
+            action if isinstance(action, AnyUserEvent) else UserEventRecord(action.user_id, campaign["name"], {})
+            for action in actions
+            if self.last_deliveries.is_eligible(campaign, action.user_id)
+        ]
+        if events and campaign.get("re_eval_before_send"):
+            mask = self.user_evaluator.evaluate_many(campaign, [event.user_id for event in events])
+            events = [event for event, ok in zip(events, mask.tolist()) if ok]
+        if not events:
+            return
+
+        results = self.messaging_service.send_batch(
+            channel=campaign["channel"],
+            items=events,
+        )
+        sent = 0
+        for event, result in zip(events, results):
+            if result.ok:
+                self.last_deliveries.record(campaign, event.user_id)
+                sent += 1
+
+        campaign_type = campaign["trigger_action"]["type"]
+        deliveries_total.labels(campaign_type, campaign["channel"], "sent").inc(sent)
+        deliveries_total.labels(campaign_type, campaign["channel"], "failed").inc(len(results) - sent)
+        _deliver_seconds.observe(perf_counter() - started)
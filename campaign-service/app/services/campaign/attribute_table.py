@@ -0,0 +1,269 @@
+import operator
+import sys
+import threading
+from typing import Any, Callable, Iterable, Iterator, Mapping, Sequence
+
+import numpy as np
+from pydantic import BaseModel
+
+from app.metrics import attribute_table_users
+from app.schemas.filter import Filter, OrCondition
+
+__all__ = (
+    "AttributeTable",
+)
+
+_operators: dict[str, Callable[[Any, Any], Any]] = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+
+# Column types, fixed by the first value stored (ints widen to floats)
+_BOOL, _INT, _FLOAT, _STR = range(4)
+_dtypes = {_BOOL: np.bool_, _INT: np.int64, _FLOAT: np.float64, _STR: np.int32}
+
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+Index = np.ndarray | slice
+
+
+def _kind(value: Any) -> int | None:
+    match value:
+        case bool():
+            return _BOOL
+        case int() if _INT64_MIN <= value <= _INT64_MAX:
+            return _INT
+        case float():
+            return _FLOAT
+        case str():
+            return _STR
+        case _:
+            return None
+
+
+def _compare_scalar(compare: Callable[[Any, Any], Any], value: Any, condition_value: Any) -> bool:
+    try:
+        return bool(compare(value, condition_value))
+    except TypeError:
+        return False
+
+
+class _Column:
+    """One attribute: typed values and a validity mask, both indexed by row."""
+    __slots__ = ("kind", "values", "valid", "codes", "strings")
+
+    def __init__(self, kind: int, capacity: int):
+        self.kind = kind
+        self.values = np.zeros(capacity, dtype=_dtypes[kind])
+        self.valid = np.zeros(capacity, dtype=bool)
+        # Strings are dictionary-encoded: values hold codes into `strings`
+        self.codes: dict[str, int] = {}
+        self.strings: list[str] = []
+
+    def set(self, row: int, value: Any) -> None:
+        kind = _kind(value)
+        if kind == _INT and self.kind == _FLOAT:
+            kind = _FLOAT
+        elif kind == _FLOAT and self.kind == _INT:
+            self.values = self.values.astype(np.float64)
+            self.kind = _FLOAT
+
+        if kind != self.kind:
+            # Null, or not comparable with the column's values: treated as missing
+            self.valid[row] = False
+            return
+
+        if kind == _STR:
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[sys.intern(value)] = len(self.strings)
+                self.strings.append(value)
+            value = code
+        self.values[row] = value
+        self.valid[row] = True
+
+    def grow(self, capacity: int) -> None:
+        self.values = np.concatenate((self.values, np.zeros(capacity - len(self.values), dtype=self.values.dtype)))
+        self.valid = np.concatenate((self.valid, np.zeros(capacity - len(self.valid), dtype=bool)))
+
+    def compare(self, op: str, condition_value: Any, index: Index) -> np.ndarray:
+        compare = _operators[op]
+        values = self.values[index]
+        valid = self.valid[index]
+
+        if self.kind == _STR:
+            if not self.strings:
+                return np.zeros(len(values), dtype=bool)
+            # Compare each distinct string once, then look the results up by code
+            matches = np.fromiter(
+                (_compare_scalar(compare, string, condition_value) for string in self.strings),
+                dtype=bool,
+                count=len(self.strings),
+            )
+            return valid & matches[values]
+
+        if _kind(condition_value) in (_BOOL, _INT, _FLOAT):
+            return valid & compare(values, condition_value)
+        # Not comparable with numbers; as in `compile_filters`, only "ne" holds
+        if op == "ne":
+            return valid.copy()
+        return np.zeros(len(values), dtype=bool)
+
+
+class AttributeTable:
+    """
+    User attributes in columnar form, for evaluating `additional_filters` over whole
+    audiences at once instead of fetching and checking one user document at a time.
+
+    Users get dense row numbers on first sight. Each attribute is a column: one typed
+    NumPy array (bool, int64 or float64, or int32 codes into a per-column dictionary of
+    strings) and a validity mask, both indexed by row. A column's type is fixed by its
+    first value (ints widen to floats); null values and values of another type leave the
+    user's entry missing, and a filter on a missing attribute does not match (as in
+    `compile_filters`).
+
+    The table is filled with `load()` (e.g. from the `user_attribute` collection) and
+    kept current with `update()` for each attribute change.
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        self._rows: dict[int, int] = {}
+        self._capacity = max(initial_capacity, 1)
+        self._user_ids = np.zeros(self._capacity, dtype=np.int64)
+        self._columns: dict[str, _Column] = {}
+        self._lock = threading.Lock()
+
+        attribute_table_users.set_function(self.__len__)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def update(self, user_id: int, attribute_name: str, value: Any) -> None:
+        with self._lock:
+            self._set(self._row(user_id), attribute_name, value)
+
+    def load(self, documents: Iterable[Mapping[str, Any]]) -> int:
+        """
+        Store `{"user_id": int, <attribute>: <value>, ...}` documents.
+
+        :return: The number of documents loaded
+        """
+        loaded = 0
+        with self._lock:
+            for document in documents:
+                row = self._row(document["user_id"])
+                for attribute_name, value in document.items():
+                    if attribute_name not in ("_id", "user_id"):
+                        self._set(row, attribute_name, value)
+                loaded += 1
+        return loaded
+
+    def mask(
+            self,
+            filters: Sequence[Filter | OrCondition[Filter] | dict[str, Any]],
+            user_ids: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Evaluate an `AndCondition[Filter | OrCondition[Filter]]` for `user_ids` (e.g. a
+        chunk of segment members) in one vectorized pass.
+
+        :return: Boolean mask over `user_ids`; unknown users don't match
+        """
+        with self._lock:
+            rows = np.fromiter(
+                (self._rows.get(user_id, -1) for user_id in np.asarray(user_ids).tolist()),
+                dtype=np.int64,
+                count=len(user_ids),
+            )
+            known = rows >= 0
+            rows[~known] = 0
+            return self._evaluate(filters, rows, len(rows)) & known
+
+    def scan(
+            self,
+            filters: Sequence[Filter | OrCondition[Filter] | dict[str, Any]],
+            after: int | None = None,
+            chunk_size: int = 10_000,
+    ) -> Iterator[tuple[int, np.ndarray]]:
+        """
+        Evaluate an `AndCondition[Filter | OrCondition[Filter]]` over the users in
+        ascending id order, `chunk_size` users at a time, so matches are produced as the
+        scan goes rather than all at once. Users added after the scan starts are not
+        included.
+
+        :param after: Start after this user id
+        :return: Per chunk, the last user id scanned and the user ids that match
+        """
+        with self._lock:
+            n = len(self._rows)
+            order = np.argsort(self._user_ids[:n])
+            user_ids = self._user_ids[order]
+
+        start = 0 if after is None else int(user_ids.searchsorted(after, side="right"))
+        for start in range(start, n, chunk_size):
+            rows = order[start:start + chunk_size]
+            with self._lock:
+                mask = self._evaluate(filters, rows, len(rows))
+            chunk = user_ids[start:start + chunk_size]
+            yield int(chunk[-1]), chunk[mask]
+
+    def _evaluate(
+            self,
+            filters: Sequence[Filter | OrCondition[Filter] | dict[str, Any]],
+            index: Index,
+            n: int,
+    ) -> np.ndarray:
+        mask = np.ones(n, dtype=bool)
+        for clause in filters:
+            clause = _as_dict(clause)
+            if "or_" not in clause:
+                mask &= self._filter(clause, index, n)
+                continue
+
+            matched = np.zeros(n, dtype=bool)
+            for f in clause["or_"]:
+                matched |= self._filter(_as_dict(f), index, n)
+            mask &= matched
+        return mask
+
+    def _filter(self, f: dict[str, Any], index: Index, n: int) -> np.ndarray:
+        if f["operator"] not in _operators:
+            raise ValueError(f"Unsupported filter operator: {f['operator']!r}")
+        column = self._columns.get(f["name"])
+        if column is None:
+            return np.zeros(n, dtype=bool)
+        return column.compare(f["operator"], f["condition_value"], index)
+
+    def _row(self, user_id: int) -> int:
+        row = self._rows.get(user_id)
+        if row is None:
+            row = self._rows[user_id] = len(self._rows)
+            if row == self._capacity:
+                self._grow()
+            self._user_ids[row] = user_id
+        return row
+
+    def _set(self, row: int, attribute_name: str, value: Any) -> None:
+        column = self._columns.get(attribute_name)
+        if column is None:
+            kind = _kind(value)
+            if kind is None:
+                return
+            column = self._columns[sys.intern(attribute_name)] = _Column(kind, self._capacity)
+        column.set(row, value)
+
+    def _grow(self) -> None:
+        self._capacity *= 2
+        self._user_ids = np.concatenate((self._user_ids, np.zeros(len(self._user_ids), dtype=np.int64)))
+        for column in self._columns.values():
+            column.grow(self._capacity)
+
+
+def _as_dict(value: BaseModel | dict[str, Any]) -> dict[str, Any]:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    return value
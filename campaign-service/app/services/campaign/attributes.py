@@ -0,0 +1,109 @@
+import json
+import struct
+import sys
+import threading
+from array import array
+from typing import Any
+
+from app.metrics import attribute_state_users
+
+__all__ = (
+    "AttributeStateStore",
+    "same_value",
+)
+
+# Value kinds (new rows start out _UNSET); a value is stored as (kind, 64-bit code)
+_UNSET, _NULL, _BOOL, _INT, _FLOAT, _STR, _OTHER = range(7)
+
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+_double = struct.Struct("<d")
+_int64 = struct.Struct("<q")
+
+
+def _encode(value: Any) -> tuple[int, int]:
+    match value:
+        case None:
+            return _NULL, 0
+        case bool():
+            return _BOOL, int(value)
+        case int() if _INT64_MIN <= value <= _INT64_MAX:
+            return _INT, value
+        case float():
+            return _FLOAT, _int64.unpack(_double.pack(value))[0]
+        case str():
+            # 64-bit SipHash; a collision would only hide one transition
+            return _STR, hash(value)
+        case _:
+            return _OTHER, hash(json.dumps(value, sort_keys=True, default=str))
+
+
+def same_value(value: Any, other: Any) -> bool:
+    """Equality as the store sees it: `True` and `1` differ, as do `1` and `1.0`."""
+    return _encode(value) == _encode(other)
+
+
+class AttributeStateStore:
+    """
+    The last value of each user's triggering attributes, to tell real changes from
+    repeated updates.
+
+    Users get dense row numbers on first sight, attribute names (interned) get columns,
+    and each column is a pair of arrays indexed by row: a value kind (`array("b")`) and
+    a 64-bit code (`array("q")`): the value itself for ints and bools, the bits of
+    floats, a hash of strings and anything else. That is 9 bytes per user and attribute,
+    plus the user's entry in the row index.
+
+    Values are not persisted: after a restart, the first update of each (user,
+    attribute) counts as a change.
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        self._rows: dict[int, int] = {}
+        self._capacity = initial_capacity
+        self._columns: dict[str, int] = {}
+        self._kinds: list[array] = []
+        self._codes: list[array] = []
+        self._lock = threading.Lock()
+
+        attribute_state_users.set_function(self.__len__)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def update(self, user_id: int, attribute_name: str, value: Any) -> bool:
+        """
+        Record `value` as the user's current value of the attribute.
+
+        :return: Whether it differs from the previous value (or there was none)
+        """
+        kind, code = _encode(value)
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is None:
+                row = self._rows[user_id] = len(self._rows)
+                if row == self._capacity:
+                    self._grow()
+
+            column = self._columns.get(attribute_name)
+            if column is None:
+                column = self._add_column(attribute_name)
+
+            kinds, codes = self._kinds[column], self._codes[column]
+            if kinds[row] == kind and codes[row] == code:
+                return False
+            kinds[row] = kind
+            codes[row] = code
+            return True
+
+    def _add_column(self, attribute_name: str) -> int:
+        column = self._columns[sys.intern(attribute_name)] = len(self._kinds)
+        self._kinds.append(array("b", bytes(self._capacity)))
+        self._codes.append(array("q", bytes(8 * self._capacity)))
+        return column
+
+    def _grow(self) -> None:
+        added = self._capacity
+        for kinds, codes in zip(self._kinds, self._codes):
+            kinds.frombytes(bytes(added))
+            codes.frombytes(bytes(8 * added))
+        self._capacity += added
@@ -0,0 +1,152 @@
+from datetime import datetime, UTC
+from typing import Any, Iterator
+
+import numpy as np
+import pendulum
+from bson import ObjectId
+from pymongo.collection import Collection
+
+from app.schemas.campaign import CampaignTarget, ScheduledDeliveryCampaign
+from app.services.campaign.attribute_table import AttributeTable
+from app.services.campaign.evaluators.filter import Predicate, compile_filters
+from app.services.schedule import timezone
+from app.services.segment import SegmentStore
+
+__all__ = (
+    "AudienceChunk",
+    "AudienceResolver",
+    "DeliveryCheckpoints",
+)
+
+# (cursor, user_ids): every user id <= cursor has been scanned; user_ids are the ones that
+# qualified, in ascending order
+AudienceChunk = tuple[int, np.ndarray]
+
+
+class AudienceResolver:
+    """
+    Streams the audience of a `CampaignTarget` in ascending user id order, one chunk at a
+    time, so memory stays bounded by `chunk_size` regardless of the audience size.
+
+    - `target_segment_ids` are intersected chunk by chunk in `SegmentStore`. With no
+      segments, the audience is every user in `user_collection`.
+    - `additional_filters` are evaluated against the user's document in
+      `user_collection` (one `{"user_id": int, <attribute>: <value>, ...}` document per
+      user), fetched with one query per chunk.
+
+    With an `attribute_table`, `additional_filters` are instead evaluated as vectorized
+    masks over the table, per chunk of segment members or, with no segments, per chunk of
+    the table's users in id order.
+    """
+
+    def __init__(
+            self,
+            segment_store: SegmentStore,
+            user_collection: Collection,
+            chunk_size: int = 10_000,
+            attribute_table: AttributeTable | None = None,
+    ):
+        self.segment_store = segment_store
+        self.user_collection = user_collection
+        self.chunk_size = chunk_size
+        self.attribute_table = attribute_table
+
+    def iter_chunks(self, target: CampaignTarget, after: int | None = None) -> Iterator[AudienceChunk]:
+        """
+        :param after: Resume after this user id (a cursor previously yielded)
+        """
+        filters = target.get("additional_filters")
+        predicate = compile_filters(filters) if filters else None
+
+        segment_ids = target["target_segment_ids"]
+        if not segment_ids:
+            if filters and self.attribute_table is not None:
+                yield from self.attribute_table.scan(filters, after, self.chunk_size)
+            else:
+                yield from self._scan_users(predicate, after)
+            return
+
+        for user_ids in self.segment_store.iter_intersection(segment_ids, self.chunk_size, after):
+            cursor = int(user_ids[-1])
+            if filters and self.attribute_table is not None:
+                user_ids = user_ids[self.attribute_table.mask(filters, user_ids)]
+            elif predicate is not None:
+                user_ids = self._filter_users(user_ids, predicate)
+            yield cursor, user_ids
+
+    def _filter_users(self, user_ids: np.ndarray, predicate: Predicate) -> np.ndarray:
+        qualified = {
+            doc["user_id"]
+            for doc in self.user_collection.find(
+                {"user_id": {"$in": user_ids.tolist()}},
+                projection={"_id": False},
+            )
+            if predicate(doc)
+        }
+        qualified = np.fromiter(qualified, dtype=np.int64, count=len(qualified))
+        return user_ids[np.isin(user_ids, qualified)]
+
+    def _scan_users(self, predicate: Predicate | None, after: int | None) -> Iterator[AudienceChunk]:
+        query = {} if after is None else {"user_id": {"$gt": after}}
+        projection = {"_id": False} if predicate is not None else {"_id": False, "user_id": True}
+        cursor = self.user_collection.find(query, projection=projection, batch_size=self.chunk_size)
+        cursor = cursor.sort("user_id", 1)
+
+        qualified: list[int] = []
+        scanned = 0
+        last_user_id = None
+        for doc in cursor:
+            last_user_id = doc["user_id"]
+            scanned += 1
+            if predicate is None or predicate(doc):
+                qualified.append(last_user_id)
+
+            if scanned == self.chunk_size:
+                yield last_user_id, np.array(qualified, dtype=np.int64)
+                qualified = []
+                scanned = 0
+
+        if scanned:
+            yield last_user_id, np.array(qualified, dtype=np.int64)
+
+
+class DeliveryCheckpoints:
+    """
+    Progress of scheduled delivery runs, so a run interrupted mid-audience resumes after
+    the last delivered chunk instead of starting over.
+    """
+
+    def __init__(self, collection: Collection):
+        self.collection = collection
+
+    @staticmethod
+    def run_id(campaign: ScheduledDeliveryCampaign, at: datetime | None = None) -> str:
+        at = pendulum.instance(at) if at is not None else pendulum.now(tz=timezone)
+        return f"{campaign['_id']}:{at.to_date_string()}"
+
+    def get(self, run_id: str) -> dict[str, Any] | None:
+        return self.collection.find_one({"_id": run_id})
+
+    def unfinished(self) -> list[dict[str, Any]]:
+        return list(self.collection.find({"done": False}))
+
+    def save(self, run_id: str, campaign_id: ObjectId, cursor: int, sent: int, failed: int) -> None:
+        self.collection.update_one(
+            {"_id": run_id},
+            {"$set": {
+                "campaign_id": campaign_id,
+                "cursor": cursor,
+                "sent": sent,
+                "failed": failed,
+                "done": False,
+                "updated_at": datetime.now(UTC),
+            }},
+            upsert=True,
+        )
+
+    def complete(self, run_id: str) -> None:
+        self.collection.update_one(
+            {"_id": run_id},
+            {"$set": {"done": True, "updated_at": datetime.now(UTC)}},
+            upsert=True,
+        )
@@ -0,0 +1,262 @@
+import itertools
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from bson import ObjectId
+
+from app.log import Logger
+from app.metrics import last_delivery_entries
+from app.schemas.campaign import ActionBasedDeliveryCampaign
+from app.services.campaign.index import CampaignIndex
+
+__all__ = (
+    "LastDeliveryIndex",
+)
+
+# A run: (file it is mapped from, or None in memory; (2, n) int64 user_id/sent_at columns
+# sorted by user_id)
+Run = tuple[Path | None, np.ndarray]
+
+_log = Logger(__name__)
+
+
+class LastDeliveryIndex:
+    """
+    When each user last received each campaign, to enforce `re_eligible`.
+
+    Campaigns map to small integer handles. Each handle has a write buffer
+    (`{user_id: sent_at}` of ints, epoch seconds, in sending order) and a list of runs:
+    parallel user_id/sent_at int64 columns sorted by user_id, looked up with a binary
+    search. So a check is one dict lookup plus one search per run, and an entry costs
+    16 bytes once it has left the buffer.
+
+    - Every `flush_interval` seconds, `flush()` sorts the buffers into new runs; the
+      newest runs of a campaign are merged while the last is at least half the size of
+      the one before it, keeping a user's latest entry, so a campaign has O(log n) runs.
+    - With a `directory`, runs are written there and memory-mapped, and `start()` maps
+      them again after a restart: a crash loses at most the last interval.
+    - `evict()` drops the entries older than the campaign's `re_eligible` window, as
+      currently indexed by `campaign_index`. Campaigns whose `re_eligible` is None never
+      make a user eligible again, and campaigns that left the index may come back, so
+      their entries are kept.
+    """
+
+    def __init__(
+            self,
+            campaign_index: CampaignIndex,
+            directory: str | os.PathLike | None = None,
+            flush_interval: float = 1.0,
+            evict_interval: float = 60.0,
+    ):
+        self.campaign_index = campaign_index
+        self.directory = Path(directory) if directory is not None else None
+        self.flush_interval = flush_interval
+        self.evict_interval = evict_interval
+
+        self._handles: dict[ObjectId, int] = {}
+        self._campaign_ids: list[ObjectId] = []
+        self._buffers: list[dict[int, int]] = []
+        self._runs: list[list[Run]] = []
+        self._size = 0
+        # Run file sequence numbers, increasing across restarts
+        self._sequence = itertools.count(time.time_ns())
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        last_delivery_entries.set_function(self.__len__)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def start(self) -> None:
+        self._open_runs()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="last-delivery-index", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def is_eligible(self, campaign: ActionBasedDeliveryCampaign, user_id: int, now: float | None = None) -> bool:
+        handle = self._handles.get(campaign["_id"])
+        if handle is None:
+            return True
+
+        sent_at = self._last_sent(handle, user_id)
+        if sent_at is None:
+            return True
+
+        window = campaign.get("re_eligible")
+        if window is None:
+            return False
+        return (now if now is not None else time.time()) - sent_at >= window
+
+    def record(self, campaign: ActionBasedDeliveryCampaign, user_id: int, sent_at: float | None = None) -> None:
+        sent_at = int(sent_at if sent_at is not None else time.time())
+        with self._lock:
+            buffer = self._buffers[self._handle(campaign["_id"])]
+            # Re-insert to keep the buffer in sending order
+            if buffer.pop(user_id, None) is None:
+                self._size += 1
+            buffer[user_id] = sent_at
+
+    # `flush()` and `evict()` replace runs and are only called from the background thread
+    # (or after `stop()`); lookups read the buffer first, then the runs, so an entry
+    # moved from one to the other is always found
+
+    def flush(self) -> None:
+        """Sort the buffered entries into runs (written to `directory`, if set)."""
+        with self._lock:
+            pending = [(handle, list(buffer.items())) for handle, buffer in enumerate(self._buffers) if buffer]
+
+        for handle, entries in pending:
+            run = self._save(handle, _latest(np.array(entries, dtype=np.int64).T))
+            runs, obsolete = self._merge(handle, self._runs[handle] + [run])
+
+            with self._lock:
+                self._runs[handle] = runs
+                buffer = self._buffers[handle]
+                for user_id, sent_at in entries:
+                    # Unless recorded again meanwhile
+                    if buffer.get(user_id) == sent_at:
+                        del buffer[user_id]
+            for path in obsolete:
+                path.unlink(missing_ok=True)
+
+        self._count()
+
+    def evict(self, now: float | None = None) -> int:
+        """Drop the entries whose `re_eligible` window has passed. Returns how many."""
+        now = now if now is not None else time.time()
+        evicted = 0
+
+        for handle, campaign_id in enumerate(list(self._campaign_ids)):
+            # The current window: campaigns can be edited after their entries are recorded
+            campaign = self.campaign_index.get(campaign_id)
+            if campaign is None or campaign.get("re_eligible") is None:
+                continue
+            cutoff = now - campaign["re_eligible"]
+
+            with self._lock:
+                buffer = self._buffers[handle]
+                expired = [user_id for user_id, _ in itertools.takewhile(lambda kv: kv[1] <= cutoff, buffer.items())]
+                for user_id in expired:
+                    del buffer[user_id]
+            evicted += len(expired)
+
+            runs, obsolete = [], []
+            changed = False
+            for path, run in self._runs[handle]:
+                keep = run[1] > cutoff
+                kept = int(keep.sum())
+                # Rewrite a run once half of it has expired; lookups check the window anyway
+                if kept * 2 > len(keep):
+                    runs.append((path, run))
+                    continue
+                changed = True
+                if path is not None:
+                    obsolete.append(path)
+                if kept:
+                    runs.append(self._save(handle, np.ascontiguousarray(run[:, keep])))
+                evicted += len(keep) - kept
+
+            if changed:
+                with self._lock:
+                    self._runs[handle] = runs
+                for path in obsolete:
+                    path.unlink(missing_ok=True)
+
+        self._count()
+        return evicted
+
+    def _handle(self, campaign_id: ObjectId) -> int:
+        handle = self._handles.get(campaign_id)
+        if handle is None:
+            handle = len(self._campaign_ids)
+            self._campaign_ids.append(campaign_id)
+            self._buffers.append({})
+            self._runs.append([])
+            self._handles[campaign_id] = handle
+        return handle
+
+    def _last_sent(self, handle: int, user_id: int) -> int | None:
+        latest = self._buffers[handle].get(user_id)
+        for _, run in self._runs[handle]:
+            user_ids = run[0]
+            i = user_ids.searchsorted(user_id)
+            if i < len(user_ids) and user_ids[i] == user_id:
+                sent_at = int(run[1, i])
+                if latest is None or sent_at > latest:
+                    latest = sent_at
+        return latest
+
+    def _merge(self, handle: int, runs: list[Run]) -> tuple[list[Run], list[Path]]:
+        obsolete = []
+        while len(runs) >= 2 and runs[-2][1].shape[1] <= 2 * runs[-1][1].shape[1]:
+            (older_path, older), (newer_path, newer) = runs[-2:]
+            runs = runs[:-2] + [self._save(handle, _latest(np.concatenate((older, newer), axis=1)))]
+            obsolete += [path for path in (older_path, newer_path) if path is not None]
+        return runs, obsolete
+
+    def _save(self, handle: int, run: np.ndarray) -> Run:
+        if self.directory is None:
+            return None, run
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{self._campaign_ids[handle]}-{next(self._sequence)}.npy"
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, run)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return path, _map(path)
+
+    def _open_runs(self) -> None:
+        if self.directory is None or not self.directory.exists():
+            return
+
+        # Oldest first, as they were written
+        paths = sorted(self.directory.glob("*.npy"), key=lambda path: int(path.stem.split("-", 1)[1]))
+        with self._lock:
+            for path in paths:
+                handle = self._handle(ObjectId(path.stem.split("-", 1)[0]))
+                self._runs[handle].append((path, _map(path)))
+        self._count()
+
+    def _count(self) -> None:
+        with self._lock:
+            self._size = sum(map(len, self._buffers)) + sum(run.shape[1] for runs in self._runs for _, run in runs)
+
+    def _run(self) -> None:
+        evict_at = time.monotonic() + self.evict_interval
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+                if time.monotonic() >= evict_at:
+                    self.evict()
+                    evict_at = time.monotonic() + self.evict_interval
+            except OSError as e:
+                _log.error("Failed to persist last deliveries", error=e)
+
+
+def _latest(run: np.ndarray) -> np.ndarray:
+    """Sort (user_id, sent_at) columns by user id, keeping each user's latest entry."""
+    run = run[:, np.lexsort((run[1], run[0]))]
+    last = np.ones(run.shape[1], dtype=bool)
+    last[:-1] = run[0, 1:] != run[0, :-1]
+    return np.ascontiguousarray(run[:, last])
+
+
+def _map(path: Path) -> np.ndarray:
+    # A plain view of the memmap: indexing a memmap is several times slower
+    return np.asarray(np.load(path, mmap_mode="r"))
@@ -1,11 +1,27 @@
+from bson import ObjectId
+
 from app.schemas.campaign import ActionBasedDeliveryCampaign
-from app.models import UserEvent
+from app.models import AnyUserEvent
+from app.services.campaign.evaluators.filter import Predicate, compile_filters
 
 
 class EventPropertyEvaluator:
-    def evaluate(self, campaign: ActionBasedDeliveryCampaign, event: UserEvent) -> bool:
-        property_filters = campaign["trigger_action"]["property_filters"]
-        if not property_filters:
-            return True
+    def __init__(self):
+        # campaign _id -> (campaign _version, compiled property_filters)
+        self._compiled: dict[ObjectId, tuple[int | None, Predicate]] = {}
+
+    def evaluate(self, campaign: ActionBasedDeliveryCampaign, event: AnyUserEvent) -> bool:
+        return self._predicate(campaign)(event.event_properties)
+
+    def invalidate(self, campaign_id: ObjectId) -> None:
+        self._compiled.pop(campaign_id, None)
+
+    def _predicate(self, campaign: ActionBasedDeliveryCampaign) -> Predicate:
+        version = campaign.get("_version")
+        compiled = self._compiled.get(campaign["_id"])
+        if compiled is not None and compiled[0] == version:
+            return compiled[1]
 
-        return True
+        predicate = compile_filters(campaign["trigger_action"]["property_filters"])
+        self._compiled[campaign["_id"]] = (version, predicate)
+        return predicate
@@ -0,0 +1,99 @@
+import operator
+from typing import Any, Callable, Mapping, Sequence
+
+from pydantic import BaseModel
+
+from app.schemas.filter import Filter, OrCondition
+
+__all__ = (
+    "Predicate",
+    "compile_filters",
+)
+
+Predicate = Callable[[Mapping[str, Any]], bool]
+
+_operators: dict[str, Callable[[Any, Any], bool]] = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+
+_missing = object()
+
+
+def compile_filters(
+        filters: Sequence[Filter | OrCondition[Filter] | dict[str, Any]] | None,
+) -> Predicate:
+    """
+    Compile an `AndCondition[Filter | OrCondition[Filter]]` into a single predicate over a
+    properties mapping (e.g. `UserEvent.event_properties`).
+
+    Accepts the raw documents stored in Mongo as well as the pydantic models. A filter on
+    a property that is missing, or whose value cannot be compared with the condition
+    value, does not match.
+    """
+    if not filters:
+        return _match_all
+
+    clauses = tuple(_compile_clause(clause) for clause in filters)
+    if len(clauses) == 1:
+        return clauses[0]
+
+    def and_(properties: Mapping[str, Any]) -> bool:
+        for clause in clauses:
+            if not clause(properties):
+                return False
+        return True
+
+    return and_
+
+
+def _compile_clause(clause: Filter | OrCondition[Filter] | dict[str, Any]) -> Predicate:
+    clause = _as_dict(clause)
+    if "or_" not in clause:
+        return _compile_filter(clause)
+
+    terms = tuple(_compile_filter(_as_dict(f)) for f in clause["or_"])
+    if len(terms) == 1:
+        return terms[0]
+
+    def or_(properties: Mapping[str, Any]) -> bool:
+        for term in terms:
+            if term(properties):
+                return True
+        return False
+
+    return or_
+
+
+def _compile_filter(f: dict[str, Any]) -> Predicate:
+    name = f["name"]
+    condition_value = f["condition_value"]
+    try:
+        compare = _operators[f["operator"]]
+    except KeyError:
+        raise ValueError(f"Unsupported filter operator: {f['operator']!r}") from None
+
+    def predicate(properties: Mapping[str, Any]) -> bool:
+        value = properties.get(name, _missing)
+        if value is _missing:
+            return False
+        try:
+            return compare(value, condition_value)
+        except TypeError:
+            return False
+
+    return predicate
+
+
+def _as_dict(value: BaseModel | dict[str, Any]) -> dict[str, Any]:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    return value
+
+
+def _match_all(properties: Mapping[str, Any]) -> bool:
+    return True
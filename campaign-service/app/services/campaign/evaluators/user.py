@@ -1,11 +1,29 @@
+from typing import Sequence
+
+import numpy as np
+
 from app.schemas.campaign import ScheduledDeliveryCampaign, ActionBasedDeliveryCampaign
+from app.services.segment import SegmentStore
 
 
 class UserEvaluator:
+    def __init__(self, segment_store: SegmentStore):
+        self.segment_store = segment_store
+
     def evaluate(
             self,
             campaign: ScheduledDeliveryCampaign | ActionBasedDeliveryCampaign,
             user_id: int,
     ) -> bool:
-        # TODO
-        return True
+        # User must belong to every target segment
+        segment_ids = campaign["target"]["target_segment_ids"]
+        return self.segment_store.contains_all(segment_ids, user_id)
+
+    def evaluate_many(
+            self,
+            campaign: ScheduledDeliveryCampaign | ActionBasedDeliveryCampaign,
+            user_ids: Sequence[int],
+    ) -> np.ndarray:
+        """Boolean mask over `user_ids`, evaluated in bulk."""
+        segment_ids = campaign["target"]["target_segment_ids"]
+        return self.segment_store.filter_members(segment_ids, np.asarray(user_ids))
@@ -0,0 +1,270 @@
+import threading
+import zlib
+from typing import Any, Callable
+
+import bson
+from bson import ObjectId
+from pymongo.collection import Collection
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.log import Logger
+from app.metrics import indexed_campaigns
+from app.schemas.campaign import ActionBasedDeliveryCampaign, CampaignStatus
+
+__all__ = (
+    "CampaignIndex",
+)
+
+Campaigns = tuple[ActionBasedDeliveryCampaign, ...]
+ChangeListener = Callable[[ObjectId], None]
+
+_ACTIVE_ACTION_BASED = {
+    "status": CampaignStatus.active,
+    "delivery_type": "action-based",
+}
+
+_log = Logger(__name__)
+
+
+class CampaignIndex:
+    """
+    In-process index of active action-based campaigns.
+
+    Campaigns are keyed by the event that triggers them, the attribute that triggers them
+    and their exception event, so the event-handling path resolves campaigns with a dict
+    lookup instead of a Mongo query. The index is fully loaded by `start()` and then kept
+    current from a change stream, or by periodic reloads when change streams are not
+    available (e.g. standalone mongod).
+
+    Lookups return immutable tuples and never take the lock; writers replace whole tuples
+    under the lock.
+
+    Every indexed document is stamped with a `_version` that changes whenever the
+    document does (a CRC-32 of its content, so it is the same across restarts), so
+    derived data (e.g. compiled filters) can be cached per (`_id`, `_version`) and
+    persisted deliveries can tell whether their campaign changed since. Listeners
+    registered with `subscribe()` are called with the `_id` of each campaign that changed
+    or left the index.
+    """
+
+    def __init__(
+            self,
+            collection: Collection,
+            poll_interval: float = 10.0,
+    ):
+        self.collection = collection
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._listeners: list[ChangeListener] = []
+
+        self._campaigns: dict[ObjectId, ActionBasedDeliveryCampaign] = {}
+        self._event_triggers: dict[str, Campaigns] = {}
+        self._attribute_triggers: dict[str, Campaigns] = {}
+        self._exception_events: dict[str, Campaigns] = {}
+
+        indexed_campaigns.set_function(self.__len__)
+
+    # Lookups
+
+    def get(self, campaign_id: ObjectId) -> ActionBasedDeliveryCampaign | None:
+        return self._campaigns.get(campaign_id)
+
+    def event_triggers(self, event_name: str) -> Campaigns:
+        return self._event_triggers.get(event_name, ())
+
+    def attribute_triggers(self, attribute_name: str) -> Campaigns:
+        return self._attribute_triggers.get(attribute_name, ())
+
+    def exception_campaigns(self, event_name: str) -> Campaigns:
+        return self._exception_events.get(event_name, ())
+
+    def __len__(self) -> int:
+        return len(self._campaigns)
+
+    def subscribe(self, listener: ChangeListener) -> None:
+        self._listeners.append(listener)
+
+    # Lifecycle
+
+    def start(self) -> None:
+        self.reload()
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._watch, name="campaign-index", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # Updates
+
+    def reload(self) -> None:
+        campaigns = {doc["_id"]: doc for doc in self.collection.find(_ACTIVE_ACTION_BASED)}
+        previous = self._campaigns
+        for campaign_id, campaign in campaigns.items():
+            current = previous.get(campaign_id)
+            if current is not None and self._same(campaign, current):
+                # Keep the indexed document, so reloads don't copy pages shared with a
+                # pre-fork parent (see `app.main.serve_prefork`)
+                campaigns[campaign_id] = current
+            else:
+                self._stamp(campaign, current)
+
+        event_triggers: dict[str, list] = {}
+        attribute_triggers: dict[str, list] = {}
+        exception_events: dict[str, list] = {}
+        tables = {
+            "event": event_triggers,
+            "attribute": attribute_triggers,
+            "exception": exception_events,
+        }
+        for campaign in campaigns.values():
+            for table, key in self._keys(campaign):
+                tables[table].setdefault(key, []).append(campaign)
+
+        with self._lock:
+            self._campaigns = campaigns
+            self._event_triggers = {k: tuple(v) for k, v in event_triggers.items()}
+            self._attribute_triggers = {k: tuple(v) for k, v in attribute_triggers.items()}
+            self._exception_events = {k: tuple(v) for k, v in exception_events.items()}
+
+        self._notify(
+            campaign_id
+            for campaign_id, campaign in previous.items()
+            if campaign_id not in campaigns or campaigns[campaign_id]["_version"] != campaign["_version"]
+        )
+
+    def upsert(self, campaign: dict[str, Any]) -> None:
+        with self._lock:
+            previous = self._discard(campaign["_id"])
+            if self._is_indexable(campaign):
+                self._stamp(campaign, previous)
+                self._add(campaign)
+
+        if previous is not None and campaign.get("_version") != previous["_version"]:
+            self._notify([campaign["_id"]])
+
+    def discard(self, campaign_id: ObjectId) -> None:
+        with self._lock:
+            previous = self._discard(campaign_id)
+
+        if previous is not None:
+            self._notify([campaign_id])
+
+    def _add(self, campaign: ActionBasedDeliveryCampaign) -> None:
+        self._campaigns[campaign["_id"]] = campaign
+        for table, key in self._keys(campaign):
+            table = self._table(table)
+            table[key] = table.get(key, ()) + (campaign,)
+
+    def _discard(self, campaign_id: ObjectId) -> ActionBasedDeliveryCampaign | None:
+        campaign = self._campaigns.pop(campaign_id, None)
+        if campaign is None:
+            return None
+
+        for table, key in self._keys(campaign):
+            table = self._table(table)
+            remaining = tuple(c for c in table.get(key, ()) if c["_id"] != campaign_id)
+            if remaining:
+                table[key] = remaining
+            else:
+                table.pop(key, None)
+
+        return campaign
+
+    def _stamp(self, campaign: dict[str, Any], previous: ActionBasedDeliveryCampaign | None) -> None:
+        if previous is not None and self._same(campaign, previous):
+            campaign["_version"] = previous["_version"]
+        else:
+            campaign["_version"] = zlib.crc32(bson.encode({k: v for k, v in campaign.items() if k != "_version"}))
+
+    def _notify(self, campaign_ids) -> None:
+        for campaign_id in campaign_ids:
+            for listener in self._listeners:
+                listener(campaign_id)
+
+    def _table(self, name: str) -> dict[str, Campaigns]:
+        match name:
+            case "event":
+                return self._event_triggers
+            case "attribute":
+                return self._attribute_triggers
+            case "exception":
+                return self._exception_events
+            case _:
+                raise ValueError(name)
+
+    @staticmethod
+    def _same(campaign: dict[str, Any], other: dict[str, Any]) -> bool:
+        keys = campaign.keys() - {"_version"}
+        return keys == other.keys() - {"_version"} and all(campaign[k] == other[k] for k in keys)
+
+    @staticmethod
+    def _is_indexable(campaign: dict[str, Any]) -> bool:
+        return all(campaign.get(k) == v for k, v in _ACTIVE_ACTION_BASED.items())
+
+    @staticmethod
+    def _keys(campaign: ActionBasedDeliveryCampaign) -> list[tuple[str, str]]:
+        keys = []
+
+        trigger_action = campaign["trigger_action"]
+        match trigger_action["type"]:
+            case "event-trigger":
+                keys.append(("event", trigger_action["trigger_event"]))
+            case "attribute-trigger":
+                keys.append(("attribute", trigger_action["attribute_name"]))
+
+        if campaign.get("exception_event"):
+            keys.append(("exception", campaign["exception_event"]))
+
+        return keys
+
+    # Background sync
+
+    def _watch(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                with self.collection.watch(full_document="updateLookup") as stream:
+                    # Changes made between the initial load and opening the stream would
+                    # otherwise be lost
+                    self.reload()
+
+                    while not self._stopped.is_set() and stream.alive:
+                        change = stream.try_next()
+                        if change is not None:
+                            self._apply_change(change)
+            except OperationFailure as e:
+                # Change streams require a replica set; fall back to polling
+                _log.warning("Campaign change stream unavailable, polling", interval=self.poll_interval, error=e)
+                self._poll()
+                return
+            except PyMongoError as e:
+                _log.warning("Campaign change stream interrupted", error=e)
+                self._stopped.wait(self.poll_interval)
+
+    def _poll(self) -> None:
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                self.reload()
+            except PyMongoError as e:
+                _log.error("Failed to reload campaigns", error=e)
+
+    def _apply_change(self, change: dict[str, Any]) -> None:
+        match change["operationType"]:
+            case "insert" | "update" | "replace":
+                document = change.get("fullDocument")
+                if document is None:
+                    # Deleted before the lookup happened
+                    self.discard(change["documentKey"]["_id"])
+                else:
+                    self.upsert(document)
+            case "delete":
+                self.discard(change["documentKey"]["_id"])
+            case "drop" | "rename" | "dropDatabase" | "invalidate":
+                self.reload()
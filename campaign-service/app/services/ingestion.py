@@ -0,0 +1,56 @@
+from time import perf_counter
+from typing import Callable
+
+from app.executor import ShardedExecutor
+from app.log import Logger
+from app.metrics import events_total, stage_seconds
+from app.models import AnyUserEvent
+
+__all__ = (
+    "IngestionQueue",
+)
+
+_queue_seconds = stage_seconds.labels("queue")
+_events_ok = events_total.labels("ok")
+_events_failed = events_total.labels("failed")
+_events_rejected = events_total.labels("rejected")
+
+_event_log = Logger(__name__, per_event=True)
+
+
+class IngestionQueue:
+    """
+    Bounded queue between the routers and event handling, so RPCs are acknowledged once
+    an event is accepted instead of after it has been evaluated and scheduled.
+
+    Events wait in the user's lane of `lanes` (a `ShardedExecutor` with `max_pending`
+    set), so one user's events are still handled in the order they arrived (an exception
+    event can't overtake the trigger it cancels). When the lane is full, `submit()`
+    returns False and the event is rejected instead of waiting, so producers see the
+    overload and can back off.
+    """
+
+    def __init__(self, handler: Callable[[AnyUserEvent], None], lanes: ShardedExecutor):
+        if lanes.max_pending <= 0:
+            raise ValueError("The lanes of an ingestion queue must be bounded")
+        self.handler = handler
+        self.lanes = lanes
+
+    def __len__(self) -> int:
+        return self.lanes.pending()
+
+    def submit(self, event: AnyUserEvent) -> bool:
+        """:return: Whether the event was accepted (False: its lane is full)"""
+        if self.lanes.offer(event.user_id, self._handle, perf_counter(), event):
+            return True
+        _events_rejected.inc()
+        return False
+
+    def _handle(self, enqueued: float, event: AnyUserEvent) -> None:
+        _queue_seconds.observe(perf_counter() - enqueued)
+        try:
+            self.handler(event)
+            _events_ok.inc()
+        except Exception as e:
+            _event_log.error("Failed to handle event", user_id=event.user_id, error=e)
+            _events_failed.inc()
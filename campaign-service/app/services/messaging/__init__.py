@@ -1,31 +1,93 @@
+from time import perf_counter
+from typing import Iterable, Mapping, Sequence
+
+from app.metrics import messages_total, send_seconds
 from app.schemas.campaign import CampaignChannel
-from app.services.messaging.channels.base import BaseChannel
+from app.services.messaging.channels.base import BaseChannel, SendResult
 from app.services.messaging.channels import (
-    StdoutSender, Noti10000Sender, Noti10001Sender,
+    StdoutSender, Noti10000Sender, Noti10001Sender, default_base_url,
 )
+from app.services.messaging.ratelimit import ChannelGate, ChannelLimit
+from app.services.messaging.transport import HttpTransport
+
+
+def create_channels(noti_transport: HttpTransport | None = None) -> set[BaseChannel]:
+    # Both noti channels talk to the same host and share its connection pool
+    noti_transport = noti_transport or HttpTransport(base_url=default_base_url)
+    return {
+        StdoutSender(),
+        Noti10000Sender(transport=noti_transport),
+        Noti10001Sender(transport=noti_transport),
+    }
+
 
-all_channels = {
-    StdoutSender(),
-    Noti10000Sender(),
-    Noti10001Sender(),
-}
+all_channels = create_channels()
 
 
 class MessagingService:
-    def __init__(self):
+    """
+    Dispatches to channel senders. Channels with a `ChannelLimit` are rate limited
+    (token bucket) and capped in concurrent calls; batches are split so each part fits
+    the channel's burst.
+    """
+
+    def __init__(
+            self,
+            channels: Iterable[BaseChannel] | None = None,
+            limits: Mapping[str, ChannelLimit] | None = None,
+    ):
         self._channel_sender_map: dict[str, BaseChannel] = {
             ch.name: ch
-            for ch in all_channels
+            for ch in (channels if channels is not None else all_channels)
+        }
+        self._channel_gate_map: dict[str, ChannelGate] = {
+            name: ChannelGate(limit)
+            for name, limit in (limits or {}).items()
         }
 
     @property
     def available_senders(self) -> list[str]:
         return list(self._channel_sender_map.keys())
 
-    def send(self, channel: CampaignChannel, data):
+    def send(self, channel: CampaignChannel, data) -> SendResult:
+        sender = self._sender(channel)
+        started = perf_counter()
+
+        gate = self._channel_gate_map.get(channel)
+        if gate is None:
+            result = sender.send(data)
+        else:
+            with gate.admit():
+                result = sender.send(data)
+
+        send_seconds.labels(channel, "send").observe(perf_counter() - started)
+        messages_total.labels(channel, "sent" if result.ok else "failed").inc()
+        return result
+
+    def send_batch(self, channel: CampaignChannel, items: Sequence) -> list[SendResult]:
+        sender = self._sender(channel)
+        started = perf_counter()
+
+        gate = self._channel_gate_map.get(channel)
+        if gate is None:
+            results = sender.send_batch(items)
+        else:
+            results = []
+            size = gate.batch_size or len(items)
+            for i in range(0, len(items), size):
+                part = items[i:i + size]
+                with gate.admit(len(part)):
+                    results.extend(sender.send_batch(part))
+
+        send_seconds.labels(channel, "send_batch").observe(perf_counter() - started)
+        sent = sum(result.ok for result in results)
+        messages_total.labels(channel, "sent").inc(sent)
+        messages_total.labels(channel, "failed").inc(len(results) - sent)
+        return results
+
+    def _sender(self, channel: CampaignChannel) -> BaseChannel:
         sender = self._channel_sender_map.get(channel)
         if sender is None:
             # TODO
-            raise KeyError()
-
-        sender.send(data)
+            raise KeyError(channel)
+        return sender
@@ -1,2 +1,2 @@
 from .stdout import StdoutSender
-from .noti import Noti10000Sender, Noti10001Sender
+from .noti import Noti10000Sender, Noti10001Sender, default_base_url
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Any, Generic, TypeVar
+from typing import Any, Generic, Sequence, TypeVar
 
 T = TypeVar("T")
 
@@ -20,3 +20,7 @@ class BaseChannel(ABC, Generic[T]):
     @abstractmethod
     def send(self, data: T) -> SendResult:
         raise NotImplementedError()
+
+    def send_batch(self, items: Sequence[T]) -> list[SendResult]:
+        """Send several messages; channels override this with a native batch path."""
+        return [self.send(data) for data in items]
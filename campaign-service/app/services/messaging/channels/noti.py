@@ -1,38 +1,85 @@
-import sys
 from abc import abstractmethod
-from typing import Any
+from operator import attrgetter
+from typing import Any, Sequence
 
-from requests import Request, Session
+from requests import RequestException, Response
 
-from app.models import UserEvent
+from app.log import Logger
+from app.models import AnyUserEvent
 from app.services.messaging.channels.base import BaseChannel, SendResult
+from app.services.messaging.channels.payload import PayloadTemplate, Slot
+from app.services.messaging.transport import HttpTransport
 
 __all__ = (
     "Noti10000Sender",
     "Noti10001Sender",
 )
 
-
-class _NotiSender(BaseChannel[UserEvent]):
-    def __init__(self):
-        self.request = Request(
-            method=self.method,
-            url=f"http://stg-eks-backend-internal.findainsight.co.kr/{self.path}",
-            headers=self.headers,
-        )
-
-    def send(self, data: UserEvent) -> SendResult:
-        with Session() as session:
-            prepared = session.prepare_request(self.request)
-            prepared.prepare_body(None, None, self.json(data))
-
-            print(f"""> {prepared.method} {prepared.url} {prepared.body.decode("unicode_escape")}""")
-
-            resp = session.send(prepared)
-            if not resp.ok:
-                print(f"{resp.status_code} {resp.reason} {resp.request.body}", file=sys.stderr)
-
-            return SendResult(ok=resp.ok, reason=resp.reason)
+default_base_url = "http://stg-eks-backend-internal.findainsight.co.kr"
+
+_user_id = Slot(attrgetter("user_id"))
+_inquiry_org_name = Slot(lambda data: data.event_properties.get("inquiry_org_name"))
+
+_message_log = Logger(__name__, per_event=True)
+
+
+class _NotiSender(BaseChannel[AnyUserEvent]):
+    def __init__(self, transport: HttpTransport | None = None):
+        self.transport = transport or HttpTransport(base_url=default_base_url)
+        self._request = self.transport.prepare(self.method, self.path, self.headers)
+
+    def send(self, data: AnyUserEvent) -> SendResult:
+        try:
+            body = self.body(data)
+        except (TypeError, ValueError) as e:
+            return self._unencodable(data, e)
+        try:
+            resp = self.transport.send(self._request, body)
+        except RequestException as e:
+            return self._failed(body, e)
+        return self._result(body, resp)
+
+    def send_batch(self, items: Sequence[AnyUserEvent]) -> list[SendResult]:
+        """Send concurrently, bounded by the transport's in-flight limit."""
+        results: list[SendResult | None] = [None] * len(items)
+        submitted = []
+        for i, data in enumerate(items):
+            try:
+                body = self.body(data)
+            except (TypeError, ValueError) as e:
+                # Only this message fails (e.g. a NaN property), not the whole batch
+                results[i] = self._unencodable(data, e)
+                continue
+            submitted.append((i, body, self.transport.submit(self._request, body)))
+
+        for i, body, future in submitted:
+            try:
+                results[i] = self._result(body, future.result())
+            except RequestException as e:
+                results[i] = self._failed(body, e)
+        return results
+
+    def body(self, data: AnyUserEvent) -> bytes:
+        return self.payload.render(data)
+
+    def json(self, data: AnyUserEvent) -> dict[str, Any]:
+        return self.payload.build(data)
+
+    @staticmethod
+    def _result(body: bytes, resp: Response) -> SendResult:
+        if not resp.ok:
+            _message_log.warning("Noti request failed", status=resp.status_code, reason=resp.reason, body=body)
+        return SendResult(ok=resp.ok, reason=resp.reason)
+
+    @staticmethod
+    def _failed(body: bytes, e: RequestException) -> SendResult:
+        _message_log.warning("Noti request failed", error=e, body=body)
+        return SendResult(ok=False, reason=str(e))
+
+    @staticmethod
+    def _unencodable(data: AnyUserEvent, e: Exception) -> SendResult:
+        _message_log.warning("Noti body not encodable", user_id=data.user_id, error=e)
+        return SendResult(ok=False, reason=f"Invalid payload: {e}")
 
     @property
     @abstractmethod
@@ -50,8 +97,10 @@ class _NotiSender(BaseChannel[UserEvent]):
             "Content-Type": "application/json",
         }
 
+    @property
     @abstractmethod
-    def json(self, data: UserEvent) -> dict[str, Any]:
+    def payload(self) -> PayloadTemplate[AnyUserEvent]:
+        """The request body, compiled once per channel"""
         raise NotImplementedError()
 
 
@@ -68,14 +117,13 @@ class Noti10000Sender(_NotiSender):
     def path(self):
         return "/noti/internal/v2/send/10000"
 
-    def json(self, data: UserEvent) -> dict[str, Any]:
-        return {
-            "userId": data.user_id,
-            "properties": {
-                "inqu_org_nm": data.event_properties.get("inquiry_org_name"),
-            },
-            "checkMktAgree": False,
-        }
+    payload = PayloadTemplate({
+        "userId": _user_id,
+        "properties": {
+            "inqu_org_nm": _inquiry_org_name,
+        },
+        "checkMktAgree": False,
+    })
 
 
 class Noti10001Sender(_NotiSender):
@@ -91,10 +139,9 @@ class Noti10001Sender(_NotiSender):
     def path(self) -> str:
         return "/noti/internal/v2/send/10001"
 
-    def json(self, data: UserEvent) -> dict[str, Any]:
-        return {
-            "userId": data.user_id,
-            "properties": {
-                "inqu_org_nm": data.event_properties.get("inquiry_org_name"),
-            },
-        }
+    payload = PayloadTemplate({
+        "userId": _user_id,
+        "properties": {
+            "inqu_org_nm": _inquiry_org_name,
+        },
+    })
@@ -0,0 +1,89 @@
+import json
+import re
+from typing import Any, Callable, Generic, Mapping, TypeVar
+
+__all__ = (
+    "PayloadTemplate",
+    "Slot",
+)
+
+T = TypeVar("T")
+
+_marker = re.compile(rb'"\\u0000slot(\d+)\\u0000"')
+
+# Encoded string slot values; they repeat a lot (e.g. organization names)
+_MAX_CACHED_STRINGS = 4096
+_strings: dict[str, bytes] = {}
+
+
+class Slot(Generic[T]):
+    """A per-message value of a `PayloadTemplate`, read from the message by `get`."""
+    __slots__ = ("get",)
+
+    def __init__(self, get: Callable[[T], Any]):
+        self.get = get
+
+
+class PayloadTemplate(Generic[T]):
+    """
+    A JSON request body whose shape is fixed and only a few values (`Slot`s) differ per
+    message.
+
+    The payload is encoded once, at construction, into the constant byte segments
+    between the slots; `render()` encodes just the slot values and joins them with the
+    segments, instead of building a dict and encoding all of it for every message. The
+    output is byte for byte what `json.dumps(build(data))` produces.
+    """
+
+    def __init__(self, payload: Mapping[str, Any]):
+        self.payload = payload
+        self._slots: list[Slot[T]] = []
+
+        encoded = json.dumps(self._mark(payload), allow_nan=False).encode()
+        split = _marker.split(encoded)
+        # [segment, slot index, segment, slot index, ..., segment]
+        self._segments: tuple[bytes, ...] = tuple(split[::2])
+        self._order: tuple[Slot[T], ...] = tuple(self._slots[int(i)] for i in split[1::2])
+
+    def render(self, data: T) -> bytes:
+        segments = self._segments
+        parts = [segments[0]]
+        for slot, segment in zip(self._order, segments[1:]):
+            parts.append(_encode(slot.get(data)))
+            parts.append(segment)
+        return b"".join(parts)
+
+    def build(self, data: T) -> dict[str, Any]:
+        """The payload for `data` as a dict (the slow path, e.g. for logging)."""
+        return self._fill(self.payload, data)
+
+    def _mark(self, value: Any) -> Any:
+        if isinstance(value, Slot):
+            self._slots.append(value)
+            return f"\0slot{len(self._slots) - 1}\0"
+        if isinstance(value, Mapping):
+            return {key: self._mark(item) for key, item in value.items()}
+        return value
+
+    def _fill(self, value: Any, data: T) -> Any:
+        if isinstance(value, Slot):
+            return value.get(data)
+        if isinstance(value, Mapping):
+            return {key: self._fill(item, data) for key, item in value.items()}
+        return value
+
+
+def _encode(value: Any) -> bytes:
+    # Fast paths for the common slot values; everything else as json.dumps would
+    if value.__class__ is int:
+        return b"%d" % value
+    if value is None:
+        return b"null"
+    if value.__class__ is str:
+        encoded = _strings.get(value)
+        if encoded is None:
+            if len(_strings) >= _MAX_CACHED_STRINGS:
+                _strings.clear()
+            encoded = _strings[value] = json.dumps(value).encode()
+        return encoded
+    return json.dumps(value, allow_nan=False).encode()
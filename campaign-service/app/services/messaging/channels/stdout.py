@@ -1,16 +1,26 @@
-from app.models import UserEvent
+from typing import Sequence
+
+from app.log import Logger
+from app.models import AnyUserEvent
 from app.services.messaging.channels.base import BaseChannel, SendResult
 
 __all__ = (
     "StdoutSender",
 )
 
+_log = Logger(__name__)
+
 
-class StdoutSender(BaseChannel[UserEvent]):
+class StdoutSender(BaseChannel[AnyUserEvent]):
     @property
     def name(self) -> str:
         return "stdout"
 
-    def send(self, data: UserEvent) -> SendResult:
-        print(f"Deliver[{self.name}] data: {data}")
+    def send(self, data: AnyUserEvent) -> SendResult:
+        _log.info("Deliver", channel=self.name, data=data)
         return SendResult(ok=True, reason="OK")
+
+    def send_batch(self, items: Sequence[AnyUserEvent]) -> list[SendResult]:
+        for data in items:
+            _log.info("Deliver", channel=self.name, data=data)
+        return [SendResult(ok=True, reason="OK") for _ in items]
@@ -0,0 +1,78 @@
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+
+__all__ = (
+    "ChannelLimit",
+    "ChannelGate",
+    "TokenBucket",
+)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second, holding at most `burst`.
+
+    `acquire(n)` reserves `n` tokens right away and sleeps off any deficit outside the
+    lock, so callers are served in arrival order and a request larger than `burst` is
+    simply spread over time.
+    """
+
+    def __init__(self, rate: float, burst: int | None = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate))
+
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n: int = 1) -> float:
+        """Take `n` tokens, blocking until they are available. Returns the time waited."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= n
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+@dataclass(frozen=True)
+class ChannelLimit:
+    rate: float | None = None             # Messages per second (None: unlimited)
+    burst: int | None = None              # Defaults to one second's worth of `rate`
+    max_concurrency: int | None = None    # Concurrent send/send_batch calls (None: unlimited)
+
+
+class ChannelGate:
+    """Enforces a `ChannelLimit` in front of one channel."""
+
+    def __init__(self, limit: ChannelLimit):
+        self.limit = limit
+        self._bucket = TokenBucket(limit.rate, limit.burst) if limit.rate is not None else None
+        self._slots = threading.BoundedSemaphore(limit.max_concurrency) if limit.max_concurrency else None
+
+    @property
+    def batch_size(self) -> int | None:
+        """Largest batch that can be sent at once without exceeding the burst."""
+        return self._bucket.burst if self._bucket is not None else None
+
+    @contextmanager
+    def admit(self, n: int = 1) -> Iterator[None]:
+        if self._bucket is not None:
+            self._bucket.acquire(n)
+
+        if self._slots is None:
+            yield
+            return
+
+        with self._slots:
+            yield
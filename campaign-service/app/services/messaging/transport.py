@@ -0,0 +1,64 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from requests import PreparedRequest, Request, Response, Session
+from requests.adapters import HTTPAdapter
+
+__all__ = (
+    "HttpTransport",
+)
+
+
+class HttpTransport:
+    """
+    Long-lived HTTP transport shared by the senders that talk to one host.
+
+    - Connections are pooled and kept alive (`pool_size` per host), so a send doesn't pay
+      a TCP/TLS handshake.
+    - Requests are prepared once per endpoint (`prepare()`); a send only attaches the
+      already-serialized body.
+    - `submit()` sends on a thread pool with at most `max_in_flight` outstanding
+      requests; callers block once the limit is reached.
+    """
+
+    def __init__(
+            self,
+            base_url: str,
+            pool_size: int = 32,
+            max_in_flight: int = 32,
+            timeout: float = 5.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self._session = Session()
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="http-transport")
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+
+    def prepare(self, method: str, path: str, headers: dict[str, str]) -> PreparedRequest:
+        request = Request(method=method, url=f"{self.base_url}/{path.lstrip('/')}", headers=headers)
+        return self._session.prepare_request(request)
+
+    def send(self, template: PreparedRequest, body: bytes) -> Response:
+        prepared = template.copy()
+        prepared.body = body
+        prepared.headers["Content-Length"] = str(len(body))
+        return self._session.send(prepared, timeout=self.timeout)
+
+    def submit(self, template: PreparedRequest, body: bytes) -> Future[Response]:
+        self._in_flight.acquire()
+        try:
+            future = self._executor.submit(self.send, template, body)
+        except BaseException:
+            self._in_flight.release()
+            raise
+        future.add_done_callback(lambda _: self._in_flight.release())
+        return future
+
+    def close(self) -> None:
+        self._executor.shutdown()
+        self._session.close()
@@ -0,0 +1,348 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+
+from bson import ObjectId
+
+from app.log import Logger
+from app.models import AnyUserEvent, AnyUserAttribute, UserEventRecord, UserAttributeRecord
+
+__all__ = (
+    "PendingDelivery",
+    "PendingDeliveryStore",
+)
+
+UserAction = AnyUserEvent | AnyUserAttribute
+
+# op, campaign_id, campaign_version, user_id, run_at, payload_offset, payload_length
+_record = struct.Struct("<B12sIqdQI")
+_crc = struct.Struct("<I")
+_record_size = _record.size + _crc.size
+
+_ADD = 1
+_REMOVE = 2
+
+_current = "CURRENT"
+
+_log = Logger(__name__)
+
+
+@dataclass(slots=True)
+class PendingDelivery:
+    campaign_id: ObjectId
+    campaign_version: int
+    user_id: int
+    run_at: float  # Epoch seconds
+    action: UserAction
+
+
+class PendingDeliveryStore:
+    """
+    Durable store of pending action-based deliveries.
+
+    Each delivery is a fixed-size record (campaign_id, campaign_version, user_id, run_at,
+    payload offset/length), appended to `records-<gen>.log`; the action itself is
+    appended once to `payloads-<gen>.log` and referenced by offset. Cancelled and sent
+    deliveries are recorded as tombstones.
+
+    - Writes are buffered and flushed by a background thread every `flush_interval`
+      seconds with a single write + fsync per file (group commit). A crash loses at most
+      the last interval.
+    - When tombstoned records outnumber live ones (and exceed `compact_threshold`), the
+      live set is rewritten into the next generation, and `CURRENT` is switched
+      atomically.
+    - `recover()` maps the record log and unpacks it sequentially; a torn or corrupt
+      tail is ignored.
+    """
+
+    def __init__(
+            self,
+            directory: str | os.PathLike,
+            flush_interval: float = 0.01,
+            compact_threshold: int = 100_000,
+    ):
+        self.directory = Path(directory)
+        self.flush_interval = flush_interval
+        self.compact_threshold = compact_threshold
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        # (campaign_id, user_id) -> (campaign_version, run_at, payload_offset, payload_length)
+        self._live: dict[tuple[bytes, int], tuple[int, float, int, int]] = {}
+        self._records: list[bytes] = []
+        self._payloads: list[bytes] = []
+        self._dead = 0
+
+        self._generation = 0
+        self._record_file = None
+        self._payload_file = None
+        self._payload_size = 0
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    # Lifecycle
+
+    def recover(self) -> list[PendingDelivery]:
+        """Open the store and return the pending deliveries persisted by a previous run."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        current = self.directory / _current
+        if current.exists():
+            self._generation = int(current.read_text())
+
+        records_path = self._records_path(self._generation)
+        payloads_path = self._payloads_path(self._generation)
+        self._load(records_path)
+
+        pending = []
+        if self._live and payloads_path.exists():
+            with open(payloads_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as payloads:
+                # One parse for all payloads instead of one per delivery
+                actions = json.loads(b"[" + b",".join(
+                    payloads[offset:offset + length]
+                    for _, _, offset, length in self._live.values()
+                ) + b"]")
+
+            campaign_ids: dict[bytes, ObjectId] = {}
+            for ((campaign_id, user_id), (version, run_at, _, _)), action in zip(self._live.items(), actions):
+                if campaign_id not in campaign_ids:
+                    campaign_ids[campaign_id] = ObjectId(campaign_id)
+                action = _decode_action(user_id, action)
+                pending.append(PendingDelivery(campaign_ids[campaign_id], version, user_id, run_at, action))
+
+        self._open(self._generation)
+        return pending
+
+    def start(self) -> None:
+        if self._record_file is None:
+            self.recover()
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="pending-store", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        self._record_file.close()
+        self._payload_file.close()
+
+    # Writes
+
+    def add(
+            self,
+            campaign_id: ObjectId,
+            campaign_version: int,
+            action: UserAction,
+            run_at: float,
+    ) -> None:
+        payload = _encode_action(action)
+        with self._lock:
+            offset = self._payload_size
+            self._payload_size += len(payload)
+            self._payloads.append(payload)
+
+            key = (campaign_id.binary, action.user_id)
+            if key in self._live:
+                self._dead += 1
+            self._live[key] = (campaign_version, run_at, offset, len(payload))
+            self._records.append(self._pack(_ADD, key, campaign_version, run_at, offset, len(payload)))
+
+    def remove(self, campaign_id: ObjectId, user_id: int) -> None:
+        key = (campaign_id.binary, user_id)
+        with self._lock:
+            if self._live.pop(key, None) is None:
+                return
+            self._dead += 2
+            self._records.append(self._pack(_REMOVE, key, 0, 0.0, 0, 0))
+
+    def flush(self) -> None:
+        self._flush()
+
+    def _flush(self) -> list[bytes]:
+        with self._lock:
+            records, self._records = self._records, []
+            payloads, self._payloads = self._payloads, []
+        self._write(records, payloads)
+        return records
+
+    def _write(self, records: list[bytes], payloads: list[bytes]) -> None:
+        # Payloads first, so a record never points past the end of the payload log
+        if payloads:
+            self._payload_file.write(b"".join(payloads))
+            self._payload_file.flush()
+            os.fsync(self._payload_file.fileno())
+        if records:
+            self._record_file.write(b"".join(records))
+            self._record_file.flush()
+            os.fsync(self._record_file.fileno())
+
+    def compact(self) -> None:
+        """
+        Rewrite the live deliveries into a new generation and drop the old one.
+
+        The copy runs from a snapshot, without the lock. Deliveries added and removed
+        meanwhile are still group-committed to the current generation every
+        `flush_interval`, and their records are replayed onto the new generation when it
+        is switched in.
+        """
+        with self._lock:
+            records, self._records = self._records, []
+            payloads, self._payloads = self._payloads, []
+            live = list(self._live.items())
+            # Payloads appended from here on are at offsets from `base` of the current file
+            base = self._payload_size
+        self._write(records, payloads)
+
+        previous = self._generation
+        generation = previous + 1
+        compacted = {}
+        records = []
+        replay = []
+        offset = 0
+        flush_at = time.monotonic() + self.flush_interval
+
+        with open(self._payloads_path(previous), "rb") as src, \
+                open(self._payloads_path(generation), "wb") as dst:
+            for i, (key, (version, run_at, old_offset, length)) in enumerate(live):
+                src.seek(old_offset)
+                dst.write(src.read(length))
+                compacted[key] = (version, run_at, offset, length)
+                records.append(self._pack(_ADD, key, version, run_at, offset, length))
+                offset += length
+                if i % 1024 == 0 and time.monotonic() >= flush_at:
+                    replay += self._flush()
+                    flush_at = time.monotonic() + self.flush_interval
+
+            # Payloads committed to the current generation during the copy follow the
+            # copied ones, so every replayed offset moves by the same amount
+            replay += self._flush()
+            src.seek(base)
+            dst.write(src.read(self._payload_file.tell() - base))
+            dst.flush()
+            os.fsync(dst.fileno())
+
+        with open(self._records_path(generation), "wb") as f:
+            f.write(b"".join(records))
+            f.flush()
+            os.fsync(f.fileno())
+
+        with self._lock:
+            # Appended since the snapshot: committed above, or still buffered (their
+            # payloads are written after the committed ones)
+            replayed = []
+            dead = 0
+            for record in replay + self._records:
+                op, campaign_id, version, user_id, run_at, payload_offset, length = _record.unpack_from(record)
+                key = (campaign_id, user_id)
+                if op == _ADD:
+                    if key in compacted:
+                        dead += 1
+                    payload_offset += offset - base
+                    compacted[key] = (version, run_at, payload_offset, length)
+                    record = self._pack(_ADD, key, version, run_at, payload_offset, length)
+                elif compacted.pop(key, None) is not None:
+                    dead += 2
+                replayed.append(record)
+
+            self._record_file.close()
+            self._payload_file.close()
+            self._live = compacted
+            self._dead = dead
+            self._records = replayed
+            self._generation = generation
+            self._open(generation)
+            self._payload_size += sum(map(len, self._payloads))
+
+        # The new generation is complete once the replayed records are written
+        self.flush()
+        tmp = self.directory / f"{_current}.tmp"
+        tmp.write_text(str(generation))
+        os.replace(tmp, self.directory / _current)
+
+        self._records_path(previous).unlink(missing_ok=True)
+        self._payloads_path(previous).unlink(missing_ok=True)
+
+    # Internals
+
+    # `flush()` and `compact()` write the files and are only called from the writer thread
+    # (or after `stop()`)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+                if self._dead > self.compact_threshold and self._dead > len(self._live):
+                    self.compact()
+            except OSError as e:
+                _log.error("Failed to persist pending deliveries", error=e)
+
+    def _open(self, generation: int) -> None:
+        self._record_file = open(self._records_path(generation), "ab")
+        self._payload_file = open(self._payloads_path(generation), "ab")
+        self._payload_size = self._payload_file.tell()
+
+    def _load(self, path: Path) -> None:
+        self._live.clear()
+        self._dead = 0
+        if not path.exists() or path.stat().st_size < _record_size:
+            return
+
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            valid = len(buf) - len(buf) % _record_size
+            for start in range(0, valid, _record_size):
+                body = buf[start:start + _record.size]
+                (crc,) = _crc.unpack_from(buf, start + _record.size)
+                if zlib.crc32(body) != crc:
+                    _log.warning("Ignoring corrupt pending delivery records", path=path, after_byte=start)
+                    valid = start
+                    break
+
+                op, campaign_id, version, user_id, run_at, offset, length = _record.unpack(body)
+                key = (campaign_id, user_id)
+                if op == _ADD:
+                    if key in self._live:
+                        self._dead += 1
+                    self._live[key] = (version, run_at, offset, length)
+                elif self._live.pop(key, None) is not None:
+                    self._dead += 2
+
+        if valid != path.stat().st_size:
+            # Drop the torn tail so new records are appended after valid ones
+            os.truncate(path, valid)
+
+    @staticmethod
+    def _pack(op: int, key: tuple[bytes, int], version: int, run_at: float, offset: int, length: int) -> bytes:
+        body = _record.pack(op, key[0], version, key[1], run_at, offset, length)
+        return body + _crc.pack(zlib.crc32(body))
+
+    def _records_path(self, generation: int) -> Path:
+        return self.directory / f"records-{generation}.log"
+
+    def _payloads_path(self, generation: int) -> Path:
+        return self.directory / f"payloads-{generation}.log"
+
+
+def _encode_action(action: UserAction) -> bytes:
+    if isinstance(action, AnyUserAttribute):
+        data = {"attribute_name": action.attribute_name, "attribute_value": action.attribute_value}
+    else:
+        data = {"event_name": action.event_name, "event_properties": action.event_properties}
+    return json.dumps(data, separators=(",", ":"), default=str).encode()
+
+
+def _decode_action(user_id: int, data: dict) -> UserAction:
+    if "attribute_name" in data:
+        return UserAttributeRecord(user_id, data["attribute_name"], data["attribute_value"])
+    return UserEventRecord(user_id, data["event_name"], data["event_properties"])
@@ -1,5 +1,9 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Callable, overload
+from typing import Callable, Literal, overload
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.jobstores.memory import MemoryJobStore
@@ -7,21 +11,65 @@ from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.triggers.date import DateTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 import pendulum
+from bson import ObjectId
 
-from app.models import UserEvent, UserAttribute
+from app.log import Logger
+from app.metrics import due_queue_depth, pending_deliveries, timing_wheel_timers
+from app.models import AnyUserEvent, AnyUserAttribute
 from app.schemas.campaign import (
     ScheduledDeliveryCampaign, ActionBasedDeliveryCampaign,
 )
+from app.services.pending_store import PendingDelivery, PendingDeliveryStore
+from app.services.timing_wheel import HierarchicalTimingWheel, TimerEntry
 
-UserAction = UserEvent | UserAttribute
+UserAction = AnyUserEvent | AnyUserAttribute
 ScheduledDeliveryCallback = Callable[[ScheduledDeliveryCampaign], None]
-ActionBasedDeliveryCallback = Callable[[ActionBasedDeliveryCampaign, UserAction], None]
+ActionBasedDeliveryCallback = Callable[[ActionBasedDeliveryCampaign, list[UserAction]], None]
+ActionBasedScheduler = Literal["apscheduler", "timing-wheel"]
+PendingDeliveryResolver = Callable[
+    [PendingDelivery],
+    tuple[ActionBasedDeliveryCampaign, ActionBasedDeliveryCallback] | None,
+]
 
 timezone = "Asia/Seoul"
 
+_log = Logger(__name__)
+
 
 class ScheduleService:
-    def __init__(self):
+    """
+    Scheduled deliveries always run on APScheduler. Action-based deliveries run on either:
+
+    - "apscheduler": one `DateTrigger` job per (campaign, user) with
+      `coalesce=False, max_instances=3`.
+    - "timing-wheel": a `HierarchicalTimingWheel` entry per (campaign, user), with O(1)
+      insert/cancel and due entries fired in batches. Entries are one-shot, so
+      `coalesce` has nothing to merge; an entry that is late (e.g. the process was
+      paused) fires with the next batch instead of being dropped as a misfire. A key is
+      removed from the wheel before its callback runs, so at most one delivery per
+      (campaign, user) is pending, but a new one may be added while the previous one is
+      still being sent (like `max_instances > 1`).
+
+    Either way, deliveries that come due together are grouped by campaign and each group
+    is handed to its callback as one list (of up to `due_batch_size` actions), so the
+    callback can re-check the campaign once and send in bulk. APScheduler fires jobs one
+    by one, so its due deliveries are collected for `due_linger` seconds first.
+
+    With a `pending_store`, pending action-based deliveries are also persisted there and
+    are brought back by `restore_action_based_deliveries()` after a restart.
+
+    Pending action-based deliveries are also indexed by user (`pending_campaign_ids()`),
+    so checking or cancelling a user's deliveries doesn't go through either backend.
+    """
+
+    def __init__(
+            self,
+            action_scheduler: ActionBasedScheduler = "apscheduler",
+            wheel_tick: float = 1.0,
+            pending_store: PendingDeliveryStore | None = None,
+            due_batch_size: int = 1000,
+            due_linger: float = 0.05,
+    ):
         scheduler = BackgroundScheduler(
             jobstores={
                 "default": MemoryJobStore(),
@@ -38,11 +86,60 @@ class ScheduleService:
 
         self._scheduler = scheduler
 
+        self.due_batch_size = due_batch_size
+        self.due_linger = due_linger
+        self._due_executor = _ThreadPoolExecutor(10, thread_name_prefix="due-deliveries")
+        self._due: list[TimerEntry] = []
+        self._due_lock = threading.Lock()
+        self._due_timer: threading.Timer | None = None
+        self._queued_batches = 0
+        due_queue_depth.set_function(lambda: self._queued_batches)
+
+        self._wheel: HierarchicalTimingWheel | None = None
+        if action_scheduler == "timing-wheel":
+            self._wheel = HierarchicalTimingWheel(on_due=self._dispatch_due, tick=wheel_tick)
+            self._wheel.start()
+            timing_wheel_timers.set_function(self._wheel.__len__)
+
+        # user_id -> {campaign_id: token of the pending delivery}
+        self._pending_by_user: dict[int, dict[ObjectId, int]] = {}
+        self._pending_count = 0
+        self._pending_lock = threading.Lock()
+        pending_deliveries.set_function(lambda: self._pending_count)
+        self._tokens = itertools.count()
+
+        self._pending_store = pending_store
+        self._recovered: list[PendingDelivery] = []
+        if pending_store is not None:
+            self._recovered = pending_store.recover()
+            pending_store.start()
+
+    def shutdown(self) -> None:
+        """
+        Stop firing deliveries and wait for the ones already running. Pending deliveries
+        stay in the pending store, if any.
+        """
+        self._scheduler.shutdown()
+        if self._wheel is not None:
+            self._wheel.stop()
+        with self._due_lock:
+            if self._due_timer is not None:
+                self._due_timer.cancel()
+                self._due_timer = None
+        self._due_executor.shutdown()
+        if self._pending_store is not None:
+            self._pending_store.stop()
+
     def add_scheduled_delivery(
             self,
             callback: ScheduledDeliveryCallback,
             campaign: ScheduledDeliveryCampaign,
+            job_id: str | None = None,
     ) -> None:
+        """
+        :param job_id: Defaults to the campaign id; one-off runs of a campaign that is also
+            scheduled (e.g. resumed runs) need their own
+        """
         schedule = campaign["schedule"]
 
         if schedule is None:
@@ -77,12 +174,11 @@ class ScheduleService:
                 case _:
                     raise ValueError()
 
-        job_id = self._job_id(campaign)
         self._scheduler.add_job(
             func=callback,
             trigger=trigger,
             args=[campaign],
-            id=job_id,
+            id=job_id if job_id is not None else self._job_id(campaign),
         )
 
     def add_action_based_delivery(
@@ -91,11 +187,84 @@ class ScheduleService:
             campaign: ActionBasedDeliveryCampaign,
             action: UserAction,
     ) -> None:
+        run_date = self._run_date(campaign)
+        self._schedule_action(callback, campaign, action, run_date)
+
+        if self._pending_store is not None:
+            self._pending_store.add(
+                campaign_id=campaign["_id"],
+                campaign_version=campaign.get("_version", 0),
+                action=action,
+                run_at=run_date.timestamp() if run_date is not None else 0.0,
+            )
+
+    def restore_action_based_deliveries(self, resolve: PendingDeliveryResolver) -> int:
+        """
+        Re-schedule the deliveries recovered from the pending store at their original run
+        time (overdue ones run immediately).
+
+        :param resolve: Returns the current campaign and the delivery callback for a
+            recovered delivery, or None to drop it (e.g. the campaign is no longer active)
+        :return: The number of restored deliveries
+        """
+        recovered, self._recovered = self._recovered, []
+
+        restored = 0
+        now = time.time()
+        for pending in recovered:
+            resolved = resolve(pending)
+            if resolved is None:
+                self._pending_store.remove(pending.campaign_id, pending.user_id)
+                continue
+
+            campaign, callback = resolved
+            if self.exists(campaign=campaign, action=pending.action):
+                continue
+
+            run_date = None
+            if pending.run_at > now:
+                run_date = pendulum.from_timestamp(pending.run_at, tz=timezone)
+            self._schedule_action(callback, campaign, pending.action, run_date)
+            restored += 1
+
+        return restored
+
+    def _schedule_action(
+            self,
+            callback: ActionBasedDeliveryCallback,
+            campaign: ActionBasedDeliveryCampaign,
+            action: UserAction,
+            run_date: datetime | None,
+    ) -> None:
+        job_id = self._job_id(campaign, action)
+        token = next(self._tokens)
+
+        with self._pending_lock:
+            if self._wheel is not None:
+                run_at = run_date.timestamp() if run_date is not None else 0.0
+                self._wheel.add(job_id, run_at, callback, (campaign, action, token))
+            else:
+                trigger = DateTrigger(run_date, timezone=timezone) if run_date is not None else None
+                self._scheduler.add_job(
+                    func=self._collect_due,
+                    trigger=trigger,
+                    args=(job_id, callback, campaign, action, token),
+                    id=job_id,
+                )
+
+            pending = self._pending_by_user.setdefault(action.user_id, {})
+            if campaign["_id"] not in pending:
+                self._pending_count += 1
+            pending[campaign["_id"]] = token
+
+    @staticmethod
+    def _run_date(campaign: ActionBasedDeliveryCampaign) -> datetime | None:
+        """When an action-based delivery should be sent (None: immediately)."""
         now = pendulum.now(tz=timezone)
 
         match campaign["delay"]:
             case int() as delay:
-                trigger = DateTrigger(run_date=(now + timedelta(seconds=delay)), timezone=timezone)
+                return now + timedelta(seconds=delay)
             case dict() as delay:
                 if delay["op"] == "weekday":
                     at_date = now.next(day_of_week=delay["value"]).date()
@@ -104,18 +273,87 @@ class ScheduleService:
                 else:
                     raise ValueError()
 
-                run_date = datetime.combine(at_date, delay["at_time"])
-                trigger = DateTrigger(run_date, timezone=timezone)
+                return datetime.combine(at_date, delay["at_time"], tzinfo=now.tzinfo)
             case _:
-                trigger = None
+                return None
 
-        job_id = self._job_id(campaign, action)
-        self._scheduler.add_job(
-            func=callback,
-            trigger=trigger,
-            args=[campaign, action],
-            id=job_id,
-        )
+    def pending_campaign_ids(self, user_id: int) -> set[ObjectId]:
+        """Campaigns with a pending action-based delivery to the user."""
+        pending = self._pending_by_user.get(user_id)
+        return set(pending) if pending else set()
+
+    def _untrack(self, user_id: int, campaign_id: ObjectId) -> None:
+        pending = self._pending_by_user.get(user_id)
+        if pending is None:
+            return
+        if pending.pop(campaign_id, None) is not None:
+            self._pending_count -= 1
+        if not pending:
+            del self._pending_by_user[user_id]
+
+    def _collect_due(
+            self,
+            job_id: str,
+            callback: ActionBasedDeliveryCallback,
+            campaign: ActionBasedDeliveryCampaign,
+            action: UserAction,
+            token: int,
+    ) -> None:
+        with self._due_lock:
+            self._due.append(TimerEntry(job_id, time.time(), callback, (campaign, action, token)))
+            if self._due_timer is None:
+                self._due_timer = threading.Timer(self.due_linger, self._flush_due)
+                self._due_timer.daemon = True
+                self._due_timer.start()
+
+    def _flush_due(self) -> None:
+        with self._due_lock:
+            due, self._due, self._due_timer = self._due, [], None
+        self._dispatch_due(due)
+
+    def _dispatch_due(self, entries: list[TimerEntry]) -> None:
+        groups: dict[tuple[ActionBasedDeliveryCallback, ObjectId], list[TimerEntry]] = {}
+        for entry in entries:
+            campaign = entry.args[0]
+            groups.setdefault((entry.callback, campaign["_id"]), []).append(entry)
+
+        for (callback, _), group in groups.items():
+            for i in range(0, len(group), self.due_batch_size):
+                with self._due_lock:
+                    self._queued_batches += 1
+                self._due_executor.submit(self._run_due, callback, group[i:i + self.due_batch_size])
+
+    def _run_due(self, callback: ActionBasedDeliveryCallback, entries: list[TimerEntry]) -> None:
+        with self._due_lock:
+            self._queued_batches -= 1
+
+        campaign = entries[0].args[0]
+
+        # Deliver only what is still pending: while the entries waited (linger, executor
+        # backlog), a delivery may have been removed (e.g. by an exception event), or
+        # replaced by a newer one for the same user
+        actions: list[UserAction] = []
+        with self._pending_lock:
+            for _, action, token in (entry.args for entry in entries):
+                pending = self._pending_by_user.get(action.user_id)
+                if pending is not None and pending.get(campaign["_id"]) == token:
+                    self._untrack(action.user_id, campaign["_id"])
+                    actions.append(action)
+        if not actions:
+            return
+
+        try:
+            callback(campaign, actions)
+        except Exception as e:
+            _log.error("Delivery failed", campaign_id=campaign["_id"], users=len(actions), error=e)
+        finally:
+            # Records are keyed by (campaign, user): keep the record if a newer delivery was
+            # added for the user meanwhile (checked under the lock it is tracked under)
+            if self._pending_store is not None:
+                with self._pending_lock:
+                    for action in actions:
+                        if campaign["_id"] not in self._pending_by_user.get(action.user_id, ()):
+                            self._pending_store.remove(campaign["_id"], action.user_id)
 
     @overload
     def exists(self, campaign: ScheduledDeliveryCampaign) -> bool:
@@ -130,8 +368,10 @@ class ScheduleService:
             campaign: ScheduledDeliveryCampaign | ActionBasedDeliveryCampaign,
             action: UserAction | None = None,
     ) -> bool:
-        job_id = self._job_id(campaign, action)
-        return self._scheduler.get_job(job_id) is not None
+        if action is not None:
+            pending = self._pending_by_user.get(action.user_id)
+            return pending is not None and campaign["_id"] in pending
+        return self._scheduler.get_job(self._job_id(campaign)) is not None
 
     @overload
     def remove(self, campaign: ScheduledDeliveryCampaign) -> None:
@@ -147,7 +387,18 @@ class ScheduleService:
             action: UserAction | None = None,
     ) -> None:
         job_id = self._job_id(campaign, action)
-        self._scheduler.remove_job(job_id)
+        if action is None:
+            self._scheduler.remove_job(job_id)
+            return
+
+        if self._pending_store is not None:
+            self._pending_store.remove(campaign["_id"], action.user_id)
+        with self._pending_lock:
+            self._untrack(action.user_id, campaign["_id"])
+            if self._wheel is not None:
+                self._wheel.cancel(job_id)
+            elif self._scheduler.get_job(job_id) is not None:
+                self._scheduler.remove_job(job_id)
 
     @staticmethod
     def _job_id(
@@ -0,0 +1,244 @@
+import os
+import threading
+from pathlib import Path
+from typing import Iterable, Iterator, Sequence
+
+import numpy as np
+from pymongo.collection import Collection
+
+__all__ = (
+    "SegmentStore",
+)
+
+_dtype = np.dtype("<i8")
+_suffix = ".i64"
+
+
+class SegmentStore:
+    """
+    Segment membership, kept as one sorted, de-duplicated int64 array of user ids per
+    segment.
+
+    - Point checks are a binary search (O(log n)).
+    - Intersections filter the smallest segment against the others with vectorized
+      binary searches, so cost follows the smallest segment rather than the largest.
+    - With a `directory`, each segment is persisted as a raw `<segment_id>.i64` file
+      and served from `np.memmap`; a restart maps the files instead of rebuilding them,
+      and processes on the same host share the pages.
+    """
+
+    def __init__(self, directory: str | os.PathLike | None = None):
+        self.directory = Path(directory) if directory is not None else None
+        self._segments: dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def open(self) -> None:
+        """Map every segment persisted in `directory`."""
+        if self.directory is None:
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        segments = {
+            path.name.removesuffix(_suffix): self._map(path)
+            for path in self.directory.glob(f"*{_suffix}")
+        }
+        with self._lock:
+            self._segments.update(segments)
+
+    # Lookups
+
+    def __contains__(self, segment_id: str) -> bool:
+        return segment_id in self._segments
+
+    def size(self, segment_id: str) -> int:
+        members = self._segments.get(segment_id)
+        return 0 if members is None else len(members)
+
+    def contains(self, segment_id: str, user_id: int) -> bool:
+        members = self._segments.get(segment_id)
+        if members is None:
+            return False
+        i = members.searchsorted(user_id)
+        return i < len(members) and members[i] == user_id
+
+    def contains_all(self, segment_ids: Sequence[str], user_id: int) -> bool:
+        for segment_id in segment_ids:
+            if not self.contains(segment_id, user_id):
+                return False
+        return True
+
+    def filter_members(self, segment_ids: Sequence[str], user_ids: np.ndarray) -> np.ndarray:
+        """Boolean mask over `user_ids` of the users that belong to every segment."""
+        user_ids = np.asarray(user_ids, dtype=_dtype)
+        mask = np.ones(len(user_ids), dtype=bool)
+        for segment_id in segment_ids:
+            members = self._segments.get(segment_id)
+            if members is None:
+                mask[:] = False
+                break
+            mask &= _isin_sorted(members, user_ids)
+        return mask
+
+    def intersect(self, segment_ids: Sequence[str]) -> np.ndarray:
+        """Sorted user ids that belong to every segment."""
+        if not segment_ids:
+            raise ValueError("At least one segment is required")
+
+        segments = [self._segments.get(segment_id) for segment_id in segment_ids]
+        if any(members is None for members in segments):
+            return np.empty(0, dtype=_dtype)
+
+        segments.sort(key=len)
+        result = np.asarray(segments[0])
+        for members in segments[1:]:
+            result = result[_isin_sorted(members, result)]
+        return result
+
+    def iter_intersection(
+            self,
+            segment_ids: Sequence[str],
+            chunk_size: int,
+            after: int | None = None,
+    ) -> Iterator[np.ndarray]:
+        """
+        Yield the sorted intersection of the segments in chunks of at most `chunk_size`
+        users, optionally resuming after the user id `after`. Only one chunk of the
+        smallest segment is materialized at a time.
+        """
+        if not segment_ids:
+            raise ValueError("At least one segment is required")
+
+        segments = [self._segments.get(segment_id) for segment_id in segment_ids]
+        if any(members is None for members in segments):
+            return
+
+        segments.sort(key=len)
+        smallest, others = segments[0], segments[1:]
+        start = 0 if after is None else int(smallest.searchsorted(after, side="right"))
+
+        pending: list[np.ndarray] = []
+        pending_size = 0
+        for offset in range(start, len(smallest), chunk_size):
+            chunk = np.asarray(smallest[offset:offset + chunk_size])
+            for members in others:
+                chunk = chunk[_isin_sorted(members, chunk)]
+
+            pending.append(chunk)
+            pending_size += len(chunk)
+            while pending_size >= chunk_size:
+                merged = np.concatenate(pending)
+                yield merged[:chunk_size]
+                pending = [merged[chunk_size:]]
+                pending_size = len(pending[0])
+
+        if pending_size:
+            yield np.concatenate(pending)
+
+    # Bulk load
+
+    def put(self, segment_id: str, user_ids: Iterable[int] | np.ndarray) -> None:
+        """Replace the members of a segment."""
+        if not isinstance(user_ids, np.ndarray):
+            user_ids = np.fromiter(user_ids, dtype=_dtype)
+        members = np.unique(user_ids.astype(_dtype, copy=False))
+
+        if self.directory is not None:
+            members = self._persist(segment_id, members)
+
+        with self._lock:
+            self._segments[segment_id] = members
+
+    def load_from_mongo(
+            self,
+            segment_id: str,
+            collection: Collection,
+            batch_size: int = 100_000,
+    ) -> None:
+        """Load members from `{"segment_id": ..., "user_id": ...}` documents."""
+        cursor = collection.find(
+            {"segment_id": segment_id},
+            projection={"_id": False, "user_id": True},
+            batch_size=batch_size,
+        )
+
+        chunks = []
+        buffer = np.empty(batch_size, dtype=_dtype)
+        n = 0
+        for doc in cursor:
+            buffer[n] = doc["user_id"]
+            n += 1
+            if n == batch_size:
+                chunks.append(buffer)
+                buffer = np.empty(batch_size, dtype=_dtype)
+                n = 0
+        chunks.append(buffer[:n])
+
+        self.put(segment_id, np.concatenate(chunks))
+
+    def load_from_file(self, segment_id: str, path: str | os.PathLike) -> None:
+        """Load members from a `.npy` array or a text file with one user id per line."""
+        path = Path(path)
+        if path.suffix == ".npy":
+            user_ids = np.load(path, mmap_mode="r")
+        else:
+            user_ids = np.loadtxt(path, dtype=_dtype, ndmin=1)
+        self.put(segment_id, user_ids)
+
+    def remove(self, segment_id: str) -> None:
+        with self._lock:
+            self._segments.pop(segment_id, None)
+        if self.directory is not None:
+            self._path(segment_id).unlink(missing_ok=True)
+
+    # Persistence
+
+    def _path(self, segment_id: str) -> Path:
+        return self.directory / f"{segment_id}{_suffix}"
+
+    def _persist(self, segment_id: str, members: np.ndarray) -> np.ndarray:
+        path = self._path(segment_id)
+        tmp = path.with_suffix(".tmp")
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(tmp, "wb") as f:
+            members.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+        return self._map(path)
+
+    @staticmethod
+    def _map(path: Path) -> np.ndarray:
+        if path.stat().st_size == 0:
+            # np.memmap can't map an empty file
+            return np.empty(0, dtype=_dtype)
+        return np.memmap(path, dtype=_dtype, mode="r")
+
+
+def _isin_sorted(members: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Boolean mask over `values` of the ones present in the sorted array `members`."""
+    if len(members) == 0:
+        return np.zeros(len(values), dtype=bool)
+    positions = members.searchsorted(values)
+    positions[positions == len(members)] = 0
+    return members[positions] == values
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from app.config import settings
+    from app.db.mongo import db
+
+    parser = argparse.ArgumentParser(description="Bulk load segment membership")
+    parser.add_argument("segment_id")
+    parser.add_argument("--file", help="`.npy` or text file with one user id per line (default: Mongo)")
+    args = parser.parse_args()
+
+    store = SegmentStore(settings.segment_dir)
+    if args.file:
+        store.load_from_file(args.segment_id, args.file)
+    else:
+        store.load_from_mongo(args.segment_id, db.segment_member)
+    print(f"Loaded {store.size(args.segment_id)} users into segment {args.segment_id}")
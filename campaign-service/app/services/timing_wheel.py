@@ -0,0 +1,167 @@
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from app.log import Logger
+
+__all__ = (
+    "TimerEntry",
+    "HierarchicalTimingWheel",
+)
+
+_log = Logger(__name__)
+
+
+@dataclass(slots=True)
+class TimerEntry:
+    key: str
+    run_at: float  # Epoch seconds
+    callback: Callable[..., Any]
+    args: tuple
+
+
+DueCallback = Callable[[list[TimerEntry]], None]
+
+
+class HierarchicalTimingWheel:
+    """
+    Hierarchical timing wheel (as in the classic Linux kernel timers) for large numbers of
+    one-shot timers.
+
+    Level 0 has `wheel_size` slots of one `tick` each; every level above covers
+    `wheel_size` times the range of the one below. A timer is placed in the lowest level
+    whose range covers its deadline, and is moved down ("cascaded") when the level below
+    wraps around. Timers beyond the top level's range are parked in its furthest slot and
+    re-placed on each cascade.
+
+    - `add` and `cancel` are O(1) (amortized: a timer is cascaded at most once per level).
+    - All timers that became due since the last tick are handed to `on_due` as one batch,
+      on the wheel's thread; `on_due` should hand the work off rather than run it inline.
+
+    Timers are keyed and each key is pending at most once; the resolution is one `tick`
+    (deadlines are rounded up to the next tick).
+    """
+
+    def __init__(
+            self,
+            on_due: DueCallback,
+            tick: float = 1.0,
+            wheel_size: int = 64,
+            levels: int = 4,
+    ):
+        self.on_due = on_due
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self.levels = levels
+
+        self._slots: list[list[dict[str, TimerEntry]]] = [
+            [{} for _ in range(wheel_size)]
+            for _ in range(levels)
+        ]
+        self._locations: dict[str, tuple[int, int]] = {}  # key -> (level, slot)
+        self._current = self._tick_of(time.time())        # Next tick to process
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._locations
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="timing-wheel", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def add(self, key: str, run_at: float, callback: Callable[..., Any], args: tuple = ()) -> None:
+        entry = TimerEntry(key=key, run_at=run_at, callback=callback, args=args)
+        with self._lock:
+            if key in self._locations:
+                raise KeyError(f"Timer {key!r} already exists")
+            self._place(entry)
+
+    def cancel(self, key: str) -> bool:
+        with self._lock:
+            location = self._locations.pop(key, None)
+            if location is None:
+                return False
+            level, slot = location
+            del self._slots[level][slot][key]
+            return True
+
+    def advance(self, now: float) -> list[TimerEntry]:
+        """Process every tick up to `now` and return the timers that became due."""
+        due: list[TimerEntry] = []
+        target = math.floor(now / self.tick)
+
+        with self._lock:
+            while self._current <= target:
+                index = self._current % self.wheel_size
+                if index == 0:
+                    self._cascade()
+
+                slot = self._slots[0][index]
+                if slot:
+                    for key in slot:
+                        del self._locations[key]
+                    due.extend(slot.values())
+                    slot.clear()
+
+                self._current += 1
+
+        return due
+
+    def _cascade(self) -> None:
+        for level in range(1, self.levels):
+            index = (self._current // self.wheel_size ** level) % self.wheel_size
+            slot = self._slots[level][index]
+            if slot:
+                entries = list(slot.values())
+                slot.clear()
+                for entry in entries:
+                    del self._locations[entry.key]
+                    self._place(entry)
+            if index != 0:
+                break
+
+    def _place(self, entry: TimerEntry) -> None:
+        deadline = max(self._tick_of(entry.run_at), self._current)
+        delta = deadline - self._current
+
+        for level in range(self.levels):
+            if delta < self.wheel_size ** (level + 1):
+                break
+        else:
+            # Beyond the top level; park in its furthest slot until the next cascade
+            level = self.levels - 1
+            deadline = self._current + self.wheel_size ** self.levels - 1
+
+        slot = (deadline // self.wheel_size ** level) % self.wheel_size
+        self._slots[level][slot][entry.key] = entry
+        self._locations[entry.key] = (level, slot)
+
+    def _tick_of(self, timestamp: float) -> int:
+        return math.ceil(timestamp / self.tick)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            due = self.advance(time.time())
+            if due:
+                try:
+                    self.on_due(due)
+                except Exception as e:
+                    _log.error("Failed to dispatch due timers", timers=len(due), error=e)
+
+            next_tick_at = self._current * self.tick
+            self._stopped.wait(max(0.0, next_tick_at - time.time()))
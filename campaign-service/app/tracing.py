@@ -0,0 +1,87 @@
+"""
+Sampled per-request span tracing.
+
+A sampled request opens a `Trace` for the current thread; code along the request path
+adds spans for the steps it already times with `record_span`, which is a thread-local
+lookup when the thread isn't being traced. Finished traces are kept in a ring buffer
+for the admin API.
+
+    with tracer.sample("NotifyUserEventEmitted", user_id=user_id):
+        started = perf_counter()
+        ...
+        record_span("lookup", started, perf_counter() - started)
+"""
+import random
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from time import perf_counter
+from typing import ContextManager
+
+__all__ = (
+    "Span",
+    "Trace",
+    "Tracer",
+    "tracer",
+    "record_span",
+)
+
+_local = threading.local()
+_not_sampled = nullcontext()
+
+# (name, start in seconds from the start of the trace, duration in seconds)
+Span = tuple[str, float, float]
+
+
+class Trace:
+    __slots__ = ("tracer", "name", "attributes", "timestamp", "started", "duration", "spans")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: dict[str, object]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.timestamp = 0.0
+        self.started = 0.0
+        self.duration = 0.0
+        self.spans: list[Span] = []
+
+    def __enter__(self) -> "Trace":
+        self.timestamp = time.time()
+        self.started = perf_counter()
+        _local.trace = self
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.duration = perf_counter() - self.started
+        _local.trace = None
+        self.tracer.traces.append(self)
+
+
+class Tracer:
+    def __init__(self, sample_rate: float = 0.0, max_traces: int = 1000):
+        self.sample_rate = sample_rate
+        self.traces: deque[Trace] = deque(maxlen=max_traces)
+
+    def sample(self, name: str, **attributes) -> ContextManager[Trace | None]:
+        """A `Trace` for `sample_rate` of the calls, otherwise a no-op context."""
+        sample_rate = self.sample_rate
+        if sample_rate <= 0.0 or (sample_rate < 1.0 and random.random() >= sample_rate):
+            return _not_sampled
+        return Trace(self, name, attributes)
+
+    def recent(self, limit: int = 0) -> list[Trace]:
+        """Finished traces, most recent first."""
+        traces = list(self.traces)
+        traces.reverse()
+        return traces[:limit] if limit > 0 else traces
+
+
+tracer = Tracer()
+
+
+def record_span(name: str, started: float, duration: float) -> None:
+    """Add a span (times from `perf_counter`) to the current thread's trace, if any."""
+    trace: Trace | None = getattr(_local, "trace", None)
+    if trace is not None:
+        trace.spans.append((name, started - trace.started, duration))
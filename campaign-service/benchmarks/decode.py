@@ -0,0 +1,107 @@
+"""
+Per-event cost of decoding `UserEventMessage`s.
+
+    python -m benchmarks.decode --events 100000
+
+Compares the pydantic model (`UserEvent.from_message`) with the `__slots__` record,
+validated and trusted, on JSON payloads (`event_data`), and the record on typed fields
+(`event_name`/`event_properties`), whose properties are only converted when read. Reports CPU time (best of `--repeat` runs) and bytes allocated per event.
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from typing import Callable
+
+from app.models import UserEvent, UserEventRecord
+from pb.campaign_service_pb2 import UserEventMessage, JsonSerialized, PropertyValue
+
+
+def messages(n: int) -> list[UserEventMessage]:
+    """JSON payloads"""
+    return [
+        UserEventMessage(
+            user_id=i,
+            event_data=JsonSerialized(json=json.dumps({
+                "event_name": "event_A",
+                "event_properties": {"inquiry_org_name": "기관", "amount": i * 100, "first": i % 2 == 0},
+            })),
+        )
+        for i in range(n)
+    ]
+
+
+def typed_messages(n: int) -> list[UserEventMessage]:
+    return [
+        UserEventMessage(
+            user_id=i,
+            event_name="event_A",
+            event_properties={
+                "inquiry_org_name": PropertyValue(string_value="기관"),
+                "amount": PropertyValue(int_value=i * 100),
+                "first": PropertyValue(bool_value=i % 2 == 0),
+            },
+        )
+        for i in range(n)
+    ]
+
+
+def typed_record_properties(message: UserEventMessage) -> dict:
+    return UserEventRecord.from_message(message).event_properties
+
+
+def measure(decode: Callable, items: list[UserEventMessage], *args, repeat: int = 3) -> dict[str, float]:
+    cpu = float("inf")
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.process_time()
+            for message in items:
+                decode(message, *args)
+            cpu = min(cpu, time.process_time() - start)
+    finally:
+        gc.enable()
+
+    # Allocation, on a sample (tracing slows decoding down considerably)
+    sample = items[:min(len(items), 10_000)]
+    tracemalloc.start()
+    decoded = [decode(message, *args) for message in sample]
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del decoded
+
+    return {
+        "us_per_event": round(cpu / len(items) * 1e6, 3),
+        "bytes_per_event": round(allocated / len(sample), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UserEventMessage decode cost")
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    items, typed_items = messages(args.events), typed_messages(args.events)
+    results = {
+        name: measure(decode, decode_items, *decode_args, repeat=args.repeat)
+        for name, decode, decode_items, decode_args in [
+            ("pydantic", UserEvent.from_message, items, ()),
+            ("record", UserEventRecord.from_message, items, (True,)),
+            ("record_trusted", UserEventRecord.from_message, items, (False,)),
+            ("record_typed", UserEventRecord.from_message, typed_items, (True,)),
+            ("record_typed_properties", typed_record_properties, typed_items, ()),
+        ]
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, result in results.items():
+        print(f"{name:>24}: {result['us_per_event']:>8.3f} us/event, {result['bytes_per_event']:>8.1f} B/event")
+
+
+if __name__ == "__main__":
+    main()
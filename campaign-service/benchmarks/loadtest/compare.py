@@ -0,0 +1,78 @@
+"""
+Compare two load test reports (`run.py --output`) and flag regressions.
+
+    python -m benchmarks.loadtest.compare baseline.json candidate.json --threshold 10
+
+Exits with status 1 if any metric got worse by more than `--threshold` percent.
+"""
+import argparse
+import json
+import sys
+from typing import Any
+
+# (path in "results", True if higher is better)
+METRICS: list[tuple[tuple[str, ...], bool]] = [
+    (("throughput_rps",), True),
+    (("latency_ms", "p50"), False),
+    (("latency_ms", "p99"), False),
+    (("latency_ms", "p999"), False),
+    (("rss_mb", "peak"), False),
+    (("errors",), False),
+]
+
+
+def _get(results: dict[str, Any], path: tuple[str, ...]) -> float:
+    value = results
+    for key in path:
+        value = value[key]
+    return float(value)
+
+
+def compare(baseline: dict[str, Any], candidate: dict[str, Any], threshold: float) -> list[dict[str, Any]]:
+    rows = []
+    for path, higher_is_better in METRICS:
+        before, after = _get(baseline["results"], path), _get(candidate["results"], path)
+        change = (after - before) / before * 100 if before else (0.0 if after == before else float("inf"))
+        worse = -change if higher_is_better else change
+        rows.append({
+            "metric": ".".join(path),
+            "baseline": before,
+            "candidate": after,
+            "change_pct": round(change, 2),
+            "regression": worse > threshold,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two load test reports")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed change for the worse, in percent")
+    parser.add_argument("--json", action="store_true", help="Print the comparison as JSON")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    if baseline["config"] != candidate["config"]:
+        print("Warning: the runs used different configurations", file=sys.stderr)
+
+    rows = compare(baseline, candidate, args.threshold)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        for row in rows:
+            flag = "REGRESSION" if row["regression"] else ""
+            print(
+                f"{row['metric']:>16}: {row['baseline']:>12.3f} -> {row['candidate']:>12.3f} "
+                f"({row['change_pct']:+.2f}%) {flag}"
+            )
+
+    sys.exit(1 if any(row["regression"] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+In-memory stand-in for the small part of the pymongo API campaign-service uses, so load
+tests run without a mongod.
+
+Supports `find` (equality, `$in`, `$gt`/`$gte`/`$lt`/`$lte`, projections, `sort`),
+`find_one`, `insert_one`/`insert_many` and `update_one` with `$set` and `upsert`.
+`watch` raises `OperationFailure`, so `CampaignIndex` falls back to polling.
+"""
+import copy
+import operator
+import threading
+from typing import Any, Iterable, Iterator
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+_comparisons = {
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+    "$ne": operator.ne,
+}
+
+
+def _matches(doc: dict[str, Any], query: dict[str, Any]) -> bool:
+    for name, condition in query.items():
+        value = doc.get(name)
+        if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+            for op, operand in condition.items():
+                if op == "$in":
+                    if value not in operand:
+                        return False
+                elif value is None or not _comparisons[op](value, operand):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(doc: dict[str, Any], projection: dict[str, bool] | None) -> dict[str, Any]:
+    if not projection:
+        return copy.deepcopy(doc)
+
+    included = [name for name, keep in projection.items() if keep]
+    if included:
+        projected = {name: doc[name] for name in included if name in doc}
+        if projection.get("_id", True) and "_id" in doc:
+            projected["_id"] = doc["_id"]
+    else:
+        projected = {name: value for name, value in doc.items() if projection.get(name, True)}
+    return copy.deepcopy(projected)
+
+
+class MemoryCursor:
+    def __init__(self, docs: list[dict[str, Any]]):
+        self._docs = docs
+
+    def sort(self, key: str, direction: int = 1) -> "MemoryCursor":
+        self._docs.sort(key=lambda doc: doc.get(key), reverse=direction < 0)
+        return self
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        return iter(self._docs)
+
+
+class MemoryCollection:
+    def __init__(self, name: str):
+        self.name = name
+        self._docs: dict[Any, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def find(
+            self,
+            filter: dict[str, Any] | None = None,
+            projection: dict[str, bool] | None = None,
+            batch_size: int | None = None,
+    ) -> MemoryCursor:
+        with self._lock:
+            docs = [doc for doc in self._docs.values() if _matches(doc, filter or {})]
+        return MemoryCursor([_project(doc, projection) for doc in docs])
+
+    def find_one(self, filter: dict[str, Any] | None = None) -> dict[str, Any] | None:
+        with self._lock:
+            for doc in self._docs.values():
+                if _matches(doc, filter or {}):
+                    return copy.deepcopy(doc)
+        return None
+
+    def insert_one(self, document: dict[str, Any]) -> None:
+        self.insert_many([document])
+
+    def insert_many(self, documents: Iterable[dict[str, Any]]) -> None:
+        with self._lock:
+            for document in documents:
+                document.setdefault("_id", ObjectId())
+                self._docs[document["_id"]] = copy.deepcopy(document)
+
+    def update_one(self, filter: dict[str, Any], update: dict[str, Any], upsert: bool = False) -> None:
+        with self._lock:
+            for doc in self._docs.values():
+                if _matches(doc, filter):
+                    doc.update(copy.deepcopy(update["$set"]))
+                    return
+
+            if upsert:
+                doc = {name: value for name, value in filter.items() if not isinstance(value, dict)}
+                doc.update(copy.deepcopy(update["$set"]))
+                doc.setdefault("_id", ObjectId())
+                self._docs[doc["_id"]] = doc
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("Change streams are not supported by the in-memory stand-in")
+
+
+class MemoryDatabase:
+    def __init__(self):
+        self._collections: dict[str, MemoryCollection] = {}
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = MemoryCollection(name)
+        return collection
@@ -0,0 +1,288 @@
+"""
+End-to-end load test of `NotifyUserEventEmitted` against an in-process server.
+
+    python -m benchmarks.loadtest.run --rps 2000 --concurrency 32 --duration 30 --output run.json
+
+Everything runs locally: Mongo is replaced by `MemoryDatabase`, the noti API by
+`StubHttpServer`, and campaigns and events come from a synthetic `Workload`. Requests
+are issued open-loop at `--rps` (0: as fast as `--concurrency` callers allow) and
+latency is measured from each request's scheduled start, so a stalled server shows up as
+latency rather than as fewer requests.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import threading
+import time
+from concurrent import futures
+from dataclasses import fields
+from datetime import UTC, datetime
+from typing import Any
+
+import grpc
+import numpy as np
+
+from app.executor import ShardedExecutor
+from app.routers.campaign import CampaignRouter, AsyncCampaignRouter
+from app.services.campaign import CampaignService
+from app.services.campaign.index import CampaignIndex
+from app.services.messaging import MessagingService, create_channels
+from app.services.messaging.transport import HttpTransport
+from app.services.schedule import ScheduleService
+from app.services.segment import SegmentStore
+from benchmarks.loadtest.memory_mongo import MemoryDatabase
+from benchmarks.loadtest.workload import Workload
+from benchmarks.stub_http_server import StubHttpServer
+from pb.campaign_service_pb2 import UserEventMessage, PropertyValue
+from pb.campaign_service_pb2_grpc import add_CampaignServicer_to_server, CampaignStub
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def peak_rss_bytes() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB on Linux
+
+
+def create_campaign_service(workload: Workload, noti_base_url: str, action_scheduler: str) -> CampaignService:
+    database = MemoryDatabase()
+    database.campaign.insert_many(workload.generate_campaigns())
+
+    campaign_index = CampaignIndex(collection=database.campaign)
+    campaign_index.start()
+
+    segment_store = SegmentStore()
+    for segment_id, members in workload.segment_members().items():
+        segment_store.put(segment_id, members)
+
+    return CampaignService(
+        schedule_service=ScheduleService(action_scheduler=action_scheduler),
+        messaging_service=MessagingService(channels=create_channels(HttpTransport(noti_base_url))),
+        campaign_index=campaign_index,
+        segment_store=segment_store,
+        database=database,
+    )
+
+
+class InProcessServer:
+    """The gRPC server, threaded or `grpc.aio` (on its own event loop thread)."""
+
+    def __init__(self, campaign_service: CampaignService, mode: str, max_workers: int, event_lanes: int):
+        self.campaign_service = campaign_service
+        self.mode = mode
+        self.max_workers = max_workers
+        self.lanes = ShardedExecutor(lanes=event_lanes) if event_lanes > 0 else None
+        self.port: int | None = None
+
+        self._server = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stopping: asyncio.Event | None = None
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "InProcessServer":
+        if self.mode == "thread":
+            self._server = grpc.server(futures.ThreadPoolExecutor(max_workers=self.max_workers))
+            add_CampaignServicer_to_server(CampaignRouter(self.campaign_service, lanes=self.lanes), self._server)
+            self.port = self._server.add_insecure_port("127.0.0.1:0")
+            self._server.start()
+            return self
+
+        started = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        async def serve():
+            executor = futures.ThreadPoolExecutor(max_workers=self.max_workers)
+            self._stopping = asyncio.Event()
+            self._server = grpc.aio.server()
+            add_CampaignServicer_to_server(AsyncCampaignRouter(self.campaign_service, executor, lanes=self.lanes), self._server)
+            self.port = self._server.add_insecure_port("127.0.0.1:0")
+            await self._server.start()
+            started.set()
+            await self._stopping.wait()
+            await self._server.stop(grace=None)
+            executor.shutdown()
+
+        self._thread = threading.Thread(target=self._loop.run_until_complete, args=(serve(),), daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self) -> None:
+        if self._loop is None:
+            self._server.stop(grace=None)
+        else:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+            self._thread.join()
+        if self.lanes is not None:
+            self.lanes.shutdown()
+
+
+def build_messages(workload: Workload, n: int) -> list[UserEventMessage]:
+    messages = []
+    for _ in range(n):
+        user_id, event_name, properties = workload.event_data()
+        messages.append(UserEventMessage(
+            user_id=user_id,
+            event_name=event_name,
+            event_properties={name: PropertyValue(int_value=value) for name, value in properties.items()},
+        ))
+    return messages
+
+
+def generate_load(
+        stub: CampaignStub,
+        messages: list[UserEventMessage],
+        rps: float,
+        concurrency: int,
+        duration: float,
+) -> tuple[np.ndarray, int, float]:
+    """Returns (latencies in seconds, errors, elapsed seconds)."""
+    latencies: list[list[float]] = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    # Each caller takes every `concurrency`-th slot of the schedule
+    interval = concurrency / rps if rps > 0 else 0.0
+    start = time.perf_counter() + 0.1
+    deadline = start + duration
+
+    def caller(worker: int) -> None:
+        i = 0
+        scheduled = start + worker * (interval / concurrency)
+        while scheduled < deadline:
+            now = time.perf_counter()
+            if scheduled > now:
+                time.sleep(scheduled - now)
+            elif interval == 0.0:
+                scheduled = now
+
+            message = messages[(i * concurrency + worker) % len(messages)]
+            try:
+                if not stub.NotifyUserEventEmitted(message).success:
+                    errors[worker] += 1
+            except grpc.RpcError:
+                errors[worker] += 1
+            latencies[worker].append(time.perf_counter() - scheduled)
+
+            i += 1
+            scheduled += interval
+
+    threads = [threading.Thread(target=caller, args=(worker,), daemon=True) for worker in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return np.array([latency for worker in latencies for latency in worker]), sum(errors), elapsed
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    workload = Workload(
+        campaigns=args.campaigns,
+        events=args.events,
+        filter_depth=args.filter_depth,
+        segments=args.segments,
+        users=args.users,
+        delay=args.delay,
+        seed=args.seed,
+    )
+    noti = StubHttpServer(latency=args.noti_latency_ms / 1000).start()
+    campaign_service = create_campaign_service(workload, noti.base_url, args.action_scheduler)
+    server = InProcessServer(campaign_service, args.server_mode, args.max_workers, args.event_lanes).start()
+    channel = grpc.insecure_channel(f"127.0.0.1:{server.port}")
+    stub = CampaignStub(channel)
+    messages = build_messages(workload, args.messages)
+
+    rss_start = rss_bytes()
+    if args.warmup > 0:
+        generate_load(stub, messages, args.rps, args.concurrency, args.warmup)
+    noti.requests = 0
+    latencies, errors, elapsed = generate_load(stub, messages, args.rps, args.concurrency, args.duration)
+    rss_end = rss_bytes()
+
+    channel.close()
+    server.stop()
+    campaign_service.schedule_service.shutdown()
+    campaign_service.campaign_index.stop()
+    noti.stop()
+
+    latencies_ms = latencies * 1000
+    return {
+        "timestamp": datetime.now(UTC).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            **{name: value for name, value in vars(args).items() if name not in ("json", "output")},
+            "workload": {field.name: getattr(workload, field.name) for field in fields(workload) if field.init},
+        },
+        "results": {
+            "requests": int(len(latencies)),
+            "errors": errors,
+            "seconds": round(elapsed, 3),
+            "throughput_rps": round(len(latencies) / elapsed, 1),
+            "deliveries": noti.requests,
+            "latency_ms": {
+                "mean": round(float(latencies_ms.mean()), 3),
+                "p50": round(float(np.percentile(latencies_ms, 50)), 3),
+                "p99": round(float(np.percentile(latencies_ms, 99)), 3),
+                "p999": round(float(np.percentile(latencies_ms, 99.9)), 3),
+                "max": round(float(latencies_ms.max()), 3),
+            },
+            "rss_mb": {
+                "start": round(rss_start / 2 ** 20, 1),
+                "end": round(rss_end / 2 ** 20, 1),
+                "peak": round(peak_rss_bytes() / 2 ** 20, 1),
+            },
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="campaign-service load test")
+    parser.add_argument("--rps", type=float, default=1000, help="Target requests per second (0: unthrottled)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent callers")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds of load before measuring")
+    parser.add_argument("--server-mode", choices=["thread", "aio"], default="aio")
+    parser.add_argument("--max-workers", type=int, default=10)
+    parser.add_argument("--event-lanes", type=int, default=8, help="Per-user event lanes (0: none)")
+    parser.add_argument("--action-scheduler", choices=["apscheduler", "timing-wheel"], default="timing-wheel")
+    parser.add_argument("--campaigns", type=int, default=100)
+    parser.add_argument("--events", type=int, default=20, help="Distinct trigger events")
+    parser.add_argument("--filter-depth", type=int, default=2, help="Property filters per campaign")
+    parser.add_argument("--segments", type=int, default=10)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--delay", type=int, default=None, help="Campaign delay in seconds (default: send now)")
+    parser.add_argument("--messages", type=int, default=10_000, help="Distinct pre-built requests to cycle through")
+    parser.add_argument("--noti-latency-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    results = report["results"]
+    latency = results["latency_ms"]
+    print(
+        f"{results['requests']} requests ({results['errors']} errors) in {results['seconds']}s: "
+        f"{results['throughput_rps']} rps, {results['deliveries']} deliveries"
+    )
+    print(
+        f"latency ms: p50 {latency['p50']}  p99 {latency['p99']}  p999 {latency['p999']}  max {latency['max']}"
+    )
+    print(f"rss MB: {results['rss_mb']['start']} -> {results['rss_mb']['end']} (peak {results['rss_mb']['peak']})")
+
+
+if __name__ == "__main__":
+    main()
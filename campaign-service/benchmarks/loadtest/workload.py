@@ -0,0 +1,88 @@
+"""
+Synthetic campaign mixes and the events that exercise them.
+
+Campaign `i` is triggered by `event_{i % events}`; every other campaign also has the next
+event as its exception event. Each campaign targets one of `segments` random segments
+(half the users each) and has `filter_depth` property filters on integer properties
+`p0`, `p1`, ...; every second filter is an `or_` of two. A filter passes for roughly half
+of the generated events, so deeper filters let fewer events through.
+"""
+import random
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from typing import Any
+
+import numpy as np
+from bson import ObjectId
+
+from app.schemas.campaign import ActionBasedDeliveryCampaign, CampaignChannel, CampaignStatus
+
+
+@dataclass(frozen=True)
+class Workload:
+    campaigns: int = 100
+    events: int = 20
+    filter_depth: int = 2
+    segments: int = 10
+    users: int = 100_000
+    delay: int | None = None            # Seconds; None sends right away
+    re_eligible: int | None = 0         # 0: every event can trigger a delivery
+    channel: CampaignChannel = CampaignChannel.noti_10000
+    seed: int = 0
+
+    rng: random.Random = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "rng", random.Random(self.seed))
+
+    def segment_members(self) -> dict[str, np.ndarray]:
+        np_rng = np.random.default_rng(self.seed)
+        return {
+            f"segment_{i}": np.flatnonzero(np_rng.random(self.users) < 0.5).astype(np.int64)
+            for i in range(self.segments)
+        }
+
+    def generate_campaigns(self) -> list[ActionBasedDeliveryCampaign]:
+        return [self._campaign(i) for i in range(self.campaigns)]
+
+    def event_data(self) -> tuple[int, str, dict[str, Any]]:
+        """A random (user_id, event_name, event_properties)."""
+        rng = self.rng
+        properties = {f"p{i}": rng.randrange(100) for i in range(self.filter_depth)}
+        return rng.randrange(self.users), f"event_{rng.randrange(self.events)}", properties
+
+    def _campaign(self, i: int) -> ActionBasedDeliveryCampaign:
+        rng = self.rng
+        filters = []
+        for depth in range(self.filter_depth):
+            name = f"p{depth}"
+            if depth % 2:
+                filters.append({"or_": [
+                    {"name": name, "operator": "lt", "condition_value": 25},
+                    {"name": name, "operator": "gte", "condition_value": 75},
+                ]})
+            else:
+                filters.append({"name": name, "operator": "gte", "condition_value": rng.randrange(30, 70)})
+
+        return {
+            "_id": ObjectId(),
+            "name": f"campaign_{i}",
+            "status": CampaignStatus.active,
+            "channel": self.channel,
+            "delivery_type": "action-based",
+            "trigger_action": {
+                "type": "event-trigger",
+                "trigger_event": f"event_{i % self.events}",
+                "property_filters": filters or None,
+            },
+            "delay": self.delay,
+            "exception_event": f"event_{(i + 1) % self.events}" if i % 2 else None,
+            "start_time": datetime.now(UTC),
+            "end_time": None,
+            "re_eligible": self.re_eligible,
+            "target": {
+                "target_segment_ids": [f"segment_{rng.randrange(self.segments)}"],
+                "additional_filters": None,
+            },
+            "re_eval_before_send": False,
+        }
@@ -0,0 +1,115 @@
+"""
+Per-message cost of building noti request bodies.
+
+    python -m benchmarks.noti_payload --messages 100000
+
+Compares the compiled `PayloadTemplate` (`sender.body()`) with the previous paths:
+building the payload dict per message and encoding it with `json.dumps`, and handing
+the dict to `requests` (`prepare_body(json=...)`). Checks that the template renders the
+same bytes, then reports CPU time per message (best of `--repeat` runs).
+"""
+import argparse
+import gc
+import json
+import time
+from typing import Any, Callable
+
+from requests import PreparedRequest
+
+from app.models import UserEventRecord
+from app.services.messaging.channels import Noti10000Sender, Noti10001Sender
+
+NotiSender = Noti10000Sender | Noti10001Sender
+Build = Callable[[UserEventRecord], Any]
+
+
+def dict_payload(sender: NotiSender) -> Build:
+    """The payload dict as the senders built it before templates"""
+    if isinstance(sender, Noti10000Sender):
+        return lambda data: {
+            "userId": data.user_id,
+            "properties": {
+                "inqu_org_nm": data.event_properties.get("inquiry_org_name"),
+            },
+            "checkMktAgree": False,
+        }
+    return lambda data: {
+        "userId": data.user_id,
+        "properties": {
+            "inqu_org_nm": data.event_properties.get("inquiry_org_name"),
+        },
+    }
+
+
+def json_dumps(sender: NotiSender) -> Build:
+    payload = dict_payload(sender)
+    return lambda data: json.dumps(payload(data), allow_nan=False).encode()
+
+
+def requests_json(sender: NotiSender) -> Build:
+    payload = dict_payload(sender)
+
+    def build(data: UserEventRecord) -> bytes:
+        prepared = PreparedRequest()
+        prepared.headers = {}
+        prepared.prepare_body(None, None, payload(data))
+        return prepared.body
+
+    return build
+
+
+def template(sender: NotiSender) -> Build:
+    return sender.body
+
+
+def measure(build: Build, items: list[UserEventRecord], repeat: int = 3) -> dict[str, float]:
+    cpu = float("inf")
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.process_time()
+            for data in items:
+                build(data)
+            cpu = min(cpu, time.process_time() - start)
+    finally:
+        gc.enable()
+    return {"us_per_message": round(cpu / len(items) * 1e6, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Noti request body cost")
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    items = [
+        UserEventRecord(i, "event_A", {"inquiry_org_name": ("기관", "bank", None)[i % 3]})
+        for i in range(args.messages)
+    ]
+
+    results = {}
+    for sender in (Noti10000Sender(), Noti10001Sender()):
+        for data in items[:1000]:
+            if sender.body(data) != json_dumps(sender)(data):
+                raise AssertionError(f"{sender.name}: template renders {sender.body(data)!r}")
+
+        results[sender.name] = {
+            name: measure(factory(sender), items, repeat=args.repeat)
+            for name, factory in [
+                ("requests_json", requests_json),
+                ("json_dumps", json_dumps),
+                ("template", template),
+            ]
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for channel, channel_results in results.items():
+        for name, result in channel_results.items():
+            print(f"{channel:>10} {name:>14}: {result['us_per_message']:>8.3f} us/message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Noti sender throughput against the local stub server.
+
+    python -m benchmarks.noti_transport --messages 2000 --latency-ms 5
+
+Compares the previous per-message `Session` (new connection per push) with the pooled
+transport, sending one at a time and through `send_batch`.
+"""
+import argparse
+import json
+import time
+
+from requests import Request, Session
+
+from app.models import UserEvent
+from app.services.messaging.channels import Noti10000Sender
+from app.services.messaging.transport import HttpTransport
+from benchmarks.stub_http_server import StubHttpServer
+
+
+def session_per_message(sender: Noti10000Sender, base_url: str, items: list[UserEvent]) -> None:
+    request = Request(method=sender.method, url=f"{base_url}{sender.path}", headers=sender.headers)
+    for data in items:
+        with Session() as session:
+            prepared = session.prepare_request(request)
+            prepared.prepare_body(None, None, sender.json(data))
+            session.send(prepared)
+
+
+def pooled(sender: Noti10000Sender, items: list[UserEvent]) -> None:
+    for data in items:
+        sender.send(data)
+
+
+def pooled_batch(sender: Noti10000Sender, items: list[UserEvent]) -> None:
+    sender.send_batch(items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Noti sender throughput")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Stub server latency per request")
+    parser.add_argument("--pool-size", type=int, default=32)
+    parser.add_argument("--max-in-flight", type=int, default=32)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    server = StubHttpServer(latency=args.latency_ms / 1000).start()
+    transport = HttpTransport(server.base_url, pool_size=args.pool_size, max_in_flight=args.max_in_flight)
+    sender = Noti10000Sender(transport=transport)
+    items = [
+        UserEvent(user_id=i, event_name="event_A", event_properties={"inquiry_org_name": "기관"})
+        for i in range(args.messages)
+    ]
+
+    results = {}
+    for name, run in [
+        ("session_per_message", lambda: session_per_message(sender, server.base_url, items)),
+        ("pooled", lambda: pooled(sender, items)),
+        ("pooled_batch", lambda: pooled_batch(sender, items)),
+    ]:
+        server.requests = server.connections = 0
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            "messages": server.requests,
+            "connections": server.connections,
+            "seconds": round(elapsed, 4),
+            "messages_per_second": round(server.requests / elapsed, 1),
+        }
+
+    transport.close()
+    server.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, result in results.items():
+        print(
+            f"{name:>20}: {result['messages_per_second']:>10.1f} msg/s "
+            f"({result['connections']} connections, {result['seconds']}s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
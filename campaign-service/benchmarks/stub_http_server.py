@@ -0,0 +1,72 @@
+"""
+Local stand-in for the noti HTTP API, so sender throughput can be measured offline.
+
+    python -m benchmarks.stub_http_server --port 8080 --latency-ms 5
+"""
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive
+    disable_nagle_algorithm = True  # Headers and body are separate writes
+
+    latency: float = 0.0
+    status: int = 200
+
+    def do_PUT(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.latency:
+            time.sleep(self.latency)
+
+        self.server.requests += 1
+        self.send_response(self.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    do_POST = do_PUT
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubHttpServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.0, status: int = 200):
+        handler = type("Handler", (StubHandler,), {"latency": latency, "status": status})
+        super().__init__(("127.0.0.1", port), handler)
+        self.requests = 0
+        self.connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "StubHttpServer":
+        threading.Thread(target=self.serve_forever, name="stub-http", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--status", type=int, default=200)
+    args = parser.parse_args()
+
+    server = StubHttpServer(args.port, args.latency_ms / 1000, args.status)
+    print(f"Stub noti API listening on {server.base_url}")
+    server.serve_forever()
@@ -14,21 +14,51 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x16\x63\x61mpaign_service.proto\x12\tscheduler\"\x1e\n\x0eJsonSerialized\x12\x0c\n\x04json\x18\x01 \x01(\t\"R\n\x10UserEventMessage\x12\x0f\n\x07user_id\x18\x01 \x01(\x03\x12-\n\nevent_data\x18\x02 \x01(\x0b\x32\x19.scheduler.JsonSerialized\"Z\n\x14UserAttributeMessage\x12\x0f\n\x07user_id\x18\x01 \x01(\x03\x12\x31\n\x0e\x61ttribute_data\x18\x02 \x01(\x0b\x32\x19.scheduler.JsonSerialized\"+\n\x08Response\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0e\n\x06reason\x18\x02 \x01(\t2\xaa\x01\n\x08\x43\x61mpaign\x12J\n\x16NotifyUserEventEmitted\x12\x1b.scheduler.UserEventMessage\x1a\x13.scheduler.Response\x12R\n\x1aNotifyUserAttributeChanged\x12\x1f.scheduler.UserAttributeMessage\x1a\x13.scheduler.Responseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x16\x63\x61mpaign_service.proto\x12\tscheduler\"\x1e\n\x0eJsonSerialized\x12\x0c\n\x04json\x18\x01 \x01(\t\"r\n\rPropertyValue\x12\x14\n\nbool_value\x18\x01 \x01(\x08H\x00\x12\x13\n\tint_value\x18\x02 \x01(\x03H\x00\x12\x16\n\x0c\x64ouble_value\x18\x03 \x01(\x01H\x00\x12\x16\n\x0cstring_value\x18\x04 \x01(\tH\x00\x42\x06\n\x04kind\"\x84\x02\n\x10UserEventMessage\x12\x0f\n\x07user_id\x18\x01 \x01(\x03\x12-\n\nevent_data\x18\x02 \x01(\x0b\x32\x19.scheduler.JsonSerialized\x12\x12\n\nevent_name\x18\x03 \x01(\t\x12J\n\x10\x65vent_properties\x18\x04 \x03(\x0b\x32\x30.scheduler.UserEventMessage.EventPropertiesEntry\x1aP\n\x14\x45ventPropertiesEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\'\n\x05value\x18\x02 \x01(\x0b\x32\x18.scheduler.PropertyValue:\x02\x38\x01\"=\n\x0eUserEventBatch\x12+\n\x06\x65vents\x18\x01 \x03(\x0b\x32\x1b.scheduler.UserEventMessage\"\xa5\x01\n\x14UserAttributeMessage\x12\x0f\n\x07user_id\x18\x01 \x01(\x03\x12\x31\n\x0e\x61ttribute_data\x18\x02 \x01(\x0b\x32\x19.scheduler.JsonSerialized\x12\x16\n\x0e\x61ttribute_name\x18\x03 \x01(\t\x12\x31\n\x0f\x61ttribute_value\x18\x04 \x01(\x0b\x32\x18.scheduler.PropertyValue\":\n\x08Response\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0e\n\x06reason\x18\x02 \x01(\t\x12\r\n\x05retry\x18\x03 \x01(\x08\"5\n\rBatchResponse\x12$\n\x07results\x18\x01 \x03(\x0b\x32\x13.scheduler.Response\"3\n\x0eProfileRequest\x12\x0f\n\x07seconds\x18\x01 \x01(\x01\x12\x10\n\x08interval\x18\x02 \x01(\x01\"5\n\x0fProfileResponse\x12\x11\n\tcollapsed\x18\x01 \x01(\t\x12\x0f\n\x07samples\x18\x02 \x01(\x03\"&\n\x0fTraceSampleRate\x12\x13\n\x0bsample_rate\x18\x01 \x01(\x01\"\x1e\n\rTracesRequest\x12\r\n\x05limit\x18\x01 \x01(\x05\";\n\x04Span\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x10\n\x08start_ms\x18\x02 \x01(\x01\x12\x13\n\x0b\x64uration_ms\x18\x03 \x01(\x01\"\xc6\x01\n\x05Trace\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x34\n\nattributes\x18\x02 \x03(\x0b\x32 .scheduler.Trace.AttributesEntry\x12\x11\n\ttimestamp\x18\x03 \x01(\x01\x12\x13\n\x0b\x64uration_ms\x18\x04 \x01(\x01\x12\x1e\n\x05spans\x18\x05 \x03(\x0b\x32\x0f.scheduler.Span\x1a\x31\n\x0f\x41ttributesEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\t:\x02\x38\x01\"2\n\x0eTracesResponse\x12 \n\x06traces\x18\x01 \x03(\x0b\x32\x10.scheduler.Trace2\xc7\x02\n\x08\x43\x61mpaign\x12J\n\x16NotifyUserEventEmitted\x12\x1b.scheduler.UserEventMessage\x1a\x13.scheduler.Response\x12R\n\x1aNotifyUserAttributeChanged\x12\x1f.scheduler.UserAttributeMessage\x1a\x13.scheduler.Response\x12N\n\x17NotifyUserEventsEmitted\x12\x19.scheduler.UserEventBatch\x1a\x18.scheduler.BatchResponse\x12K\n\x10StreamUserEvents\x12\x1b.scheduler.UserEventMessage\x1a\x18.scheduler.BatchResponse(\x01\x32\xd9\x01\n\x05\x41\x64min\x12@\n\x07Profile\x12\x19.scheduler.ProfileRequest\x1a\x1a.scheduler.ProfileResponse\x12L\n\x12SetTraceSampleRate\x12\x1a.scheduler.TraceSampleRate\x1a\x1a.scheduler.TraceSampleRate\x12@\n\tGetTraces\x12\x18.scheduler.TracesRequest\x1a\x19.scheduler.TracesResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'campaign_service_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
+  _globals['_USEREVENTMESSAGE_EVENTPROPERTIESENTRY']._loaded_options = None
+  _globals['_USEREVENTMESSAGE_EVENTPROPERTIESENTRY']._serialized_options = b'8\001'
+  _globals['_TRACE_ATTRIBUTESENTRY']._loaded_options = None
+  _globals['_TRACE_ATTRIBUTESENTRY']._serialized_options = b'8\001'
   _globals['_JSONSERIALIZED']._serialized_start=37
   _globals['_JSONSERIALIZED']._serialized_end=67
-  _globals['_USEREVENTMESSAGE']._serialized_start=69
-  _globals['_USEREVENTMESSAGE']._serialized_end=151
-  _globals['_USERATTRIBUTEMESSAGE']._serialized_start=153
-  _globals['_USERATTRIBUTEMESSAGE']._serialized_end=243
-  _globals['_RESPONSE']._serialized_start=245
-  _globals['_RESPONSE']._serialized_end=288
-  _globals['_CAMPAIGN']._serialized_start=291
-  _globals['_CAMPAIGN']._serialized_end=461
+  _globals['_PROPERTYVALUE']._serialized_start=69
+  _globals['_PROPERTYVALUE']._serialized_end=183
+  _globals['_USEREVENTMESSAGE']._serialized_start=186
+  _globals['_USEREVENTMESSAGE']._serialized_end=446
+  _globals['_USEREVENTMESSAGE_EVENTPROPERTIESENTRY']._serialized_start=366
+  _globals['_USEREVENTMESSAGE_EVENTPROPERTIESENTRY']._serialized_end=446
+  _globals['_USEREVENTBATCH']._serialized_start=448
+  _globals['_USEREVENTBATCH']._serialized_end=509
+  _globals['_USERATTRIBUTEMESSAGE']._serialized_start=512
+  _globals['_USERATTRIBUTEMESSAGE']._serialized_end=677
+  _globals['_RESPONSE']._serialized_start=679
+  _globals['_RESPONSE']._serialized_end=737
+  _globals['_BATCHRESPONSE']._serialized_start=739
+  _globals['_BATCHRESPONSE']._serialized_end=792
+  _globals['_PROFILEREQUEST']._serialized_start=794
+  _globals['_PROFILEREQUEST']._serialized_end=845
+  _globals['_PROFILERESPONSE']._serialized_start=847
+  _globals['_PROFILERESPONSE']._serialized_end=900
+  _globals['_TRACESAMPLERATE']._serialized_start=902
+  _globals['_TRACESAMPLERATE']._serialized_end=940
+  _globals['_TRACESREQUEST']._serialized_start=942
+  _globals['_TRACESREQUEST']._serialized_end=972
+  _globals['_SPAN']._serialized_start=974
+  _globals['_SPAN']._serialized_end=1033
+  _globals['_TRACE']._serialized_start=1036
+  _globals['_TRACE']._serialized_end=1234
+  _globals['_TRACE_ATTRIBUTESENTRY']._serialized_start=1185
+  _globals['_TRACE_ATTRIBUTESENTRY']._serialized_end=1234
+  _globals['_TRACESRESPONSE']._serialized_start=1236
+  _globals['_TRACESRESPONSE']._serialized_end=1286
+  _globals['_CAMPAIGN']._serialized_start=1289
+  _globals['_CAMPAIGN']._serialized_end=1616
+  _globals['_ADMIN']._serialized_start=1619
+  _globals['_ADMIN']._serialized_end=1836
 # @@protoc_insertion_point(module_scope)
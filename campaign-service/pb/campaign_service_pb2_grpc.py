@@ -49,6 +49,16 @@ class CampaignStub(object):
                 request_serializer=campaign__service__pb2.UserAttributeMessage.SerializeToString,
                 response_deserializer=campaign__service__pb2.Response.FromString,
                 _registered_method=True)
+        self.NotifyUserEventsEmitted = channel.unary_unary(
+                '/scheduler.Campaign/NotifyUserEventsEmitted',
+                request_serializer=campaign__service__pb2.UserEventBatch.SerializeToString,
+                response_deserializer=campaign__service__pb2.BatchResponse.FromString,
+                _registered_method=True)
+        self.StreamUserEvents = channel.stream_unary(
+                '/scheduler.Campaign/StreamUserEvents',
+                request_serializer=campaign__service__pb2.UserEventMessage.SerializeToString,
+                response_deserializer=campaign__service__pb2.BatchResponse.FromString,
+                _registered_method=True)
 
 
 class CampaignServicer(object):
@@ -66,6 +76,18 @@ class CampaignServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def NotifyUserEventsEmitted(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def StreamUserEvents(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_CampaignServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -79,6 +101,16 @@ def add_CampaignServicer_to_server(servicer, server):
                     request_deserializer=campaign__service__pb2.UserAttributeMessage.FromString,
                     response_serializer=campaign__service__pb2.Response.SerializeToString,
             ),
+            'NotifyUserEventsEmitted': grpc.unary_unary_rpc_method_handler(
+                    servicer.NotifyUserEventsEmitted,
+                    request_deserializer=campaign__service__pb2.UserEventBatch.FromString,
+                    response_serializer=campaign__service__pb2.BatchResponse.SerializeToString,
+            ),
+            'StreamUserEvents': grpc.stream_unary_rpc_method_handler(
+                    servicer.StreamUserEvents,
+                    request_deserializer=campaign__service__pb2.UserEventMessage.FromString,
+                    response_serializer=campaign__service__pb2.BatchResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'scheduler.Campaign', rpc_method_handlers)
@@ -143,3 +175,220 @@ class Campaign(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def NotifyUserEventsEmitted(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/scheduler.Campaign/NotifyUserEventsEmitted',
+            campaign__service__pb2.UserEventBatch.SerializeToString,
+            campaign__service__pb2.BatchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def StreamUserEvents(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/scheduler.Campaign/StreamUserEvents',
+            campaign__service__pb2.UserEventMessage.SerializeToString,
+            campaign__service__pb2.BatchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+
+class AdminStub(object):
+    """Operational endpoints, served alongside Campaign
+    """
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.Profile = channel.unary_unary(
+                '/scheduler.Admin/Profile',
+                request_serializer=campaign__service__pb2.ProfileRequest.SerializeToString,
+                response_deserializer=campaign__service__pb2.ProfileResponse.FromString,
+                _registered_method=True)
+        self.SetTraceSampleRate = channel.unary_unary(
+                '/scheduler.Admin/SetTraceSampleRate',
+                request_serializer=campaign__service__pb2.TraceSampleRate.SerializeToString,
+                response_deserializer=campaign__service__pb2.TraceSampleRate.FromString,
+                _registered_method=True)
+        self.GetTraces = channel.unary_unary(
+                '/scheduler.Admin/GetTraces',
+                request_serializer=campaign__service__pb2.TracesRequest.SerializeToString,
+                response_deserializer=campaign__service__pb2.TracesResponse.FromString,
+                _registered_method=True)
+
+
+class AdminServicer(object):
+    """Operational endpoints, served alongside Campaign
+    """
+
+    def Profile(self, request, context):
+        """Samples every thread's stack for `seconds` and returns them collapsed
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SetTraceSampleRate(self, request, context):
+        """Traces this fraction of NotifyUserEventEmitted calls; returns the previous rate
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetTraces(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_AdminServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'Profile': grpc.unary_unary_rpc_method_handler(
+                    servicer.Profile,
+                    request_deserializer=campaign__service__pb2.ProfileRequest.FromString,
+                    response_serializer=campaign__service__pb2.ProfileResponse.SerializeToString,
+            ),
+            'SetTraceSampleRate': grpc.unary_unary_rpc_method_handler(
+                    servicer.SetTraceSampleRate,
+                    request_deserializer=campaign__service__pb2.TraceSampleRate.FromString,
+                    response_serializer=campaign__service__pb2.TraceSampleRate.SerializeToString,
+            ),
+            'GetTraces': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetTraces,
+                    request_deserializer=campaign__service__pb2.TracesRequest.FromString,
+                    response_serializer=campaign__service__pb2.TracesResponse.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'scheduler.Admin', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('scheduler.Admin', rpc_method_handlers)
+
+
+ # This class is part of an EXPERIMENTAL API.
+class Admin(object):
+    """Operational endpoints, served alongside Campaign
+    """
+
+    @staticmethod
+    def Profile(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/scheduler.Admin/Profile',
+            campaign__service__pb2.ProfileRequest.SerializeToString,
+            campaign__service__pb2.ProfileResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SetTraceSampleRate(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/scheduler.Admin/SetTraceSampleRate',
+            campaign__service__pb2.TraceSampleRate.SerializeToString,
+            campaign__service__pb2.TraceSampleRate.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetTraces(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/scheduler.Admin/GetTraces',
+            campaign__service__pb2.TracesRequest.SerializeToString,
+            campaign__service__pb2.TracesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,33 @@
+"""
+Logging for the dataflow. Records are queued by the caller and written by a background
+listener thread, so a slow stdout never holds up a sink partition; calls below the
+level (`LOG_LEVEL`, default INFO) return before a record is built.
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+__all__ = (
+    "get_logger",
+)
+
+_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+_handler = logging.StreamHandler(sys.stdout)
+_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_listener = logging.handlers.QueueListener(_queue, _handler)
+_listener.start()
+atexit.register(_listener.stop)
+
+_root = logging.getLogger("app")
+_root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+_root.addHandler(logging.handlers.QueueHandler(_queue))
+_root.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    """A logger under `app` (e.g. `get_logger(__name__)`)"""
+    return logging.getLogger(name)
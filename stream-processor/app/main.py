@@ -2,7 +2,7 @@ from dataclasses import dataclass, field
 from operator import attrgetter, is_not
 from functools import partial
 import json
-from typing import Literal, Self
+from typing import Any, Literal, Self
 
 from bytewax.dataflow import Dataflow
 from bytewax import operators as op
@@ -14,7 +14,7 @@ from app.model import (
     UserEventData,
 )
 from app.sink import CampaignServiceSink
-from pb.campaign_service_pb2 import UserEventMessage
+from pb.campaign_service_pb2 import UserEventMessage, PropertyValue
 
 CampaignEventType = Literal["trigger_event", "exception_event"]
 
@@ -190,8 +190,34 @@ eval_stream = op.stateful_map("state", merged_stream, mapper)
 # op.inspect("inspect_eval_stream", eval_stream)
 
 
+def as_property_value(value: Any) -> PropertyValue | None:
+    """Typed counterpart of a property value, or None if it has none (e.g. nested)."""
+    match value:
+        case None:
+            return PropertyValue()
+        case bool():
+            return PropertyValue(bool_value=value)
+        case int() if -2 ** 63 <= value < 2 ** 63:
+            return PropertyValue(int_value=value)
+        case float():
+            return PropertyValue(double_value=value)
+        case str():
+            return PropertyValue(string_value=value)
+        case _:
+            return None
+
+
 def as_campaign_service_request(event: UserEventData | None) -> UserEventMessage | None:
     if event is not None:
+        properties = {name: as_property_value(value) for name, value in event.event_properties.items()}
+        if event.event_name and None not in properties.values():
+            return UserEventMessage(
+                user_id=event.user_id,
+                event_name=event.event_name,
+                event_properties=properties,
+            )
+
+        # Not representable with typed fields
         return UserEventMessage(
             user_id=event.user_id,
             event_data={
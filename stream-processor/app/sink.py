@@ -1,18 +1,57 @@
+import random
+import time
+
 from bytewax.outputs import StatelessSinkPartition, DynamicSink
 import grpc
 
+from app.log import get_logger
 from pb.campaign_service_pb2_grpc import CampaignStub
-from pb.campaign_service_pb2 import UserEventMessage
+from pb.campaign_service_pb2 import UserEventMessage, UserEventBatch
+
+# campaign-service is overloaded or restarting: hold the batch (and so the dataflow) and retry
+_RETRYABLE = (grpc.StatusCode.RESOURCE_EXHAUSTED, grpc.StatusCode.UNAVAILABLE)
+
+_log = get_logger(__name__)
 
 
 class _CampaignServiceSinkPartition(StatelessSinkPartition[UserEventMessage]):
-    def __init__(self, stub: CampaignStub):
+    def __init__(self, stub: CampaignStub, initial_backoff: float = 0.1, max_backoff: float = 10.0):
         self.stub = stub
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
 
     def write_batch(self, items: list[UserEventMessage]) -> None:
-        for item in items:
-            res = self.stub.NotifyUserEventEmitted(item)
-            print(res)
+        backoff = self.initial_backoff
+        while items:
+            try:
+                res = self.stub.NotifyUserEventsEmitted(UserEventBatch(events=items))
+            except grpc.RpcError as e:
+                if e.code() not in _RETRYABLE:
+                    raise
+                _log.warning("campaign-service unavailable (%s), retrying in %.1fs", e.code().name, backoff)
+                backoff = self._wait(backoff)
+                continue
+
+            rejected = []
+            failed = []
+            for item, result in zip(items, res.results):
+                if result.retry:
+                    rejected.append(item)
+                elif not result.success:
+                    failed.append((item.user_id, result.reason))
+            if failed:
+                # One record per batch, not per event
+                _log.warning("%d events failed, e.g. user_id=%d: %s", len(failed), *failed[0])
+
+            items = rejected
+            if items:
+                _log.warning("%d events rejected by campaign-service, retrying in %.1fs", len(items), backoff)
+                backoff = self._wait(backoff)
+
+    def _wait(self, backoff: float) -> float:
+        # Jittered, so partitions rejected together don't come back together
+        time.sleep(backoff * random.uniform(0.5, 1.0))
+        return min(backoff * 2, self.max_backoff)
 
 
 class CampaignServiceSink(DynamicSink):
@@ -1,6 +1,7 @@
+from google.protobuf.internal import containers as _containers
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import message as _message
-from typing import ClassVar as _ClassVar, Mapping as _Mapping, Optional as _Optional, Union as _Union
+from typing import ClassVar as _ClassVar, Iterable as _Iterable, Mapping as _Mapping, Optional as _Optional, Union as _Union
 
 DESCRIPTOR: _descriptor.FileDescriptor
 
@@ -10,26 +11,132 @@ class JsonSerialized(_message.Message):
     json: str
     def __init__(self, json: _Optional[str] = ...) -> None: ...
 
+class PropertyValue(_message.Message):
+    __slots__ = ("bool_value", "int_value", "double_value", "string_value")
+    BOOL_VALUE_FIELD_NUMBER: _ClassVar[int]
+    INT_VALUE_FIELD_NUMBER: _ClassVar[int]
+    DOUBLE_VALUE_FIELD_NUMBER: _ClassVar[int]
+    STRING_VALUE_FIELD_NUMBER: _ClassVar[int]
+    bool_value: bool
+    int_value: int
+    double_value: float
+    string_value: str
+    def __init__(self, bool_value: bool = ..., int_value: _Optional[int] = ..., double_value: _Optional[float] = ..., string_value: _Optional[str] = ...) -> None: ...
+
 class UserEventMessage(_message.Message):
-    __slots__ = ("user_id", "event_data")
+    __slots__ = ("user_id", "event_data", "event_name", "event_properties")
+    class EventPropertiesEntry(_message.Message):
+        __slots__ = ("key", "value")
+        KEY_FIELD_NUMBER: _ClassVar[int]
+        VALUE_FIELD_NUMBER: _ClassVar[int]
+        key: str
+        value: PropertyValue
+        def __init__(self, key: _Optional[str] = ..., value: _Optional[_Union[PropertyValue, _Mapping]] = ...) -> None: ...
     USER_ID_FIELD_NUMBER: _ClassVar[int]
     EVENT_DATA_FIELD_NUMBER: _ClassVar[int]
+    EVENT_NAME_FIELD_NUMBER: _ClassVar[int]
+    EVENT_PROPERTIES_FIELD_NUMBER: _ClassVar[int]
     user_id: int
     event_data: JsonSerialized
-    def __init__(self, user_id: _Optional[int] = ..., event_data: _Optional[_Union[JsonSerialized, _Mapping]] = ...) -> None: ...
+    event_name: str
+    event_properties: _containers.MessageMap[str, PropertyValue]
+    def __init__(self, user_id: _Optional[int] = ..., event_data: _Optional[_Union[JsonSerialized, _Mapping]] = ..., event_name: _Optional[str] = ..., event_properties: _Optional[_Mapping[str, PropertyValue]] = ...) -> None: ...
+
+class UserEventBatch(_message.Message):
+    __slots__ = ("events",)
+    EVENTS_FIELD_NUMBER: _ClassVar[int]
+    events: _containers.RepeatedCompositeFieldContainer[UserEventMessage]
+    def __init__(self, events: _Optional[_Iterable[_Union[UserEventMessage, _Mapping]]] = ...) -> None: ...
 
 class UserAttributeMessage(_message.Message):
-    __slots__ = ("user_id", "attribute_data")
+    __slots__ = ("user_id", "attribute_data", "attribute_name", "attribute_value")
     USER_ID_FIELD_NUMBER: _ClassVar[int]
     ATTRIBUTE_DATA_FIELD_NUMBER: _ClassVar[int]
+    ATTRIBUTE_NAME_FIELD_NUMBER: _ClassVar[int]
+    ATTRIBUTE_VALUE_FIELD_NUMBER: _ClassVar[int]
     user_id: int
     attribute_data: JsonSerialized
-    def __init__(self, user_id: _Optional[int] = ..., attribute_data: _Optional[_Union[JsonSerialized, _Mapping]] = ...) -> None: ...
+    attribute_name: str
+    attribute_value: PropertyValue
+    def __init__(self, user_id: _Optional[int] = ..., attribute_data: _Optional[_Union[JsonSerialized, _Mapping]] = ..., attribute_name: _Optional[str] = ..., attribute_value: _Optional[_Union[PropertyValue, _Mapping]] = ...) -> None: ...
 
 class Response(_message.Message):
-    __slots__ = ("success", "reason")
+    __slots__ = ("success", "reason", "retry")
     SUCCESS_FIELD_NUMBER: _ClassVar[int]
     REASON_FIELD_NUMBER: _ClassVar[int]
+    RETRY_FIELD_NUMBER: _ClassVar[int]
     success: bool
     reason: str
-    def __init__(self, success: bool = ..., reason: _Optional[str] = ...) -> None: ...
+    retry: bool
+    def __init__(self, success: bool = ..., reason: _Optional[str] = ..., retry: bool = ...) -> None: ...
+
+class BatchResponse(_message.Message):
+    __slots__ = ("results",)
+    RESULTS_FIELD_NUMBER: _ClassVar[int]
+    results: _containers.RepeatedCompositeFieldContainer[Response]
+    def __init__(self, results: _Optional[_Iterable[_Union[Response, _Mapping]]] = ...) -> None: ...
+
+class ProfileRequest(_message.Message):
+    __slots__ = ("seconds", "interval")
+    SECONDS_FIELD_NUMBER: _ClassVar[int]
+    INTERVAL_FIELD_NUMBER: _ClassVar[int]
+    seconds: float
+    interval: float
+    def __init__(self, seconds: _Optional[float] = ..., interval: _Optional[float] = ...) -> None: ...
+
+class ProfileResponse(_message.Message):
+    __slots__ = ("collapsed", "samples")
+    COLLAPSED_FIELD_NUMBER: _ClassVar[int]
+    SAMPLES_FIELD_NUMBER: _ClassVar[int]
+    collapsed: str
+    samples: int
+    def __init__(self, collapsed: _Optional[str] = ..., samples: _Optional[int] = ...) -> None: ...
+
+class TraceSampleRate(_message.Message):
+    __slots__ = ("sample_rate",)
+    SAMPLE_RATE_FIELD_NUMBER: _ClassVar[int]
+    sample_rate: float
+    def __init__(self, sample_rate: _Optional[float] = ...) -> None: ...
+
+class TracesRequest(_message.Message):
+    __slots__ = ("limit",)
+    LIMIT_FIELD_NUMBER: _ClassVar[int]
+    limit: int
+    def __init__(self, limit: _Optional[int] = ...) -> None: ...
+
+class Span(_message.Message):
+    __slots__ = ("name", "start_ms", "duration_ms")
+    NAME_FIELD_NUMBER: _ClassVar[int]
+    START_MS_FIELD_NUMBER: _ClassVar[int]
+    DURATION_MS_FIELD_NUMBER: _ClassVar[int]
+    name: str
+    start_ms: float
+    duration_ms: float
+    def __init__(self, name: _Optional[str] = ..., start_ms: _Optional[float] = ..., duration_ms: _Optional[float] = ...) -> None: ...
+
+class Trace(_message.Message):
+    __slots__ = ("name", "attributes", "timestamp", "duration_ms", "spans")
+    class AttributesEntry(_message.Message):
+        __slots__ = ("key", "value")
+        KEY_FIELD_NUMBER: _ClassVar[int]
+        VALUE_FIELD_NUMBER: _ClassVar[int]
+        key: str
+        value: str
+        def __init__(self, key: _Optional[str] = ..., value: _Optional[str] = ...) -> None: ...
+    NAME_FIELD_NUMBER: _ClassVar[int]
+    ATTRIBUTES_FIELD_NUMBER: _ClassVar[int]
+    TIMESTAMP_FIELD_NUMBER: _ClassVar[int]
+    DURATION_MS_FIELD_NUMBER: _ClassVar[int]
+    SPANS_FIELD_NUMBER: _ClassVar[int]
+    name: str
+    attributes: _containers.ScalarMap[str, str]
+    timestamp: float
+    duration_ms: float
+    spans: _containers.RepeatedCompositeFieldContainer[Span]
+    def __init__(self, name: _Optional[str] = ..., attributes: _Optional[_Mapping[str, str]] = ..., timestamp: _Optional[float] = ..., duration_ms: _Optional[float] = ..., spans: _Optional[_Iterable[_Union[Span, _Mapping]]] = ...) -> None: ...
+
+class TracesResponse(_message.Message):
+    __slots__ = ("traces",)
+    TRACES_FIELD_NUMBER: _ClassVar[int]
+    traces: _containers.RepeatedCompositeFieldContainer[Trace]
+    def __init__(self, traces: _Optional[_Iterable[_Union[Trace, _Mapping]]] = ...) -> None: ...